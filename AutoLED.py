@@ -2,18 +2,27 @@
 import numpy as np
 import threading
 
+from exposure_metering import histogram_fractions
+from frame_controller import FrameControllerThread
+
 class AutoLEDCore:
     """
-    Headless Auto-LED-Regler (kein Fenster). Läuft über Tk 'after' des Hosts.
+    Headless Auto-LED-Regler (kein Fenster).
+    Standard: Regelung in einem Hintergrund-Thread, getaktet durch neue
+    Kamerabilder (FrameControllerThread); an Tk gehen nur Status-Dicts.
+    threaded=False: alter Betrieb über Tk 'after' des Hosts.
     Host muss Properties/Mthds bereitstellen:
-      - host.stream.get_frame()
+      - host.stream.get_frame()  (bzw. wait_frame() für den Thread-Betrieb)
       - host.get_led_controller(force_gui=False)
       - host.after(ms, callback)
-    Optional: on_update(dict) Callback für Live-Status.
+    Optional: on_update(dict) Callback für Live-Status (läuft im Tk-Thread),
+              roi (RoiTracker) bzw. host.roi_tracker für ROI-Messung.
     """
-    def __init__(self, host, on_update=None):
+    def __init__(self, host, on_update=None, roi=None, threaded=True):
         self.host = host
         self.on_update = on_update  # callable(status_dict)
+        self.roi = roi              # RoiTracker oder None (-> host.roi_tracker)
+        self.threaded = threaded
         # Regel-Parameter (Defaultwerte; können beim start() überschrieben werden)
         self.low_limit = 10
         self.high_limit = 10
@@ -36,6 +45,8 @@ class AutoLEDCore:
 
         # Start-Reset asynchron (nur den geregelten Kanal)
         self._reset_thread = None
+        self._led = None
+        self._worker = None
 
     @property
     def active(self):
@@ -60,24 +71,128 @@ class AutoLEDCore:
         self._stagnation = 0
         self._cycle = 0
 
+        # LED-Controller im Tk-Thread holen (kann Dialoge zeigen)
+        self._led = self.host.get_led_controller(force_gui=False)
+        self._active = True
+
+        if self.threaded and hasattr(self.host.stream, "wait_frame"):
+            self._reset_channel()
+            self._worker = FrameControllerThread(
+                self.host.stream, self._control,
+                tk_widget=self.host, on_status=self._deliver)
+            self._worker.start()
+            return
+
         # Kanal auf 0 % setzen (non-blocking)
-        def _reset():
-            led = self.host.get_led_controller(force_gui=False)
-            if led and channel_name:
-                try:
-                    led.set_channel_by_name(channel_name, 0.0)
-                except Exception as e:
-                    print("[AutoLEDCore] Reset failed:", e)
-        self._reset_thread = threading.Thread(target=_reset, daemon=True)
+        self._reset_thread = threading.Thread(target=self._reset_channel, daemon=True)
         self._reset_thread.start()
-
-        self._active = True
         self._tick()
 
     def stop(self):
         self._active = False
+        if self._worker is not None:
+            self._worker.stop()
+
+    def _reset_channel(self):
+        if self._led and self.channel_name:
+            try:
+                self._led.set_channel_by_name(self.channel_name, 0.0)
+            except Exception as e:
+                print("[AutoLEDCore] Reset failed:", e)
+
+    def _deliver(self, status):
+        if status.get("error"):
+            print("[AutoLEDCore] Regelung abgebrochen:", status["error"])
+        if status.get("done"):
+            self._active = False
+        if callable(self.on_update) and "channel" in status:
+            self.on_update(status)
+
+    def _roi_rect(self, frame_np):
+        tracker = self.roi if self.roi is not None else getattr(self.host, "roi_tracker", None)
+        if tracker is None:
+            return None
+        try:
+            return tracker.get(frame_np)
+        except Exception as e:
+            print("[AutoLEDCore] ROI failed:", e)
+            return None
 
-    # --- interner Takt ---
+    # --- ein Regelschritt (Thread- oder Tk-Kontext, ohne Tk-Zugriffe) ---
+    def _control(self, f):
+        if not self._active:
+            return {"done": True}
+
+        roi = self._roi_rect(f)
+        low_frac, high_frac = histogram_fractions(
+            f, self.hist_channel, self.low_limit, self.high_limit, roi=roi)
+
+        # Fehlermaß
+        err_dark   = max(0.0, low_frac  - self.low_target)
+        err_bright = max(0.0, high_frac - self.high_target)
+        error = err_dark - err_bright
+        eps = 0.002
+
+        if error > eps:
+            direction = +1
+        elif error < -eps:
+            direction = -1
+        else:
+            direction = 0
+
+        led = self._led
+        if not led or not self.channel_name:
+            return None
+
+        # aktuellen PWM lesen (ohne Tk-Variablen -> auch im Worker-Thread ok)
+        current = float(led.get_channel_value(self.channel_name) or 0.0)
+
+        # Schritt-Anpassung
+        if (self.prev_direction != 0) and (direction != 0) and (direction != self.prev_direction):
+            self.step = max(self.step / 2.0, self.min_step)
+
+        improved = True
+        if self._last_error is not None:
+            improved = (abs(error) < abs(self._last_error)) or (direction == 0)
+            if not improved:
+                self._stagnation += 1
+                if self._stagnation >= 2:
+                    self.step = max(self.step / 2.0, self.min_step)
+                    self._stagnation = 0
+            else:
+                self._stagnation = 0
+
+        # Stellgröße
+        new_val = current
+        if direction != 0 and self.step > 0.0:
+            new_val = max(0.0, min(100.0, current + direction * self.step))
+            if abs(new_val - current) >= 1e-3:
+                led.set_channel_by_name(self.channel_name, new_val)
+
+        # Fortschritt/Zustand merken
+        self.prev_direction = direction
+        self._last_error = error
+        self._cycle += 1
+
+        # Abbruchbedingungen
+        done = (direction == 0 and self.step <= self.min_step) or (self._cycle >= self._max_cycles)
+        if done:
+            self._active = False
+
+        return {
+            "channel": self.channel_name,
+            "hist_channel": self.hist_channel,
+            "low_fraction": low_frac,
+            "high_fraction": high_frac,
+            "direction": direction,
+            "step": self.step,
+            "pwm": new_val,
+            "roi": roi,
+            "cycle": self._cycle,
+            "done": done,
+        }
+
+    # --- interner Takt (threaded=False) ---
     def _tick(self):
         if not self._active:
             return
@@ -90,95 +205,11 @@ class AutoLEDCore:
         try:
             frame = self.host.stream.get_frame()
             if frame is None:
-                self._busy = False
-                self.host.after(self.loop_ms, self._tick)
-                return
-
-            f = np.array(frame)  # HxWx3 uint8
-            sel = self.hist_channel
-            if sel == "R":
-                chan = f[:, :, 0]
-            elif sel == "G":
-                chan = f[:, :, 1]
-            elif sel == "B":
-                chan = f[:, :, 2]
-            else:  # Gray
-                chan = np.mean(f, axis=2)
-            chan = chan.astype(np.uint8, copy=False).ravel()
-
-            hist, _ = np.histogram(chan, bins=256, range=(0, 256))
-            total = max(1, chan.size)
-            low_frac  = hist[: self.low_limit + 1].sum() / total
-            high_frac = hist[255 - self.high_limit :].sum() / total
-
-            # Fehlermaß
-            err_dark   = max(0.0, low_frac  - self.low_target)
-            err_bright = max(0.0, high_frac - self.high_target)
-            error = err_dark - err_bright
-            eps = 0.002
-
-            if error > eps:
-                direction = +1
-            elif error < -eps:
-                direction = -1
-            else:
-                direction = 0
-
-            led = self.host.get_led_controller(force_gui=False)
-            if not led or not self.channel_name:
-                self._busy = False
-                self.host.after(self.loop_ms, self._tick)
                 return
 
-            # aktuellen PWM lesen (GUI/Headless robust)
-            if hasattr(led, "sliders") and self.channel_name in getattr(led, "sliders", {}):
-                current = float(led.sliders[self.channel_name].get())
-            else:
-                current = float(led.get_channel_value(self.channel_name) or 0.0)
-
-            # Schritt-Anpassung
-            if (self.prev_direction != 0) and (direction != 0) and (direction != self.prev_direction):
-                self.step = max(self.step / 2.0, self.min_step)
-
-            improved = True
-            if self._last_error is not None:
-                improved = (abs(error) < abs(self._last_error)) or (direction == 0)
-                if not improved:
-                    self._stagnation += 1
-                    if self._stagnation >= 2:
-                        self.step = max(self.step / 2.0, self.min_step)
-                        self._stagnation = 0
-                else:
-                    self._stagnation = 0
-
-            # Stellgröße
-            new_val = current
-            if direction != 0 and self.step > 0.0:
-                new_val = max(0.0, min(100.0, current + direction * self.step))
-                if abs(new_val - current) >= 1e-3:
-                    led.set_channel_by_name(self.channel_name, new_val)
-
-            # Status-Callback
-            if callable(self.on_update):
-                self.on_update({
-                    "channel": self.channel_name,
-                    "hist_channel": self.hist_channel,
-                    "low_fraction": low_frac,
-                    "high_fraction": high_frac,
-                    "direction": direction,
-                    "step": self.step,
-                    "pwm": new_val
-                })
-
-            # Fortschritt/Zustand merken
-            self.prev_direction = direction
-            self._last_error = error
-            self._cycle += 1
-
-            # Abbruchbedingungen
-            if (direction == 0 and self.step <= self.min_step) or (self._cycle >= self._max_cycles):
-                self._active = False
-                return
+            status = self._control(np.array(frame))  # HxWx3 uint8
+            if status is not None and callable(self.on_update):
+                self.on_update(status)
 
         finally:
             self._busy = False
@@ -4,13 +4,18 @@ from tkinter import ttk, messagebox
 import threading
 import numpy as np
 
+from exposure_metering import RoiTracker, histogram_fractions
+from frame_controller import FrameControllerThread
+
 
 class AutoLEDDialog(tk.Toplevel):
     """
     Auto-LED-Regelung auf Basis:
     - Live-Bild aus master.stream.get_frame()
     - LED-Steuerung über master.get_led_controller()
-    Die Regelung arbeitet nicht-blockierend mit .after().
+    - optional ROI über master.roi_tracker (Rechteck aus der Vorschau)
+    Histogramm und I2C-Writes laufen in einem Hintergrund-Thread im Kameratakt;
+    der Tk-Thread bekommt nur Status-Dicts und zeigt sie an.
     """
 
     def __init__(self, master):
@@ -40,6 +45,10 @@ class AutoLEDDialog(tk.Toplevel):
         # LED-Kanal
         self.selected_channel = tk.StringVar(value="")
 
+        # Mess-ROI (mit der Vorschau geteilt, falls vorhanden)
+        self.roi = getattr(master, "roi_tracker", None) or RoiTracker()
+        self.roi_mode = tk.StringVar(value=self.roi.mode)
+
         # Zustand des Reglers
         self.active = tk.BooleanVar(value=False)
         self.current_step = 20.0
@@ -48,7 +57,9 @@ class AutoLEDDialog(tk.Toplevel):
         self.last_error = None
         self.stagnation_count = 0
 
-        self.loop_ms = 800  # Regelintervall in ms
+        self.loop_ms = 800  # nur noch Fallback-Intervall für Streams ohne wait_frame()
+        self._worker = None
+        self._params = {}
         self.step_label_var = tk.StringVar(value="Schritt: 20.0 %")
         self.pwm_label_var = tk.StringVar(value="PWM: 0.0 %")
         self.status_var = tk.StringVar(value="Status: inaktiv")
@@ -76,6 +87,11 @@ class AutoLEDDialog(tk.Toplevel):
         ttk.OptionMenu(self, self.hist_channel, self.hist_channel.get(),
                        "Gray", "R", "G", "B").pack(fill="x", padx=pad_x, pady=(0, 8))
 
+        ttk.Label(self, text="Mess-ROI (off/manual/auto):",
+                  foreground="white", background="#2e2e2e").pack(anchor="w", padx=pad_x, pady=(4, 0))
+        ttk.OptionMenu(self, self.roi_mode, self.roi_mode.get(), *RoiTracker.MODES,
+                       command=self._on_roi_mode).pack(fill="x", padx=pad_x, pady=(0, 8))
+
         ttk.Label(self, text="Parameter:",
                   foreground="white", background="#2e2e2e").pack(anchor="w", padx=pad_x, pady=(6, 0))
 
@@ -119,6 +135,13 @@ class AutoLEDDialog(tk.Toplevel):
         if not self.selected_channel.get() and channels:
             self.selected_channel.set(channels[0])
 
+    def _on_roi_mode(self, mode):
+        if mode == "manual" and not self.roi.rect:
+            messagebox.showinfo("Auto-LED", "Bitte zuerst ein Rechteck in der Vorschau ziehen.")
+            self.roi_mode.set(self.roi.mode)
+            return
+        self.roi.set_mode(mode)
+
     # ---------------- Start/Stop ----------------
 
     def toggle_auto_led(self):
@@ -128,6 +151,9 @@ class AutoLEDDialog(tk.Toplevel):
             if not ch:
                 messagebox.showwarning("Auto-LED", "Bitte erst einen LED-Kanal wählen.")
                 return
+            if getattr(self.master, "stream", None) is None:
+                messagebox.showerror("Auto-LED", "Kein Kamerastream verfügbar.")
+                return
 
             # internen Zustand zurücksetzen
             self.current_step = float(self.start_step_var.get() or 20.0)
@@ -144,13 +170,39 @@ class AutoLEDDialog(tk.Toplevel):
             self.status_var.set(f"Regelung aktiv für: {ch}")
             self.toggle_button.config(text="Regelung stoppen")
 
-            self.after(self.loop_ms, self._run_loop)
+            self._params = self._read_params()
+            self._worker = FrameControllerThread(
+                getattr(self.master, "stream", None), self._control_step,
+                tk_widget=self, on_status=self._show_status,
+                fallback_interval=self.loop_ms / 1000.0)
+            self._worker.start()
         else:
             # STOP
+            self._stop_worker()
             self.active.set(False)
             self.status_var.set("Status: inaktiv")
             self.toggle_button.config(text="Regelung starten")
 
+    def _stop_worker(self):
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
+
+    def _read_params(self) -> dict:
+        # nur im Tk-Thread aufrufen; der Worker sieht nur diese Kopie
+        return {
+            "channel": self.selected_channel.get(),
+            "hist_channel": self.hist_channel.get(),
+            "low_limit": int(self.low_limit.get()),
+            "high_limit": int(self.high_limit.get()),
+            "low_fraction_target": float(self.low_fraction_target.get()),
+            "high_fraction_target": float(self.high_fraction_target.get()),
+        }
+
+    def destroy(self):
+        self._stop_worker()
+        super().destroy()
+
     def _reset_single_channel_async(self, channel_name: str):
         def task():
             try:
@@ -162,44 +214,21 @@ class AutoLEDDialog(tk.Toplevel):
 
     # ---------------- Haupt-Regelschleife ----------------
 
-    def _run_loop(self):
-        if not self.active.get():
-            return
-
-        # aktuelles Frame holen
-        frame = getattr(self.master, "stream", None).get_frame() if hasattr(self.master, "stream") else None
-        if frame is None:
-            # kein Bild -> später noch einmal versuchen
-            self.after(self.loop_ms, self._run_loop)
-            return
-
-        f = np.array(frame)  # HxWx3, uint8
-        sel = self.hist_channel.get()
+    def _control_step(self, f: np.ndarray):
+        """Ein Regelschritt im Worker-Thread (keine Tk-Zugriffe)."""
+        p = self._params
+        sel = p["hist_channel"]
+        channel_name = p["channel"]
 
-        if sel == "R":
-            chan = f[:, :, 0]
-        elif sel == "G":
-            chan = f[:, :, 1]
-        elif sel == "B":
-            chan = f[:, :, 2]
-        else:
-            chan = np.mean(f, axis=2)
-
-        chan = chan.astype(np.uint8, copy=False).ravel()
-
-        hist, _ = np.histogram(chan, bins=256, range=(0, 256))
-        total_pixels = max(1, chan.size)
-
-        low_limit = int(self.low_limit.get())
-        high_limit = int(self.high_limit.get())
-        low_fraction_target = float(self.low_fraction_target.get())
-        high_fraction_target = float(self.high_fraction_target.get())
+        low_limit = p["low_limit"]
+        high_limit = p["high_limit"]
+        low_fraction_target = p["low_fraction_target"]
+        high_fraction_target = p["high_fraction_target"]
         eps = 0.002  # 0.2 % Toleranz
 
-        low_count = hist[: low_limit + 1].sum()
-        high_count = hist[255 - high_limit:].sum()
-        low_fraction = low_count / total_pixels
-        high_fraction = high_count / total_pixels
+        # nur innerhalb der ROI messen (None = ganzes Bild)
+        roi = self.roi.get(f)
+        low_fraction, high_fraction = histogram_fractions(f, sel, low_limit, high_limit, roi=roi)
 
         # Fehlermaß: positiv = zu dunkel (zu viel low), negativ = zu hell (zu viel high)
         err_dark = max(0.0, low_fraction - low_fraction_target)
@@ -213,14 +242,10 @@ class AutoLEDDialog(tk.Toplevel):
         else:
             direction = 0
 
-        channel_name = self.selected_channel.get()
-
         # aktuellen PWM-Wert lesen
         current_value = 0.0
         try:
-            if hasattr(self.led, "sliders") and channel_name in self.led.sliders:
-                current_value = float(self.led.sliders[channel_name].get())
-            elif hasattr(self.led, "get_channel_value"):
+            if hasattr(self.led, "get_channel_value"):
                 val = self.led.get_channel_value(channel_name)
                 current_value = float(val or 0.0)
         except Exception:
@@ -239,7 +264,6 @@ class AutoLEDDialog(tk.Toplevel):
                     self.current_step = max(self.current_step / 2.0, self.min_step)
                     self.stagnation_count = 0
 
-        self.step_label_var.set(f"Schritt: {self.current_step:.2f} %")
         self.prev_direction = direction
         self.last_error = error
 
@@ -258,10 +282,34 @@ class AutoLEDDialog(tk.Toplevel):
             except Exception as e:
                 print("[AUTO-LED] set_channel_by_name fehlgeschlagen:", e)
 
-        self.pwm_label_var.set(f"PWM: {new_value:.1f} %")
+        return {
+            "channel": channel_name,
+            "hist_channel": sel,
+            "low_fraction": low_fraction,
+            "high_fraction": high_fraction,
+            "direction": direction,
+            "step": self.current_step,
+            "pwm": new_value,
+            "roi": roi,
+        }
+
+    def _show_status(self, st: dict):
+        """Tk-Thread: Anzeige aktualisieren, geänderte Parameter übernehmen."""
+        if not self.active.get():
+            return
+        if st.get("error"):
+            self.status_var.set(f"Fehler: {st['error']}")
+            self.active.set(False)
+            self.toggle_button.config(text="Regelung starten")
+            return
+        try:
+            self._params = self._read_params()
+        except (tk.TclError, ValueError):
+            pass  # Eingabe gerade unvollständig -> alte Werte behalten
+
+        self.step_label_var.set(f"Schritt: {st['step']:.2f} %")
+        self.pwm_label_var.set(f"PWM: {st['pwm']:.1f} %")
         self.status_var.set(
-            f"{channel_name} [{sel}] – dunkel={low_fraction:.1%}, hell={high_fraction:.1%}, dir={direction:+d}"
+            f"{st['channel']} [{st['hist_channel']}] – dunkel={st['low_fraction']:.1%}, "
+            f"hell={st['high_fraction']:.1%}, dir={st['direction']:+d}"
         )
-
-        # nächster Zyklus
-        self.after(self.loop_ms, self._run_loop)
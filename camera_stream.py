@@ -1,9 +1,13 @@
 # camera_stream.py
 import os
+import shutil
+import signal
 import subprocess
+import tempfile
 import threading
 import time
 from collections import deque
+from contextlib import contextmanager
 import re
 import numpy as np
 import cv2
@@ -35,9 +39,23 @@ class CameraStream:
 
         self.buffer = b""
         self.frame = None
+        self.frame_np = None      # gleiches Bild als RGB-ndarray (read-only)
+        self.frame_seq = 0        # zählt jedes neue Bild hoch
+        self._frame_cond = threading.Condition()
         self.running = False
         self.preview_paused = False
         self.stderr_lines = deque(maxlen=200)
+
+        # Sequenz-Modus: Vorschau bleibt aus, Stills über eine offene libcamera-still-Sitzung
+        self.sequence_active = False
+        self.still_session_enabled = True
+        self.still_session_warmup = 1.5     # s bis libcamera-still auf SIGUSR1 reagiert
+        self._still_session = None
+        self._still_session_failed = False
+        self.still_session_dir = None       # Sitzungsdateien hier (gleiches Dateisystem wie die Ziele)
+        self.still_launches = 0             # Diagnose: Kamera-Neustarts für Stills
+        self.last_capture_timing = {}       # Phasen der letzten Aufnahme in s (siehe _timed)
+
         self._supported_vid_opts = self._probe_supported_options("libcamera-vid")
         self._supported_still_opts = self._probe_supported_options("libcamera-still")
 
@@ -136,6 +154,7 @@ class CameraStream:
                 self._stderr_thread = None
 
     def reconfigure(self, **kwargs):
+        was_running = self.running
         self.stop()
 
         # robust: libcamera mag hier i.d.R. ints (framerate/shutter/width/height)
@@ -155,7 +174,10 @@ class CameraStream:
 
         self.buffer = b""
         self.frame = None
-        self.start()
+        self.frame_np = None
+        # im Sequenz-Modus nur neu starten, wenn gerade gemessen wird
+        if not self.sequence_active or was_running:
+            self.start()
 
     def set_extra_options(self, extra_opts: dict):
         self.extra_opts = dict(extra_opts or {})
@@ -248,7 +270,12 @@ class CameraStream:
                     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
                     if not self.preview_paused:
-                        self.frame = Image.fromarray(img)
+                        img.flags.writeable = False
+                        with self._frame_cond:
+                            self.frame_np = img
+                            self.frame = Image.fromarray(img)
+                            self.frame_seq += 1
+                            self._frame_cond.notify_all()
 
             except Exception as e:
                 self.stderr_lines.append(f"[CameraStream error] {e}")
@@ -257,8 +284,39 @@ class CameraStream:
     def get_frame(self):
         return self.frame
 
+    def get_frame_np(self):
+        return self.frame_np
+
+    def wait_frame(self, last_seq=0, timeout=1.0):
+        """
+        Blockiert, bis ein neueres Bild als last_seq vorliegt.
+        Rückgabe (seq, ndarray) bzw. (last_seq, None) bei Timeout.
+        """
+        with self._frame_cond:
+            self._frame_cond.wait_for(
+                lambda: self.frame_seq > last_seq and self.frame_np is not None, timeout)
+            if self.frame_seq > last_seq and self.frame_np is not None:
+                return self.frame_seq, self.frame_np
+            return last_seq, None
+
     # ---------- Still capture helpers ----------
 
+    @contextmanager
+    def _timed(self, key):
+        # Dauer in last_capture_timing[key] aufsummieren (monotone Uhr)
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            d = self.last_capture_timing
+            d[key] = round(d.get(key, 0.0) + time.perf_counter() - t, 4)
+
+    def _oneshot(self, cmd, timeout):
+        # eigener libcamera-still-Prozess: Kamera-Init + Aufnahme + Schreiben, nicht trennbar
+        self.last_capture_timing["path"] = "oneshot"
+        with self._timed("oneshot_s"):
+            self._run_capture(cmd, timeout=timeout)
+
     def _run_capture(self, cmd, timeout=10):
         res = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         if res.returncode != 0:
@@ -296,27 +354,9 @@ class CameraStream:
 
         return base_cmd
 
-    def capture_still(self, filename="capture.jpg", fmt="jpg",
-                      width=None, height=None, shutter=None, gain=None):
-        """
-        Speichert ein 'entwickeltes' Bild (jpg/png/tiff/bmp) über libcamera-still.
-        Berücksichtigt extra_opts (AWB off, awbgains, denoise,...).
-        """
-        fmt = (fmt or "jpg").lower()
-        enc = "jpg" if fmt == "jpeg" else fmt
-        if enc not in ("jpg", "png", "tiff", "bmp"):
-            raise ValueError(f"Unsupported format: {fmt}")
-
-        filename = os.path.expanduser(filename)
-        base, ext = os.path.splitext(filename)
-        if ext.lower() != f".{enc}":
-            filename = base + f".{enc}"
-        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
-
-        w = width or self.width
-        h = height or self.height
+    def _still_base_cmd(self, width=None, height=None, shutter=None, gain=None):
+        # gemeinsame libcamera-still-Optionen (ohne Format und Ziel)
         extra = self.extra_opts or {}
-
         if extra.get("ae", False):
             sh = None
             gn = None
@@ -329,28 +369,47 @@ class CameraStream:
             "-n",
             "--immediate",
             "--timeout", "1",
-            "--width", str(w),
-            "--height", str(h),
-            "--encoding", enc,
+            "--width", str(width or self.width),
+            "--height", str(height or self.height),
         ]
         if sh:
             base_cmd += ["--shutter", str(sh)]
         if gn:
             base_cmd += ["--gain", str(gn)]
-        base_cmd = self._apply_extra_to_still(base_cmd, extra)
-        base_cmd += ["-o", filename]
+        return self._apply_extra_to_still(base_cmd, extra)
+
+    def capture_still(self, filename="capture.jpg", fmt="jpg",
+                      width=None, height=None, shutter=None, gain=None):
+        """
+        Speichert ein 'entwickeltes' Bild (jpg/png/tiff/bmp) über libcamera-still.
+        Berücksichtigt extra_opts (AWB off, awbgains, denoise,...).
+        """
+        fmt = (fmt or "jpg").lower()
+        enc = "jpg" if fmt == "jpeg" else fmt
+        if enc not in ("jpg", "png", "tiff", "bmp"):
+            raise ValueError(f"Unsupported format: {fmt}")
+
+        filename = os.path.expanduser(filename)
+        base, ext = os.path.splitext(filename)
+        if ext.lower() != f".{enc}":
+            filename = base + f".{enc}"
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+
+        base_cmd = self._still_base_cmd(width, height, shutter, gain)
+        base_cmd += ["--encoding", enc, "-o", filename]
 
         was_running = self.running
         self.preview_paused = True
+        self.last_capture_timing = {}
         if was_running:
-            self.stop()
+            with self._timed("preview_stop_s"):
+                self.stop()
         try:
-            self._run_capture(base_cmd, timeout=15)
+            if not self._session_capture(base_cmd, {enc: filename}):
+                self._oneshot(base_cmd, 15)
             return filename
         finally:
-            if was_running:
-                self.start()
-            self.preview_paused = False
+            self._after_capture(was_running)
 
     def capture_raw_dng(self, filename="capture.dng", width=None, height=None,
                         shutter=None, gain=None, both=False):
@@ -362,54 +421,36 @@ class CameraStream:
         filename = os.path.expanduser(filename)
         base, ext = os.path.splitext(filename)
 
-        w = width or self.width
-        h = height or self.height
-        extra = self.extra_opts or {}
-
-        if extra.get("ae", False):
-            sh = None
-            gn = None
-        else:
-            sh = shutter if shutter is not None else self.shutter
-            gn = gain if gain is not None else self.gain
-
-        base_cmd = [
-            "libcamera-still",
-            "-n",
-            "--immediate",
-            "--timeout", "1",
-            "--width", str(w),
-            "--height", str(h),
-        ]
-        if sh:
-            base_cmd += ["--shutter", str(sh)]
-        if gn:
-            base_cmd += ["--gain", str(gn)]
-        base_cmd = self._apply_extra_to_still(base_cmd, extra)
+        base_cmd = self._still_base_cmd(width, height, shutter, gain)
 
         was_running = self.running
         self.preview_paused = True
+        self.last_capture_timing = {}
         if was_running:
-            self.stop()
+            with self._timed("preview_stop_s"):
+                self.stop()
         try:
             if both:
                 jpg_path = base + ".jpg" if ext.lower() != ".jpg" else filename
                 os.makedirs(os.path.dirname(jpg_path) or ".", exist_ok=True)
-                cmd = base_cmd + ["-r", "-o", jpg_path]
-                self._run_capture(cmd, timeout=20)
                 dng_path = os.path.splitext(jpg_path)[0] + ".dng"
+                if not self._session_capture(base_cmd, {"jpg": jpg_path, "dng": dng_path}):
+                    cmd = base_cmd + ["-r", "-o", jpg_path]
+                    self._oneshot(cmd, 20)
                 return jpg_path, dng_path
             else:
                 dng_path = base + ".dng" if ext.lower() != ".dng" else filename
                 os.makedirs(os.path.dirname(dng_path) or ".", exist_ok=True)
+                if self._session_capture(base_cmd, {"dng": dng_path}):
+                    return dng_path
                 cmd = base_cmd + ["--raw", "-o", dng_path]
                 try:
-                    self._run_capture(cmd, timeout=20)
+                    self._oneshot(cmd, 20)
                 except RuntimeError:
                     # Fallback für Builds ohne --raw: -r erzeugt JPEG+DNG
                     jpg_tmp = base + ".tmp.jpg"
                     cmd_fb = base_cmd + ["-r", "-o", jpg_tmp]
-                    self._run_capture(cmd_fb, timeout=20)
+                    self._oneshot(cmd_fb, 20)
                     dng_path = os.path.splitext(jpg_tmp)[0] + ".dng"
                     try:
                         os.remove(jpg_tmp)
@@ -417,6 +458,253 @@ class CameraStream:
                         pass
                 return dng_path
         finally:
-            if was_running:
+            self._after_capture(was_running)
+
+    def burst_supported(self):
+        return {"--frames", "--timelapse"} <= self._supported_still_opts
+
+    def capture_burst(self, directory, count, stem="frame", jpeg=True, raw=False,
+                      width=None, height=None, shutter=None, gain=None):
+        """
+        count Aufnahmen in einem libcamera-still-Aufruf (--timelapse 0 --frames count):
+        ein Kamera-Start für alle Bilder statt einer pro Bild.
+        Rückgabe: Liste {"jpeg": pfad, "raw": pfad} in Aufnahmereihenfolge (nur
+        tatsächlich geschriebene Bilder), None ohne --frames/--timelapse.
+        """
+        if count < 1 or not self.burst_supported():
+            return None
+        os.makedirs(directory, exist_ok=True)
+        pattern = os.path.join(directory, stem + "_%03d.jpg")
+        cmd = [c for c in self._still_base_cmd(width, height, shutter, gain) if c != "--immediate"]
+        i = cmd.index("--timeout")
+        del cmd[i:i + 2]
+        cmd += ["-t", "0", "--timelapse", "0", "--frames", str(int(count)),
+                "--encoding", "jpg"]
+        if raw:
+            cmd += ["-r"]
+        cmd += ["-o", pattern]
+
+        exp_s = (shutter or self.shutter or 0) / 1e6
+        was_running = self.running
+        self.preview_paused = True
+        self.last_capture_timing = {"path": "burst"}
+        if was_running:
+            with self._timed("preview_stop_s"):
+                self.stop()
+        try:
+            with self._timed("burst_s"):
+                self._run_capture(cmd, timeout=15 + count * (1.0 + exp_s))
+        finally:
+            self._after_capture(was_running)
+
+        frames = []
+        for n in range(int(count)):
+            jpg = pattern % n
+            if not os.path.exists(jpg):
+                continue
+            entry = {}
+            if jpeg:
+                entry["jpeg"] = jpg
+            else:
+                os.remove(jpg)
+            dng = os.path.splitext(jpg)[0] + ".dng"
+            if raw and os.path.exists(dng):
+                entry["raw"] = dng
+            if entry:
+                frames.append(entry)
+        return frames
+
+    def _after_capture(self, was_running):
+        # im Sequenz-Modus bleibt die Vorschau aus (niemand schaut zu)
+        if was_running and not self.sequence_active:
+            with self._timed("preview_restart_s"):
                 self.start()
+        self.preview_paused = False
+
+    # ---------- Sequenz-Modus ----------
+
+    @contextmanager
+    def sequence_mode(self, work_dir=None):
+        """
+        Für Aufnahmesequenzen: Vorschau einmal stoppen, erst am Ende wieder starten.
+          - capture_*() starten die Vorschau nicht neu
+          - ensure_preview() startet sie nur, wenn Kamerabilder gebraucht werden
+          - Stills laufen über eine offene libcamera-still --signal Sitzung
+            (kein Kamera-Init pro Aufnahme), neu gestartet nur bei geänderten
+            Parametern; ohne --signal wie bisher einzeln
+        work_dir: Ordner für die Sitzungsdateien (Sequenzordner); /tmp ist auf dem
+        Pi tmpfs, Verschieben von dort auf SD/USB wäre eine Kopie.
+        """
+        was_running = self.running
+        self.sequence_active = True
+        self.still_session_dir = work_dir
+        self.stop()
+        try:
+            yield self
+        finally:
+            self._close_still_session()
+            self.sequence_active = False
+            self.still_session_dir = None
             self.preview_paused = False
+            # Ausgangszustand wiederherstellen: auch eine per ensure_preview()
+            # gestartete Vorschau (CLI/Zeitraffer) gibt die Kamera wieder frei
+            if was_running and not self.running:
+                self.start()
+            elif not was_running and self.running:
+                self.stop()
+
+    def ensure_preview(self):
+        """Vorschau für Messbilder (Auto-LED) starten; offene Still-Sitzung gibt die Kamera frei."""
+        if self.running:
+            return
+        self._close_still_session()
+        self.start()
+
+    def _session_usable(self):
+        return (self.sequence_active and self.still_session_enabled
+                and not self._still_session_failed
+                and "--signal" in self._supported_still_opts)
+
+    def _open_still_session(self, key, base_cmd, raw, target_dir):
+        work_dir = self.still_session_dir or target_dir
+        os.makedirs(work_dir, exist_ok=True)
+        tmpdir = tempfile.mkdtemp(prefix=".still_session_", dir=work_dir)
+        pattern = os.path.join(tmpdir, "seq_%05d.jpg")
+        # Einzelaufnahme-Optionen durch Dauerbetrieb ersetzen
+        cmd = [c for c in base_cmd if c not in ("--immediate",)]
+        if "--timeout" in cmd:
+            i = cmd.index("--timeout")
+            del cmd[i:i + 2]
+        cmd += ["-t", "0", "--signal"]
+        if raw:
+            cmd += ["-r"]
+        cmd += ["-o", pattern]
+
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self.still_launches += 1
+        time.sleep(self.still_session_warmup)
+        if proc.poll() is not None:
+            err = (proc.stderr.read() or b"").decode(errors="replace").strip()
+            self.stderr_lines.append("[still-session] exited: " + err[-500:])
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return None
+        self._still_session = {"key": key, "proc": proc, "dir": tmpdir,
+                               "pattern": pattern, "next": 0}
+        return self._still_session
+
+    def _close_still_session(self):
+        sess, self._still_session = self._still_session, None
+        if not sess:
+            return
+        proc = sess["proc"]
+        try:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGUSR2)     # libcamera-apps: beenden
+                proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+        shutil.rmtree(sess["dir"], ignore_errors=True)
+
+    @staticmethod
+    def _held_open(pid, path):
+        """Hat der Prozess die Datei noch offen? None, wenn /proc nicht lesbar ist."""
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            return None
+        real = os.path.realpath(path)
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)) == real:
+                    return True
+            except OSError:
+                continue
+        return False
+
+    @staticmethod
+    def _jpeg_complete(path):
+        # JPEG endet mit EOI (FF D9)
+        try:
+            with open(path, "rb") as f:
+                f.seek(-2, os.SEEK_END)
+                return f.read(2) == b"\xff\xd9"
+        except OSError:
+            return False
+
+    def _wait_file(self, path, deadline, pid=None):
+        """
+        Fertig, wenn die Datei existiert, ihre Größe stehen bleibt, libcamera-still
+        sie nicht mehr offen hat und ein JPEG mit EOI endet.
+        """
+        last = -1
+        is_jpeg = path.lower().endswith(".jpg")
+        while time.time() < deadline:
+            if os.path.exists(path):
+                size = os.path.getsize(path)
+                if (size > 0 and size == last
+                        and not (pid is not None and self._held_open(pid, path))
+                        and (not is_jpeg or self._jpeg_complete(path))):
+                    return True
+                last = size
+            time.sleep(0.03)
+        return False
+
+    def _session_capture(self, base_cmd, outputs, timeout=10.0):
+        """
+        Aufnahme über die offene Sitzung. outputs: {"jpg": ziel, "dng": ziel} (dng optional).
+        False -> Aufrufer nimmt den Einzelaufruf.
+        """
+        if not self._session_usable() or set(outputs) - {"jpg", "dng"}:
+            return False
+        raw = "dng" in outputs
+        if "-o" in base_cmd:                 # Ziel bestimmt die Sitzung, nicht der Aufrufer
+            i = base_cmd.index("-o")
+            base_cmd = base_cmd[:i] + base_cmd[i + 2:]
+        key = (tuple(base_cmd), raw)
+
+        sess = self._still_session
+        if sess is None or sess["key"] != key or sess["proc"].poll() is not None:
+            self._close_still_session()
+            with self._timed("session_launch_s"):
+                target_dir = os.path.dirname(os.path.abspath(next(iter(outputs.values()))))
+                sess = self._open_still_session(key, base_cmd, raw, target_dir)
+            if sess is None:
+                self._still_session_failed = True
+                return False
+
+        idx = sess["next"]
+        sess["next"] += 1
+        jpg_tmp = sess["pattern"] % idx
+        dng_tmp = os.path.splitext(jpg_tmp)[0] + ".dng"
+
+        self.last_capture_timing["path"] = "session"
+        sess["proc"].send_signal(signal.SIGUSR1)
+        deadline = time.time() + timeout
+        pid = sess["proc"].pid
+        with self._timed("session_jpeg_s"):
+            ok = self._wait_file(jpg_tmp, deadline, pid)
+        if ok and raw:
+            with self._timed("session_dng_extra_s"):      # DNG kommt nach dem JPEG
+                ok = self._wait_file(dng_tmp, deadline, pid)
+        if not ok:
+            self.stderr_lines.append("[still-session] keine Datei nach SIGUSR1, Einzelaufnahme")
+            self._close_still_session()
+            self._still_session_failed = True
+            return False
+
+        try:
+            with self._timed("move_s"):
+                # gleiches Dateisystem -> rename; sonst kopiert shutil.move
+                if "jpg" in outputs:
+                    shutil.move(jpg_tmp, outputs["jpg"])
+                else:
+                    os.remove(jpg_tmp)
+                if raw:
+                    shutil.move(dng_tmp, outputs["dng"])
+        except OSError as e:
+            self.stderr_lines.append(f"[still-session] Verschieben fehlgeschlagen ({e}), Einzelaufnahme")
+            self._close_still_session()
+            self._still_session_failed = True
+            return False
+        return True
@@ -0,0 +1,75 @@
+# dark_frames.py
+"""
+Dunkelbilder einer Sequenz (alle LEDs aus) und Dunkelbild-Abzug.
+
+Pro IR-Zustand und Shutter/Gain wird einmal ein Dunkelbild aufgenommen
+(IR_<state>/dark_<shutter>us_g<gain>/) und für alle Kanäle mit derselben
+Belichtung wiederverwendet. Der Abzug läuft im PostWorker neben dem nächsten
+Schritt:
+  JPEG -> capture_darksub.png  (8 Bit, negative Werte auf 0)
+  DNG  -> capture_darksub.npy  (Bayer-Rohdaten uint16, nur mit rawpy)
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+try:
+    import rawpy
+except ImportError:
+    rawpy = None
+
+OUTPUTS = {"jpeg": "capture_darksub.png", "raw": "capture_darksub.npy"}
+
+
+def dark_label(ir_state, shutter, gain):
+    """Journal-/Ordnername des Dunkelbilds, z.B. IR_OUT/dark_20000us_g1."""
+    g = 1.0 if gain is None else float(gain)
+    return f"IR_{ir_state}/dark_{int(shutter)}us_g{g:g}"
+
+
+def _subtract(img, dark):
+    if img.shape != dark.shape:
+        raise ValueError(f"Dunkelbild {dark.shape} passt nicht zu {img.shape}")
+    return np.clip(img.astype(np.int32) - dark.astype(np.int32), 0, None)
+
+
+def read_raw(path):
+    """Sichtbare Bayer-Rohdaten eines DNG (uint16)."""
+    with rawpy.imread(path) as raw:
+        return raw.raw_image_visible.copy()
+
+
+def subtract_jpeg(path, dark_path, out_path):
+    img = np.asarray(Image.open(path))
+    dark = np.asarray(Image.open(dark_path))
+    Image.fromarray(_subtract(img, dark).astype(np.uint8)).save(out_path, format="PNG")
+
+
+def subtract_raw(path, dark_path, out_path):
+    np.save(out_path, _subtract(read_raw(path), read_raw(dark_path)).astype(np.uint16))
+
+
+def subtract_dark(ch_dir, files, base_dir, dark_files):
+    """
+    files: {"jpeg": "capture.jpg", "raw": "capture.dng"} relativ zu ch_dir,
+    dark_files: dasselbe für das Dunkelbild, relativ zu base_dir.
+    Rückgabe (neue Dateien {"jpeg_darksub": ...} relativ zu ch_dir, Hinweise).
+    """
+    out, notes = {}, {}
+    for fmt, fn in (("jpeg", subtract_jpeg), ("raw", subtract_raw)):
+        if not isinstance(files.get(fmt), str):
+            continue
+        if fmt not in dark_files:
+            notes[fmt] = "kein Dunkelbild in diesem Format"
+            continue
+        if fmt == "raw" and rawpy is None:
+            notes[fmt] = "rawpy nicht installiert"
+            continue
+        try:
+            fn(os.path.join(ch_dir, files[fmt]), os.path.join(base_dir, dark_files[fmt]),
+               os.path.join(ch_dir, OUTPUTS[fmt]))
+            out[fmt + "_darksub"] = OUTPUTS[fmt]
+        except Exception as e:
+            notes[fmt] = str(e)
+    return out, notes
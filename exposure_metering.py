@@ -0,0 +1,221 @@
+# exposure_metering.py
+import threading
+import time
+
+import numpy as np
+import cv2
+
+
+def channel_plane(frame_np: np.ndarray, sel: str = "Gray") -> np.ndarray:
+    """
+    Liefert die 2D-uint8-Ebene für die Histogrammauswertung (Gray/R/G/B).
+    Gray = floor(mean(R,G,B)) wie bisher, aber ohne float64-Zwischenbild.
+    """
+    if sel == "R":
+        return frame_np[:, :, 0]
+    if sel == "G":
+        return frame_np[:, :, 1]
+    if sel == "B":
+        return frame_np[:, :, 2]
+    return (frame_np.sum(axis=2, dtype=np.uint16) // 3).astype(np.uint8)
+
+
+def find_roi(frame_np: np.ndarray, threshold: int = 200):
+    """
+    Probe vor hellem Hintergrund finden (Schwellwert + größte Kontur).
+    Rückgabe (x, y, w, h); ohne Kontur das ganze Bild.
+    """
+    gray = cv2.cvtColor(frame_np, cv2.COLOR_RGB2GRAY)
+    _, mask = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    if contours:
+        c = max(contours, key=cv2.contourArea)
+        x, y, w, h = cv2.boundingRect(c)
+        return (x, y, w, h)
+    return (0, 0, frame_np.shape[1], frame_np.shape[0])
+
+
+def crop_roi(frame_np: np.ndarray, roi):
+    """Ausschnitt (View, keine Kopie). roi=None -> ganzes Bild."""
+    if not roi:
+        return frame_np
+    fh, fw = frame_np.shape[:2]
+    x, y, w, h = (int(v) for v in roi)
+    x0 = max(0, min(fw - 1, x))
+    y0 = max(0, min(fh - 1, y))
+    x1 = max(x0 + 1, min(fw, x + w))
+    y1 = max(y0 + 1, min(fh, y + h))
+    return frame_np[y0:y1, x0:x1]
+
+
+def histogram_fractions(frame_np: np.ndarray, sel: str, low_limit: int, high_limit: int, roi=None):
+    """
+    Anteil dunkler (<= low_limit) und heller (>= 255-high_limit) Pixel,
+    nur innerhalb der ROI. Rückgabe (low_fraction, high_fraction).
+    """
+    chan = channel_plane(crop_roi(frame_np, roi), sel).ravel()
+    hist = np.bincount(chan, minlength=256)
+    total = max(1, chan.size)
+    low = hist[: int(low_limit) + 1].sum() / total
+    high = hist[255 - int(high_limit):].sum() / total
+    return float(low), float(high)
+
+
+def frame_stats(frame_np: np.ndarray, sel: str = "Gray", roi=None, bins: int = 32):
+    """Mittelwert (DN) und normiertes Grobhistogramm (bins Klassen, Summe 1) der ROI."""
+    chan = channel_plane(crop_roi(frame_np, roi), sel).ravel()
+    hist = np.bincount(chan // (256 // bins), minlength=bins).astype(np.float32)
+    return float(chan.mean()), hist / max(1, chan.size)
+
+
+class SettleDetector:
+    """
+    Bildfolge nach einer LED-/Belichtungsänderung eingeschwungen?
+    Vergleicht jedes Bild mit dem vorigen: Mittelwert-Änderung (DN) und L1-Abstand
+    der Grobhistogramme (0..2). Eingeschwungen, wenn beide k-mal in Folge unter
+    mean_tol bzw. hist_tol liegen.
+    """
+
+    def __init__(self, sel="Gray", roi=None, mean_tol=0.5, hist_tol=0.02, k=2):
+        self.sel = sel
+        self.roi = roi
+        self.mean_tol = float(mean_tol)
+        self.hist_tol = float(hist_tol)
+        self.k = max(1, int(k))
+        self.reset()
+
+    def reset(self):
+        self._prev = None
+        self.stable = 0
+        self.frames = 0
+        self.last_delta = None       # (d_mean, d_hist) der letzten beiden Bilder
+
+    def update(self, frame_np):
+        mean, hist = frame_stats(frame_np, self.sel, self.roi)
+        self.frames += 1
+        if self._prev is not None:
+            d_mean = abs(mean - self._prev[0])
+            d_hist = float(np.abs(hist - self._prev[1]).sum())
+            self.last_delta = (d_mean, d_hist)
+            quiet = d_mean < self.mean_tol and d_hist < self.hist_tol
+            self.stable = self.stable + 1 if quiet else 0
+        self._prev = (mean, hist)
+        return self.stable >= self.k
+
+
+def wait_settled(next_frame, detector: SettleDetector, timeout: float, skip: int = 1):
+    """
+    Bilder holen, bis detector eingeschwungen meldet, höchstens timeout Sekunden.
+    next_frame(rest_s) -> nächstes neue Bild (ndarray) oder None (keins gekommen).
+    Die ersten skip Bilder sind evtl. noch mit altem Licht belichtet und zählen nicht.
+    Rückgabe {"settled", "frames", "elapsed_s", "delta", "frame"} (frame: letztes Bild).
+    """
+    detector.reset()
+    t0 = time.monotonic()
+    deadline = t0 + timeout
+    frame = None
+    n = 0
+    settled = False
+    while not settled:
+        rest = deadline - time.monotonic()
+        if rest <= 0:
+            break
+        f = next_frame(rest)
+        if f is None:
+            break
+        frame = f
+        n += 1
+        if n > skip:
+            settled = detector.update(f)
+    return {
+        "settled": settled,
+        "frames": n,
+        "elapsed_s": time.monotonic() - t0,
+        "delta": detector.last_delta,
+        "frame": frame,
+    }
+
+
+class RoiTracker:
+    """
+    ROI für die Belichtungsmessung.
+      mode "off"    : ganzes Bild
+      mode "manual" : vom Benutzer gezogenes Rechteck (relativ 0..1, damit
+                      es Auflösungswechsel übersteht)
+      mode "auto"   : find_roi() einmal ausführen und cachen, bis sich die
+                      Szene merklich ändert. Vergleich über eine
+                      helligkeitsnormierte Miniatur -> reine PWM-Änderungen
+                      lösen keine Neuerkennung aus.
+    Ein Schreiber (GUI) und mehrere Leser (Regler) sind erlaubt.
+    """
+    MODES = ("off", "manual", "auto")
+    THUMB = (32, 24)
+
+    def __init__(self, mode="off", rect=None, change_threshold=0.15, threshold=200):
+        self.mode = mode if mode in self.MODES else "off"
+        self.rect = tuple(rect) if rect else None   # (x, y, w, h) relativ
+        self.change_threshold = float(change_threshold)
+        self.threshold = int(threshold)
+
+        self._lock = threading.Lock()
+        self._cached = None          # (x, y, w, h) in Pixeln
+        self._cached_shape = None
+        self._signature = None
+        self.detections = 0          # Anzahl find_roi()-Aufrufe (Diagnose)
+
+    # ---------- Konfiguration ----------
+
+    def set_manual(self, rect):
+        """rect relativ (x, y, w, h) in 0..1."""
+        with self._lock:
+            self.rect = tuple(float(v) for v in rect)
+            self.mode = "manual"
+
+    def set_manual_pixels(self, rect, frame_size):
+        fw, fh = frame_size
+        x, y, w, h = rect
+        self.set_manual((x / fw, y / fh, w / fw, h / fh))
+
+    def set_mode(self, mode):
+        with self._lock:
+            self.mode = mode if mode in self.MODES else "off"
+            self._signature = None
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    # ---------- Abfrage ----------
+
+    def _scene_signature(self, frame_np):
+        small = cv2.resize(frame_np, self.THUMB, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.float32)
+        return gray / (gray.mean() + 1e-3)
+
+    def get(self, frame_np):
+        """ROI in Pixelkoordinaten (x, y, w, h) oder None (= ganzes Bild)."""
+        with self._lock:
+            if self.mode == "manual" and self.rect:
+                fh, fw = frame_np.shape[:2]
+                x, y, w, h = self.rect
+                return (int(x * fw), int(y * fh), max(1, int(w * fw)), max(1, int(h * fh)))
+
+            if self.mode != "auto":
+                return None
+
+            sig = self._scene_signature(frame_np)
+            stale = (
+                self._signature is None
+                or self._cached_shape != frame_np.shape
+                or float(np.mean(np.abs(sig - self._signature))) > self.change_threshold
+            )
+            if stale:
+                self._cached = find_roi(frame_np, self.threshold)
+                self._cached_shape = frame_np.shape
+                self._signature = sig
+                self.detections += 1
+            return self._cached
+
+    def crop(self, frame_np):
+        return crop_roi(frame_np, self.get(frame_np))
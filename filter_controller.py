@@ -1,4 +1,4 @@
-import pigpio
+from hw_backend import pigpio
 import time
 
 class IRFilterController:
@@ -0,0 +1,164 @@
+# frame_average.py
+"""
+N Aufnahmen eines Kanals mitteln (schwache LEDs wie UV/NIR statt mehr Gain).
+
+Mittelwert und Varianz laufen nach Welford in float32 mit: der Speicher bleibt
+bei einem Bild (plus Varianz), egal wie groß N ist. Das Rauschen sinkt um
+sqrt(N). Jedes Bild ist eine volle Still-Aufnahme (Belichtung plus JPEG/DNG
+schreiben und wieder lesen), aber ohne eigenen Kamera-Start: im Sequenz-Modus
+per SIGUSR1 aus der offenen libcamera-still-Sitzung, sonst als Serie in einem
+Aufruf (--timelapse 0 --frames N). Nur wenn beides fehlt, ist es ein eigener
+libcamera-still-Aufruf pro Bild (SequenceEngine warnt und vermerkt das).
+  JPEG -> capture_mean.tif      uint16, Mittelwert x 256
+          capture_var.npy       float32, DN² (optional)
+  DNG  -> capture_raw_mean.npy  float32, Bayer-Rohdaten (nur mit rawpy)
+          capture_raw_var.npy   float32 (optional)
+Mit Dunkelbildern (dark_frames) zusätzlich capture_mean_darksub.tif bzw.
+capture_raw_mean_darksub.npy; das Dunkelbild wird dafür mit demselben N gemittelt.
+"""
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from dark_frames import rawpy, read_raw
+
+OUTPUTS = {
+    "jpeg": ("capture_mean.tif", "capture_var.npy"),
+    "raw": ("capture_raw_mean.npy", "capture_raw_var.npy"),
+}
+DARKSUB = {"jpeg": "capture_mean_darksub.tif", "raw": "capture_raw_mean_darksub.npy"}
+
+
+def load_frame(path, fmt):
+    if fmt == "raw":
+        return read_raw(path)
+    return np.asarray(Image.open(path))
+
+
+def write_mean(path, fmt, mean):
+    """JPEG-Mittel als uint16-TIFF (x 256, RGB), RAW-Mittel als float32-NPY."""
+    if fmt == "raw":
+        np.save(path, mean.astype(np.float32))
+        return
+    mean16 = np.clip(np.rint(mean * 256.0), 0, 65535).astype(np.uint16)
+    if mean16.ndim == 3:
+        mean16 = cv2.cvtColor(mean16, cv2.COLOR_RGB2BGR)
+    if not cv2.imwrite(path, mean16):
+        raise RuntimeError(f"{os.path.basename(path)} nicht geschrieben")
+
+
+def read_mean(path, fmt):
+    """Gegenstück zu write_mean: float32 in DN des Ausgangsformats."""
+    if fmt == "raw":
+        return np.load(path).astype(np.float32)
+    mean16 = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if mean16 is None:
+        raise RuntimeError(f"{os.path.basename(path)} nicht lesbar")
+    if mean16.ndim == 3:
+        mean16 = cv2.cvtColor(mean16, cv2.COLOR_BGR2RGB)
+    return mean16.astype(np.float32) / 256.0
+
+
+def subtract_dark_mean(ch_dir, files, base_dir, dark_files):
+    """
+    Dunkelbild von den Mittelwerten abziehen (negative Werte auf 0).
+    files: meta["files"] relativ zu ch_dir, dark_files: relativ zu base_dir.
+    Bevorzugt das gemittelte Dunkelbild, sonst das einzelne (mit Hinweis: dessen
+    Rauschen geht dann ungemittelt ein). Rückgabe (neue Dateien, Hinweise).
+    """
+    out, notes = {}, {}
+    for fmt in ("jpeg", "raw"):
+        name = files.get(fmt + "_mean")
+        if not isinstance(name, str):
+            continue
+        key = fmt + "_mean_darksub"
+        try:
+            mean = read_mean(os.path.join(ch_dir, name), fmt)
+            if fmt + "_mean" in dark_files:
+                dark = read_mean(os.path.join(base_dir, dark_files[fmt + "_mean"]), fmt)
+            elif fmt in dark_files:
+                dark = load_frame(os.path.join(base_dir, dark_files[fmt]), fmt).astype(np.float32)
+                notes[key] = "Dunkelbild nicht gemittelt"
+            else:
+                notes[key] = "kein Dunkelbild in diesem Format"
+                continue
+            if dark.shape != mean.shape:
+                raise ValueError(f"Dunkelbild {dark.shape} passt nicht zu {mean.shape}")
+            write_mean(os.path.join(ch_dir, DARKSUB[fmt]), fmt, np.clip(mean - dark, 0, None))
+            out[key] = DARKSUB[fmt]
+        except Exception as e:
+            notes[key] = str(e)
+    return out, notes
+
+
+class RunningMean:
+    """Mittelwert (und Stichproben-Varianz) über nacheinander eingerechnete Bilder."""
+
+    def __init__(self, variance=False):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+        self.track_variance = variance
+
+    def add(self, frame):
+        x = np.asarray(frame, dtype=np.float32)
+        self.n += 1
+        if self.mean is None:
+            self.mean = x.copy()
+            if self.track_variance:
+                self.m2 = np.zeros_like(x)
+            return
+        if x.shape != self.mean.shape:
+            raise ValueError(f"Bildgröße {x.shape} statt {self.mean.shape}")
+        delta = x - self.mean
+        self.mean += delta / self.n
+        if self.m2 is not None:
+            self.m2 += delta * (x - self.mean)
+
+    def variance(self):
+        return self.m2 / max(1, self.n - 1)
+
+
+class FrameAverager:
+    """
+    Aufnahmen eines Kanals nacheinander einrechnen (ein Thread, z.B. PostWorker)
+    und am Ende schreiben. formats: ("jpeg", "raw"); RAW ohne rawpy wird übergangen.
+    """
+
+    def __init__(self, formats, variance=False):
+        self.skipped = {}
+        if "raw" in formats and rawpy is None:
+            self.skipped["raw"] = "rawpy nicht installiert"
+        self.acc = {f: RunningMean(variance) for f in formats if f not in self.skipped}
+
+    def add(self, paths, remove=False):
+        """paths: {"jpeg": pfad, "raw": pfad}; remove: temporäre Dateien danach löschen."""
+        try:
+            for fmt, acc in self.acc.items():
+                acc.add(load_frame(paths[fmt], fmt))
+        finally:
+            if remove:
+                for p in paths.values():
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+
+    def write(self, out_dir):
+        """Rückgabe {"jpeg_mean": datei, ...} relativ zu out_dir."""
+        files = {}
+        for fmt, acc in self.acc.items():
+            if acc.mean is None:
+                continue
+            mean_name, var_name = OUTPUTS[fmt]
+            write_mean(os.path.join(out_dir, mean_name), fmt, acc.mean)
+            files[fmt + "_mean"] = mean_name
+            if acc.m2 is not None and acc.n > 1:
+                np.save(os.path.join(out_dir, var_name), acc.variance())
+                files[fmt + "_var"] = var_name
+        return files
+
+    def frames(self):
+        return max((acc.n for acc in self.acc.values()), default=0)
@@ -0,0 +1,107 @@
+# frame_controller.py
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class FrameControllerThread:
+    """
+    Regelschleife im Hintergrund-Thread, getaktet durch neue Kamerabilder.
+      - step(frame_np) -> dict | None   läuft im Worker (Histogramm, I2C-Writes)
+      - on_status(dict)                 läuft im Tk-Thread (nur Anzeige)
+    Ein Status mit "done": True beendet die Schleife.
+    Nach jedem Schritt werden skip_frames Bilder verworfen, damit das nächste
+    gemessene Bild den neuen PWM-Wert schon enthält (MJPEG-Latenz).
+    Streams ohne wait_frame() (z.B. camera_gui.CameraStream) werden gepollt.
+    """
+
+    def __init__(self, stream, step, tk_widget=None, on_status=None,
+                 skip_frames=1, poll_ms=50, fallback_interval=0.1):
+        self.stream = stream
+        self.step = step
+        self.tk_widget = tk_widget
+        self.on_status = on_status
+        self.skip_frames = max(0, int(skip_frames))
+        self.poll_ms = int(poll_ms)
+        self.fallback_interval = float(fallback_interval)
+
+        self._status = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pump_job = None
+        self.steps = 0
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.steps = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if self.tk_widget is not None and self.on_status is not None:
+            self._pump_job = self.tk_widget.after(self.poll_ms, self._pump)
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- Worker ----------
+
+    def _next_frame(self, last_seq):
+        if hasattr(self.stream, "wait_frame"):
+            return self.stream.wait_frame(last_seq, timeout=0.5)
+        time.sleep(self.fallback_interval)
+        frame = self.stream.get_frame()
+        return last_seq + 1, (None if frame is None else np.array(frame))
+
+    def _run(self):
+        last_seq = getattr(self.stream, "frame_seq", 0)
+        skip = 0
+        while not self._stop.is_set():
+            seq, f = self._next_frame(last_seq)
+            if f is None:
+                continue
+            last_seq = seq
+            if skip > 0:
+                skip -= 1
+                continue
+
+            try:
+                status = self.step(f)
+            except Exception as e:
+                status = {"error": str(e), "done": True}
+            self.steps += 1
+            skip = self.skip_frames
+
+            if status is not None:
+                self._status.put(status)
+                if status.get("done"):
+                    break
+
+    # ---------- Tk-Seite ----------
+
+    def _pump(self):
+        self._pump_job = None
+        last = None
+        try:
+            while True:
+                last = self._status.get_nowait()
+        except queue.Empty:
+            pass
+
+        if last is not None:
+            try:
+                self.on_status(last)
+            except Exception as e:
+                print("[FrameController] on_status failed:", e)
+
+        if self.running or not self._status.empty():
+            try:
+                self._pump_job = self.tk_widget.after(self.poll_ms, self._pump)
+            except Exception:
+                pass
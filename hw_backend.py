@@ -0,0 +1,75 @@
+# hw_backend.py
+"""
+Auswahl echte Hardware / Simulation.
+
+    MSCAM_SIM=1 python3 sequence_runner_gui.py
+
+Importe wie `from hw_backend import PCA9685` liefern dann die Fakes aus
+simulation.py, sonst die echten Treiber. Aufgelöst wird erst beim Import
+des Namens, d.h. fehlende Bibliotheken melden sich wie bisher als ImportError.
+MSCAM_SIM_TIME_SCALE=0 schaltet die modellierten Wartezeiten ab.
+"""
+import os
+
+SIMULATION = os.environ.get("MSCAM_SIM", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _pi_chip_default():
+    """
+    Blinka-Chip nur auf dem Raspberry Pi vorgeben (dort scheitert die
+    Autoerkennung je nach Blinka-Version); eine eigene Vorgabe gewinnt.
+    Muss vor dem ersten Treiber-Import stehen: adafruit_as7341 lädt busio.
+    """
+    if SIMULATION or "BLINKA_FORCECHIP" in os.environ:
+        return
+    try:
+        with open("/proc/device-tree/model", "rb") as f:
+            model = f.read()
+    except OSError:
+        return
+    if b"Raspberry Pi" in model:
+        os.environ["BLINKA_FORCECHIP"] = "BCM2XXX"
+
+
+_pi_chip_default()
+
+
+def make_i2c():
+    """busio.I2C auf SCL/SDA bzw. simulierter Bus."""
+    if SIMULATION:
+        from simulation import FakeI2C
+        return FakeI2C()
+    import board
+    import busio
+    return busio.I2C(board.SCL, board.SDA)
+
+
+def __getattr__(name):
+    if name == "PCA9685":
+        if SIMULATION:
+            from simulation import FakePCA9685 as obj
+        else:
+            from adafruit_pca9685 import PCA9685 as obj
+    elif name == "AS7341":
+        if SIMULATION:
+            from simulation import FakeAS7341 as obj
+        else:
+            from adafruit_as7341 import AS7341 as obj
+    elif name == "Gain":
+        if SIMULATION:
+            from simulation import Gain as obj
+        else:
+            from adafruit_as7341 import Gain as obj
+    elif name == "pigpio":
+        if SIMULATION:
+            from simulation import fake_pigpio as obj
+        else:
+            import pigpio as obj
+    elif name == "CameraStream":
+        if SIMULATION:
+            from simulation import SimCameraStream as obj
+        else:
+            from camera_stream import CameraStream as obj
+    else:
+        raise AttributeError(f"module 'hw_backend' has no attribute {name!r}")
+    return obj
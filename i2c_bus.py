@@ -0,0 +1,231 @@
+# i2c_bus.py
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class DeviceStats:
+    __slots__ = ("name", "transactions", "bytes", "errors", "busy_s", "max_s")
+
+    def __init__(self, name):
+        self.name = name
+        self.transactions = 0
+        self.bytes = 0
+        self.errors = 0
+        self.busy_s = 0.0
+        self.max_s = 0.0
+
+    def as_dict(self):
+        n = max(1, self.transactions)
+        return {
+            "name": self.name,
+            "transactions": self.transactions,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "busy_ms": round(self.busy_s * 1000.0, 2),
+            "mean_latency_ms": round(self.busy_s * 1000.0 / n, 3),
+            "max_latency_ms": round(self.max_s * 1000.0, 3),
+        }
+
+
+class SharedI2C:
+    """
+    Stellvertreter für busio.I2C, den alle Treiber (PCA9685, AS7341) bekommen.
+      - try_lock()/unlock() über ein prozessweites RLock (Blinka-Lock ist
+        nicht thread-sicher) -> keine verschachtelten Transfers aus
+        Tk-, Sequenz- und Sensor-Thread
+      - jeder Transfer wird pro Adresse gezählt (Anzahl, Bytes, Dauer, Fehler)
+    """
+
+    def __init__(self, i2c, lock, manager):
+        self._i2c = i2c
+        self._lock = lock
+        self._manager = manager
+
+    # --- Lockable ---
+    def try_lock(self):
+        # kurz blockieren statt den Aufrufer (I2CDevice) leer drehen zu lassen
+        if not self._lock.acquire(timeout=0.005):
+            return False
+        if not self._i2c.try_lock():
+            self._lock.release()
+            return False
+        return True
+
+    def unlock(self):
+        try:
+            self._i2c.unlock()
+        finally:
+            self._lock.release()
+
+    def __enter__(self):
+        while not self.try_lock():
+            time.sleep(0)
+        return self
+
+    def __exit__(self, *exc):
+        self.unlock()
+        return False
+
+    # --- Transfers ---
+    def writeto(self, address, buffer, *, start=0, end=None):
+        n = (len(buffer) if end is None else end) - start
+        t0 = time.perf_counter()
+        try:
+            self._i2c.writeto(address, buffer, start=start, end=end)
+        except Exception:
+            self._manager._record(address, n, time.perf_counter() - t0, error=True)
+            raise
+        self._manager._record(address, n, time.perf_counter() - t0)
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        n = (len(buffer) if end is None else end) - start
+        t0 = time.perf_counter()
+        try:
+            self._i2c.readfrom_into(address, buffer, start=start, end=end)
+        except Exception:
+            self._manager._record(address, n, time.perf_counter() - t0, error=True)
+            raise
+        self._manager._record(address, n, time.perf_counter() - t0)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *,
+                              out_start=0, out_end=None, in_start=0, in_end=None):
+        n = ((len(buffer_out) if out_end is None else out_end) - out_start
+             + (len(buffer_in) if in_end is None else in_end) - in_start)
+        t0 = time.perf_counter()
+        try:
+            self._i2c.writeto_then_readfrom(address, buffer_out, buffer_in,
+                                            out_start=out_start, out_end=out_end,
+                                            in_start=in_start, in_end=in_end)
+        except Exception:
+            self._manager._record(address, n, time.perf_counter() - t0, error=True)
+            raise
+        self._manager._record(address, n, time.perf_counter() - t0)
+
+    def scan(self):
+        return self._i2c.scan()
+
+    def deinit(self):
+        # gemeinsamer Bus: nicht von einzelnen Treibern schließen lassen
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._i2c, name)
+
+
+class I2CBusManager:
+    """
+    Ein busio.I2C-Handle pro Prozess für LEDs, PCA-Boards und AS7341.
+    Nutzung:
+        bus = I2CBusManager.instance()
+        pca = PCA9685(bus.i2c, address=0x40)
+        bus.register(0x40, "PCA9685 #1")
+        with bus.batch():          # mehrere Transfers ohne fremde dazwischen
+            ...
+        sensor = bus.device(0x39, "AS7341", AS7341)   # ein Treiberobjekt für alle
+        with bus.batch(0x39):      # Folge an einem Gerät, andere Geräte dürfen dazwischen
+            ...
+        print(bus.report())
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, i2c=None):
+        if i2c is None:
+            from hw_backend import make_i2c
+            i2c = make_i2c()
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._names = {}
+        self._devices = {}
+        self._device_locks = {}
+        self._devices_lock = threading.Lock()
+        self.batches = 0
+        self.i2c = SharedI2C(i2c, self._lock, self)
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def register(self, address, name):
+        self._names[address] = name
+        with self._stats_lock:
+            if address in self._stats:
+                self._stats[address].name = name
+
+    def device(self, address, name, factory):
+        """
+        Ein Treiberobjekt pro Adresse und Prozess (factory(i2c) beim ersten Aufruf),
+        z.B. der AS7341 für Sensorfenster und Sequenz.
+        """
+        with self._devices_lock:
+            dev = self._devices.get(address)
+            if dev is None:
+                dev = self._devices[address] = factory(self.i2c)
+                self.register(address, name)
+            return dev
+
+    @contextmanager
+    def batch(self, address=None):
+        """
+        Bus für eine Folge von Transfers exklusiv halten (re-entrant).
+        Mit address nur dieses Gerät: z.B. AS7341 Einstellung + SMUX + Messung
+        ohne fremde Sensor-Zugriffe dazwischen; LED-Writes laufen während der
+        Integration weiter.
+        """
+        if address is None:
+            lock = self._lock
+        else:
+            with self._devices_lock:
+                lock = self._device_locks.setdefault(address, threading.RLock())
+        with lock:
+            self.batches += 1
+            yield self
+
+    def _record(self, address, nbytes, dt, error=False):
+        with self._stats_lock:
+            st = self._stats.get(address)
+            if st is None:
+                st = self._stats[address] = DeviceStats(self._names.get(address, f"0x{address:02X}"))
+            st.transactions += 1
+            st.bytes += max(0, nbytes)
+            st.busy_s += dt
+            if dt > st.max_s:
+                st.max_s = dt
+            if error:
+                st.errors += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {f"0x{a:02X}": st.as_dict() for a, st in sorted(self._stats.items())}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def report(self):
+        lines = [f"{'Gerät':<16}{'Adr':>6}{'Trans.':>9}{'Bytes':>9}{'Fehler':>8}{'Busy ms':>10}{'ø ms':>8}{'max ms':>8}"]
+        for addr, d in self.stats().items():
+            lines.append(f"{d['name']:<16}{addr:>6}{d['transactions']:>9}{d['bytes']:>9}{d['errors']:>8}"
+                         f"{d['busy_ms']:>10.1f}{d['mean_latency_ms']:>8.3f}{d['max_latency_ms']:>8.3f}")
+        return "\n".join(lines)
+
+
+def device_batch(dev):
+    """batch(adresse) für ein über device() geteiltes Treiberobjekt, sonst ohne Wirkung."""
+    bus = I2CBusManager._instance
+    if bus is not None:
+        for address, d in list(bus._devices.items()):
+            if d is dev:
+                return bus.batch(address)
+    return nullcontext()
+
+
+def shared_i2c():
+    """busio.I2C-kompatibles Handle des prozessweiten Busses."""
+    return I2CBusManager.instance().i2c
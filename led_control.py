@@ -1,9 +1,17 @@
 import tkinter as tk
 from tkinter import ttk
-import board
-import busio
 import re
-from adafruit_pca9685 import PCA9685
+import struct
+import threading
+from hw_backend import PCA9685
+
+from i2c_bus import I2CBusManager
+from led_writer import LED0_ON_L, CoalescingWriter, duty_to_regs, percent_to_duty
+
+# PCA9685: LEDn_ON_L/H, LEDn_OFF_L/H ab LED0_ON_L, 4 Byte pro Kanal (Auto-Increment)
+# ALL_LED_ON_L..ALL_LED_OFF_H: ein Write setzt alle 16 Kanäle; OFF_H Bit 4 = voll aus
+ALL_LED_ON_L = 0xFA
+ALL_LED_OFF = bytes([ALL_LED_ON_L, 0x00, 0x00, 0x00, 0x10])
 
 class LEDController:
     def __init__(self, use_gui=False, master=None):
@@ -20,11 +28,19 @@ class LEDController:
 
         self.sorted_channels = []
         self.sliders = {}
+        self._index = {}     # name -> (pca, channel)
+        self._shadow = {}    # (pca, channel) -> zuletzt geschriebener duty_cycle (16 bit)
+        self._off_blocks = {}  # pca -> (erster Kanal, vorberechneter "alles aus"-Registerblock)
+        self._writer = None    # CoalescingWriter für Slider (nur GUI)
+        self._lock = threading.RLock()
 
         try:
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.pca_1 = PCA9685(i2c, address=0x40)
-            self.pca_2 = PCA9685(i2c, address=0x58)
+            # gemeinsamer Bus mit AS7341 & Co. (Lock + Statistik)
+            self.bus = I2CBusManager.instance()
+            self.pca_1 = PCA9685(self.bus.i2c, address=0x40)
+            self.pca_2 = PCA9685(self.bus.i2c, address=0x58)
+            self.bus.register(0x40, "PCA9685 #1")
+            self.bus.register(0x58, "PCA9685 #2")
             self.pca_1.frequency = 1600
             self.pca_2.frequency = 1600
         except Exception as e:
@@ -36,6 +52,7 @@ class LEDController:
             return
 
         self.prepare_sorted_channels()
+        self._init_shadow()
 
         if self.use_gui:
             self.window = tk.Toplevel(self.master)
@@ -47,30 +64,219 @@ class LEDController:
         return [name for _, name in self.sorted_channels]
 
     def set_channel_by_name(self, name, percent):
-        for (pca, ch), ch_name in self.sorted_channels:
-            if ch_name == name:
-                self.set_pwm(pca, ch, percent)
-                if name in self.sliders:
-                    self.sliders[name].set(percent)
-                return
-        print(f"[WARN] Kanalname '{name}' nicht gefunden.")
+        target = self._index.get(name)
+        if target is None:
+            print(f"[WARN] Kanalname '{name}' nicht gefunden.")
+            return
+        pca, ch = target
+        self.set_pwm(pca, ch, percent)
+        self._sync_sliders({name: percent})
 
     def get_channel_value(self, name):
-        for (pca, ch), ch_name in self.sorted_channels:
-            if ch_name == name:
-                raw_value = pca.channels[ch].duty_cycle
-                return round(raw_value / 0xFFFF * 100, 1)
-        print(f"[WARN] Kanalname '{name}' nicht gefunden.")
-        return None
+        """Letzter geschriebener Wert in % (aus dem Shadow-Cache, kein I2C-Zugriff)."""
+        target = self._index.get(name)
+        if target is None:
+            print(f"[WARN] Kanalname '{name}' nicht gefunden.")
+            return None
+        raw_value = self._shadow.get(target, 0)
+        return round(raw_value / 0xFFFF * 100, 1)
+
+    _percent_to_duty = staticmethod(percent_to_duty)
+    _duty_to_regs = staticmethod(duty_to_regs)
 
     def set_pwm(self, pca, channel, percent):
-        percent = max(0, min(100, percent))
-        value = int((percent / 100) * 0xFFFF)
-        pca.channels[channel].duty_cycle = value
+        value = self._percent_to_duty(percent)
+        self._cancel_slider_writes([(pca, channel)])
+        with self._lock:
+            if self._shadow.get((pca, channel)) == value:
+                return                # redundanter Write
+            pca.channels[channel].duty_cycle = value
+            self._shadow[(pca, channel)] = value
+
+    def set_many(self, values):
+        """
+        Mehrere Kanäle auf einmal setzen: {name: percent}.
+        Pro PCA9685 wird der Bereich der geänderten Kanäle als ein
+        Auto-Increment-Blockwrite übertragen (Lücken aus dem Shadow gefüllt).
+        """
+        pending = {}   # pca -> {channel: duty}
+        for name, percent in values.items():
+            target = self._index.get(name)
+            if target is None:
+                print(f"[WARN] Kanalname '{name}' nicht gefunden.")
+                continue
+            pca, ch = target
+            pending.setdefault(pca, {})[ch] = self._percent_to_duty(percent)
+
+        self._write_pending(pending)
+        self._sync_sliders(values)
+
+    def _write_pending(self, pending):
+        self._cancel_slider_writes([(pca, ch) for pca, chans in pending.items() for ch in chans])
+        with self._lock, self.bus.batch():
+            for pca, chans in pending.items():
+                changed = {ch: v for ch, v in chans.items() if self._shadow.get((pca, ch)) != v}
+                if changed:
+                    self._write_pca(pca, changed)
+
+    def _write_pca(self, pca, changed):
+        for first, block in self._blocks(pca, changed):
+            try:
+                self._write_block(pca, first, block)
+            except Exception as e:
+                print(f"[WARN] Blockwrite fehlgeschlagen ({e}), schreibe einzeln.")
+                for i, value in enumerate(block):
+                    pca.channels[first + i].duty_cycle = value
+            for i, value in enumerate(block):
+                self._shadow[(pca, first + i)] = value
+
+    def _blocks(self, pca, changed):
+        """Zusammenhängende Kanalbereiche; unveränderte bekannte Kanäle füllen Lücken."""
+        blocks = []
+        chans = sorted(changed)
+        first = prev = chans[0]
+        block = [changed[first]]
+        for ch in chans[1:]:
+            gap = range(prev + 1, ch)
+            if all((pca, g) in self._shadow for g in gap):
+                block += [self._shadow[(pca, g)] for g in gap]
+            else:
+                blocks.append((first, block))
+                first, block = ch, []
+            block.append(changed[ch])
+            prev = ch
+        blocks.append((first, block))
+        return blocks
+
+    def _write_block(self, pca, first_channel, block):
+        data = bytearray([LED0_ON_L + 4 * first_channel])
+        for value in block:
+            data += struct.pack("<HH", *self._duty_to_regs(value))
+        with pca.i2c_device as dev:
+            dev.write(data)
+
+    def _init_shadow(self):
+        # einmalig die aktuellen Register lesen, danach keine Rücklesezugriffe mehr
+        for (pca, ch), name in self.sorted_channels:
+            self._index.setdefault(name, (pca, ch))
+            if hasattr(pca, "sim_label"):
+                pca.sim_label(ch, name)   # Lichtmodell der Simulation
+            try:
+                self._shadow[(pca, ch)] = pca.channels[ch].duty_cycle
+            except Exception:
+                self._shadow[(pca, ch)] = 0
+
+        # Registerblöcke für "nur Kanal X an" vorberechnen (alle genutzten Kanäle aus)
+        for pca in self._pcas():
+            chans = [ch for (p, ch) in self._shadow if p is pca]
+            first, last = min(chans), max(chans)
+            data = bytearray([LED0_ON_L + 4 * first])
+            data += struct.pack("<HH", *self._duty_to_regs(0)) * (last - first + 1)
+            self._off_blocks[pca] = (first, bytes(data))
+
+    def _pcas(self):
+        return [pca for pca in (getattr(self, "pca_1", None), getattr(self, "pca_2", None)) if pca is not None]
+
+    def _any_on(self, pca, exclude=None):
+        return any(v != 0 for (p, ch), v in self._shadow.items() if p is pca and (p, ch) != exclude)
+
+    def _all_off_pca(self, pca):
+        try:
+            with pca.i2c_device as dev:
+                dev.write(ALL_LED_OFF)
+        except Exception as e:
+            print(f"[WARN] ALL_LED_OFF fehlgeschlagen ({e}), schreibe einzeln.")
+            self._write_pca(pca, {ch: 0 for (p, ch) in self._shadow if p is pca})
+            return
+        for key in self._shadow:
+            if key[0] is pca:
+                self._shadow[key] = 0
+
+    def set_only(self, name, percent):
+        """
+        Nur diesen Kanal auf percent, alle anderen aus.
+        Höchstens ein I2C-Transfer pro PCA9685 (ALL_LED_OFF bzw. vorberechneter Block).
+        """
+        target = self._index.get(name)
+        if target is None:
+            print(f"[WARN] Kanalname '{name}' nicht gefunden.")
+            return
+        t_pca, t_ch = target
+        value = self._percent_to_duty(percent)
+
+        self._cancel_slider_writes(list(self._shadow))
+        with self._lock, self.bus.batch():
+            for pca in self._pcas():
+                others_on = self._any_on(pca, exclude=target)
+                if pca is not t_pca:
+                    if others_on:
+                        self._all_off_pca(pca)
+                    continue
+                if not others_on:
+                    if self._shadow.get(target) != value:
+                        self._write_pca(pca, {t_ch: value})
+                    continue
+                first, block = self._off_blocks[pca]
+                data = bytearray(block)
+                off = 1 + 4 * (t_ch - first)
+                data[off:off + 4] = struct.pack("<HH", *self._duty_to_regs(value))
+                try:
+                    with pca.i2c_device as dev:
+                        dev.write(data)
+                except Exception as e:
+                    print(f"[WARN] Blockwrite fehlgeschlagen ({e}), schreibe einzeln.")
+                    self._write_pca(pca, {ch: (value if ch == t_ch else 0)
+                                          for (p, ch) in self._shadow if p is pca})
+                    continue
+                for key in self._shadow:
+                    if key[0] is pca:
+                        self._shadow[key] = value if key == target else 0
+
+        self._sync_sliders({n: (percent if n == name else 0) for n in self.sliders})
+
+    def _sync_sliders(self, values):
+        """
+        Slider auf {name: percent} nachführen. Regelungen rufen set_* aus
+        Worker-Threads auf; Tk-Variablen nur im Tk-Thread setzen (after).
+        """
+        values = {n: p for n, p in values.items() if n in self.sliders}
+        if not values:
+            return
+
+        def apply():
+            for n, p in values.items():
+                self.sliders[n].set(p)
+
+        if threading.current_thread() is threading.main_thread():
+            apply()
+            return
+        try:
+            self.window.after(0, apply)
+        except Exception:
+            pass                      # Fenster schon geschlossen
 
     def on_slider_move(self, pca, ch, var):
         val = var.get()
-        self.set_pwm(pca, ch, val)
+        if self._writer is None:
+            self.set_pwm(pca, ch, val)
+            return
+        # nicht blockierend: nur der letzte Wert pro Kanal wird geschrieben
+        self._writer.submit((pca, ch), self._percent_to_duty(val))
+
+    def _flush_slider_writes(self, batch):
+        pending = {}
+        for (pca, ch), value in batch.items():
+            pending.setdefault(pca, {})[ch] = value
+        self._write_pending(pending)
+
+    def _cancel_slider_writes(self, keys):
+        if self._writer is not None:
+            self._writer.cancel(keys)
+
+    def shutdown(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
     def extract_wavelength(self, label):
         match = re.search(r"(\d+)", label)
@@ -88,6 +294,7 @@ class LEDController:
         self.sorted_channels = [((pca, ch), name) for (pca, ch, name) in sorted_1 + sorted_2]
 
     def create_widgets(self):
+        self._writer = CoalescingWriter(self._flush_slider_writes)
         for (pca, ch), name in self.sorted_channels:
             frame = ttk.Frame(self.window)
             frame.pack(fill='x', padx=10, pady=2)
@@ -108,7 +315,9 @@ class LEDController:
         ttk.Button(self.window, text="Alle Kanäle AUS", command=self.all_off).pack(pady=20)
 
     def all_off(self):
-        for (pca, ch), name in self.sorted_channels:
-            if name in self.sliders:
-                self.sliders[name].set(0)
-            self.set_pwm(pca, ch, 0)
+        # ALL_LED_OFF: ein Transfer pro Board (deckt auch doppelte Namen wie "pink" ab)
+        self._sync_sliders({n: 0 for n in self.sliders})
+        self._cancel_slider_writes(list(self._shadow))
+        with self._lock, self.bus.batch():
+            for pca in self._pcas():
+                self._all_off_pca(pca)
@@ -1,9 +1,13 @@
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QSlider, QPushButton, QHBoxLayout, QScrollArea
 from PyQt5.QtCore import Qt
-import board
-import busio
 import re
-from adafruit_pca9685 import PCA9685
+from hw_backend import PCA9685
+
+from i2c_bus import I2CBusManager
+from led_writer import CoalescingWriter, percent_to_duty, write_pca_channels
+
+# ALL_LED_ON_L..ALL_LED_OFF_H: ein Write schaltet alle 16 Kanäle voll aus
+ALL_LED_OFF = bytes([0xFA, 0x00, 0x00, 0x00, 0x10])
 
 class LEDControlWidget(QWidget):
     def __init__(self, parent=None):
@@ -22,9 +26,11 @@ class LEDControlWidget(QWidget):
         self.sliders_2 = []
 
         try:
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.pca_1 = PCA9685(i2c, address=0x40)
-            self.pca_2 = PCA9685(i2c, address=0x58)
+            self.bus = I2CBusManager.instance()
+            self.pca_1 = PCA9685(self.bus.i2c, address=0x40)
+            self.pca_2 = PCA9685(self.bus.i2c, address=0x58)
+            self.bus.register(0x40, "PCA9685 #1")
+            self.bus.register(0x58, "PCA9685 #2")
             self.pca_1.frequency = 1600
             self.pca_2.frequency = 1600
         except Exception as e:
@@ -39,15 +45,18 @@ class LEDControlWidget(QWidget):
         container = QWidget()
         layout = QVBoxLayout(container)
 
+        # Slider-Werte gehen an einen Hintergrund-Writer (letzter Wert pro Kanal)
+        self.writer = CoalescingWriter(self._flush_writes)
+
         layout.addWidget(QLabel("PCA9685 @ 0x40"))
         for ch, name in self.sorted_channels(self.channel_1_names):
-            slider, hbox = self.create_slider_row(name, lambda val, ch=ch: self.set_pwm(self.pca_1, ch, val))
+            slider, hbox = self.create_slider_row(name, lambda val, ch=ch: self.queue_pwm(self.pca_1, ch, val))
             layout.addLayout(hbox)
             self.sliders_1.append(slider)
 
         layout.addWidget(QLabel("PCA9685 @ 0x58"))
         for ch, name in self.sorted_channels(self.channel_2_names, offset=2):
-            slider, hbox = self.create_slider_row(name, lambda val, ch=ch: self.set_pwm(self.pca_2, ch, val))
+            slider, hbox = self.create_slider_row(name, lambda val, ch=ch: self.queue_pwm(self.pca_2, ch, val))
             layout.addLayout(hbox)
             self.sliders_2.append(slider)
 
@@ -87,10 +96,35 @@ class LEDControlWidget(QWidget):
         value = int((percent / 100) * 0xFFFF)
         pca.channels[channel].duty_cycle = value
 
+    def queue_pwm(self, pca, channel, percent):
+        self.writer.submit((pca, channel), percent_to_duty(percent))
+
+    def _flush_writes(self, batch):
+        per_pca = {}
+        for (pca, ch), value in batch.items():
+            per_pca.setdefault(pca, {})[ch] = value
+        with self.bus.batch():
+            for pca, duties in per_pca.items():
+                write_pca_channels(pca, duties)
+
+    def closeEvent(self, event):
+        writer = getattr(self, "writer", None)
+        if writer is not None:
+            writer.close()
+        super().closeEvent(event)
+
     def all_off(self):
-        for ch, s in enumerate(self.sliders_1):
-            s.setValue(0)
-            self.set_pwm(self.pca_1, ch, 0)
-        for ch, s in enumerate(self.sliders_2):
+        # Slider ohne valueChanged zurücksetzen, dann ein ALL_LED_OFF pro Board
+        self.writer.cancel([(self.pca_1, ch) for ch in range(16)] + [(self.pca_2, ch) for ch in range(16)])
+        for s in self.sliders_1 + self.sliders_2:
+            s.blockSignals(True)
             s.setValue(0)
-            self.set_pwm(self.pca_2, ch + 2, 0)
+            s.blockSignals(False)
+        for pca, offset, count in ((self.pca_1, 0, len(self.sliders_1)),
+                                   (self.pca_2, 2, len(self.sliders_2))):
+            try:
+                with pca.i2c_device as dev:
+                    dev.write(ALL_LED_OFF)
+            except Exception:
+                for ch in range(count):
+                    self.set_pwm(pca, ch + offset, 0)
@@ -0,0 +1,129 @@
+# led_servo.py
+"""
+LED-Regelung über den AS7341 statt über Kamerabilder.
+
+Der Sensorwert (normiert, Counts pro Gain*ms) ist praktisch linear in der
+PWM: v = dunkel + k * pwm. Nach einer Dunkelmessung reichen deshalb meist
+2-3 Messungen (Sekantenverfahren) bei wenigen ms Integration und nur einer
+SMUX-Bank pro Messung.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+
+from i2c_bus import device_batch
+from spectral_sensor import (AutoRanger, BAND_SLOTS, band_for_led, full_scale,
+                             normalize_counts, read_bank)
+
+# kurze Integration für die Regelung: (9+1)*(299+1)*2.78 µs ~ 8.3 ms
+SERVO_ATIME = 9
+SERVO_ASTEP = 299
+
+
+class SensorLedServo:
+    """
+    servo(name, target) regelt einen LED-Kanal auf target (normierter Wert
+    auf dem passenden AS7341-Kanal, siehe band_for_led()).
+    lock: gemeinsames Sensor-Lock (z.B. SpectrumSampler.sensor_lock);
+    Gain/Integration des Sensors werden danach wiederhergestellt.
+    """
+
+    def __init__(self, sensor, led, lock=None, tolerance=0.02, max_iter=8,
+                 atime=SERVO_ATIME, astep=SERVO_ASTEP):
+        self.sensor = sensor
+        self.led = led
+        self.lock = lock
+        self.tolerance = float(tolerance)
+        self.max_iter = int(max_iter)
+        self.atime = int(atime)
+        self.astep = int(astep)
+        self.reads = 0
+
+    # ---------- Messen ----------
+
+    def _measure(self, ranger, band):
+        """Normierter Wert eines Kanals; bei Über-/Untersteuerung mit neuer Einstellung wiederholen."""
+        bank, idx = BAND_SLOTS[band]
+        for _ in range(6):
+            cfg = ranger.config
+            values = read_bank(self.sensor, bank)
+            self.reads += 1
+            saturated = max(values) >= full_scale(cfg[1], cfg[2])
+            changed = ranger.update(values)
+            if not changed or not saturated and max(values) > 0.05 * full_scale(cfg[1], cfg[2]):
+                return float(normalize_counts(values, *cfg)[idx])
+        return float(normalize_counts(values, *cfg)[idx])
+
+    def measure(self, band):
+        """Einzelmessung eines Kanals (z.B. um ein Ziel einzulernen)."""
+        with self._session() as ranger:
+            return self._measure(ranger, band)
+
+    # ---------- Sitzung (Lock + Sensoreinstellung) ----------
+
+    @contextmanager
+    def _session(self):
+        """Sensor exklusiv nutzen; Gain/Integration danach wie vorher."""
+        with (self.lock if self.lock is not None else nullcontext()), device_batch(self.sensor):
+            try:
+                saved = tuple(int(getattr(self.sensor, k)) for k in ("gain", "atime", "astep"))
+            except Exception:
+                saved = None
+            gain = saved[0] if saved else 5
+            self.sensor.atime = self.atime
+            self.sensor.astep = self.astep
+            try:
+                yield AutoRanger(self.sensor, gain, self.atime, self.astep)
+            finally:
+                if saved:
+                    self.sensor.gain, self.sensor.atime, self.sensor.astep = saved
+
+    # ---------- Regelung ----------
+
+    def servo(self, name, target, start_pwm=10.0, band=None):
+        """
+        LED 'name' auf den Zielwert regeln (alle anderen LEDs sind aus).
+        Rückgabe dict: pwm, value, target, band, dark, iterations, converged, elapsed_ms.
+        """
+        band = band or band_for_led(name)
+        t0 = time.perf_counter()
+        target = float(target)
+
+        with self._session() as ranger:
+            self.led.set_channel_by_name(name, 0.0)
+            dark = self._measure(ranger, band)
+
+            pwm = max(0.5, min(100.0, float(start_pwm)))
+            value = dark
+            converged = False
+            it = 0
+            for it in range(1, self.max_iter + 1):
+                self.led.set_channel_by_name(name, pwm)
+                value = self._measure(ranger, band)
+
+                if abs(value - target) <= self.tolerance * max(target, 1e-9):
+                    converged = True
+                    break
+
+                slope = (value - dark) / pwm
+                if slope <= 0:
+                    new_pwm = min(100.0, pwm * 4.0)      # noch kein Signal über Dunkel
+                else:
+                    new_pwm = max(0.0, min(100.0, (target - dark) / slope))
+                if abs(new_pwm - pwm) < 0.01:
+                    break                                 # Anschlag bei 100 %
+                pwm = new_pwm
+                if pwm <= 0.0:
+                    self.led.set_channel_by_name(name, 0.0)   # Ziel liegt unter Dunkelwert
+                    value = dark
+                    break
+
+        return {
+            "pwm": round(pwm, 3),
+            "value": value,
+            "target": target,
+            "band": band,
+            "dark": dark,
+            "iterations": it,
+            "converged": converged,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        }
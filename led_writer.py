@@ -0,0 +1,133 @@
+# led_writer.py
+import struct
+import threading
+import time
+
+LED0_ON_L = 0x06
+
+
+def duty_to_regs(value):
+    # identisch zu adafruit_pca9685.PWMChannel.duty_cycle
+    if value >= 0xFFFF:
+        return 0x1000, 0          # voll an
+    if value < 0x0010:
+        return 0, 0x1000          # voll aus
+    return 0, value >> 4
+
+
+def percent_to_duty(percent):
+    percent = max(0, min(100, percent))
+    return int((percent / 100) * 0xFFFF)
+
+
+def write_pca_channels(pca, duties):
+    """
+    {channel: duty} auf ein PCA9685 schreiben; zusammenhängende Kanäle
+    als ein Auto-Increment-Blockwrite, sonst ein Write pro Lauf.
+    """
+    chans = sorted(duties)
+    runs = []
+    for ch in chans:
+        if runs and ch == runs[-1][-1] + 1:
+            runs[-1].append(ch)
+        else:
+            runs.append([ch])
+    for run in runs:
+        data = bytearray([LED0_ON_L + 4 * run[0]])
+        for ch in run:
+            data += struct.pack("<HH", *duty_to_regs(duties[ch]))
+        try:
+            with pca.i2c_device as dev:
+                dev.write(data)
+        except AttributeError:
+            for ch in run:
+                pca.channels[ch].duty_cycle = duties[ch]
+
+
+class CoalescingWriter:
+    """
+    Hintergrund-Writer für Slider: pro Schlüssel zählt nur der letzte Wert.
+    submit() blockiert nie; der Thread übergibt alle offenen Werte gesammelt
+    an flush_fn(dict) und höchstens max_rate_hz-mal pro Sekunde.
+    cancel() vor einem direkten Write (Alle aus, Szenenwechsel) wartet auch einen
+    schon übernommenen Batch ab, damit kein alter Sliderwert danach landet.
+    """
+
+    def __init__(self, flush_fn, max_rate_hz=30.0, name="led-writer"):
+        self.flush_fn = flush_fn
+        self.min_interval = 1.0 / float(max_rate_hz)
+
+        self._pending = {}
+        self._inflight = frozenset()    # Schlüssel des gerade geschriebenen Batches
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self.flushes = 0
+        self.submitted = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+            self.submitted += 1
+            self._idle.clear()
+        self._wake.set()
+
+    def cancel(self, keys, timeout=1.0):
+        """
+        Offene Werte verwerfen (z.B. weil ein direkter Write sie überholt) und
+        warten, bis ein bereits übernommener Batch mit diesen Schlüsseln
+        geschrieben ist. Danach überschreibt der direkte Write sicher.
+        """
+        keys = set(keys)
+        with self._lock:
+            for key in keys:
+                self._pending.pop(key, None)
+            if threading.current_thread() is not self._thread:
+                self._written.wait_for(lambda: not (self._inflight & keys), timeout)
+
+    def flush(self, timeout=1.0):
+        """Warten, bis alles Offene geschrieben ist."""
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=1.0):
+        self.flush(timeout)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = frozenset(batch)
+            if batch:
+                t0 = time.monotonic()
+                try:
+                    self.flush_fn(batch)
+                except Exception as e:
+                    print("[LEDWriter] Schreiben fehlgeschlagen:", e)
+                finally:
+                    with self._lock:
+                        self._inflight = frozenset()
+                        self._written.notify_all()
+                self.flushes += 1
+                # Buslast begrenzen; neue Werte sammeln sich solange an
+                rest = self.min_interval - (time.monotonic() - t0)
+                if rest > 0:
+                    time.sleep(rest)
+
+            with self._lock:
+                if self._pending:
+                    self._wake.set()
+                else:
+                    self._idle.set()
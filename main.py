@@ -1,16 +1,17 @@
 import tkinter as tk
 from tkinter import ttk
-import board
-import busio
-from adafruit_pca9685 import PCA9685
+from hw_backend import PCA9685
+from i2c_bus import I2CBusManager
 from picamera2 import Picamera2
 from PIL import Image, ImageTk
+from led_writer import CoalescingWriter, percent_to_duty, write_pca_channels
 import threading
 import time
 
 # --- LED-Setup (PCA9685) ---
-i2c = busio.I2C(board.SCL, board.SDA)
-pca = PCA9685(i2c, address=0x41)
+bus = I2CBusManager.instance()
+pca = PCA9685(bus.i2c, address=0x41)
+bus.register(0x41, "PCA9685")
 pca.frequency = 1000
 
 channel_names = ["rot", "weiß", "blau", "grün", "orange", "gelb", "UV", "pink"]
@@ -20,6 +21,9 @@ def set_pwm(channel, percent):
     value = int((percent / 100) * 0xFFFF)
     pca.channels[channel].duty_cycle = value
 
+# Slider-Writes im Hintergrund bündeln (nur der letzte Wert pro Kanal)
+led_writer = CoalescingWriter(lambda batch: write_pca_channels(pca, batch))
+
 # --- Kamera-Setup (picamera2) ---
 picam2 = Picamera2()
 picam2.configure(picam2.create_preview_configuration(main={"size": (640, 480)}))
@@ -52,7 +56,7 @@ sliders = []
 
 def on_slider_move(ch, var):
     val = var.get()
-    set_pwm(ch, val)
+    led_writer.submit(ch, percent_to_duty(val))
 
 for ch in range(len(channel_names)):
     row = ttk.Frame(led_frame)
@@ -65,9 +69,16 @@ for ch in range(len(channel_names)):
     sliders.append(var)
 
 def all_off():
+    led_writer.cancel(range(8))
     for ch in range(8):
         sliders[ch].set(0)
-        set_pwm(ch, 0)
+    try:
+        # ALL_LED_OFF (0xFA..0xFD): alle Kanäle in einem Transfer aus
+        with pca.i2c_device as dev:
+            dev.write(bytes([0xFA, 0x00, 0x00, 0x00, 0x10]))
+    except Exception:
+        for ch in range(8):
+            set_pwm(ch, 0)
 
 ttk.Button(root, text="Alle LEDs aus", command=all_off).pack(pady=8)
 
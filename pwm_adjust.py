@@ -2,6 +2,7 @@ import os, time, json
 import cv2
 import numpy as np
 from picamera2 import Picamera2
+from exposure_metering import RoiTracker, SettleDetector, wait_settled
 from led_control import LEDController  # deine Datei importieren
 
 # --- LED Controller ---
@@ -32,32 +33,29 @@ picam2.set_controls(controls)
 picam2.start()
 time.sleep(1)
 
-# --- ROI automatisch finden ---
-def find_roi(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    _, mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+# --- ROI automatisch finden (einmal, gecacht bis sich die Szene ändert) ---
+roi_tracker = RoiTracker(mode="auto")
 
-    if contours:
-        c = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(c)
-        return (x, y, w, h)
-    else:
-        return (0, 0, frame.shape[1], frame.shape[0])
+# --- Einschwingen: statt fester Pausen warten, bis Mittelwert/Histogramm stabil sind ---
+settle = SettleDetector(sel="G", k=2)
+
+def settled_frame(timeout):
+    # capture_array blockiert bis zum nächsten Bild
+    res = wait_settled(lambda rest: picam2.capture_array("main"), settle, timeout)
+    return res["frame"], res["elapsed_s"]
 
 # --- Iterative Kalibrierung ---
 def calibrate_channel(channel, target_mean=0.5, tolerance=0.05, max_trials=10, save_raw=True):
     level = 30.0
     for trial in range(max_trials):
         set_pwm(channel, level)
-        time.sleep(0.3)
-
-        frame = picam2.capture_array("main")
-        x, y, w, h = find_roi(frame)
+        frame, settle_s = settled_frame(1.0)
+        x, y, w, h = roi_tracker.get(frame)
         roi_frame = frame[y:y+h, x:x+w]
 
         mean_intensity = roi_frame.mean() / 255.0
-        print(f"[{channel_names[channel]}] Trial {trial+1}: mean={mean_intensity:.3f}, level={level:.1f}%")
+        print(f"[{channel_names[channel]}] Trial {trial+1}: mean={mean_intensity:.3f}, level={level:.1f}% "
+              f"(settle {settle_s*1000:.0f} ms)")
 
         # ROI anzeigen
         vis = frame.copy()
@@ -87,7 +85,7 @@ def calibrate_channel(channel, target_mean=0.5, tolerance=0.05, max_trials=10, s
 results = {}
 for ch in range(len(channel_names)):
     all_off()
-    time.sleep(0.5)
+    settled_frame(1.5)
     pwm_value = calibrate_channel(ch)
     results[channel_names[ch]] = pwm_value
 
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk
-import pigpio
+from hw_backend import pigpio
 
 class GPIORelayGUI(tk.Tk):
     def __init__(self, pins):
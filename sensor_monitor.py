@@ -1,31 +1,56 @@
-import os
-os.environ["BLINKA_FORCECHIP"] = "BCM2XXX"
-
 import tkinter as tk
-from tkinter import ttk
-import board
-import busio
+from tkinter import ttk, messagebox, filedialog
 import threading
 import time
-from adafruit_as7341 import AS7341, Gain
+
+import numpy as np
+from hw_backend import AS7341, Gain
+
+from i2c_bus import I2CBusManager
+from spectral_sensor import (CHANNEL_LABELS, DEFAULT_ATIME, DEFAULT_ASTEP, AutoRanger, RateMeter,
+                             SpectrumRingBuffer, apply_config, decimate_minmax, full_scale,
+                             gain_factor, integration_time_ms, normalize_counts, read_spectrum)
+from spectral_log import RECORD_DTYPE, SpectralLogWriter
+
+# Linienfarben der Verlaufsanzeige (grob nach Wellenlänge)
+CHANNEL_COLORS = (
+    "#7a00c8", "#3c00ff", "#0090ff", "#00d060", "#90e000",
+    "#ffd000", "#ff6000", "#d00000", "#803030", "#808080",
+)
 
 class SensorMonitor(tk.Toplevel):
     def __init__(self, master=None):
         super().__init__(master)
         self.title("AS7341 Live-Spektrum")
-        self.geometry("400x580")
+        self.geometry("420x820")
         self.running = True
+        self.render_ms = 100
+        self._render_job = None
+        self._rendered_seq = -1
+        self.history = SpectrumRingBuffer(capacity=8192)
+        self.logger = None
+        self._log_lock = threading.Lock()
 
         try:
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.sensor = AS7341(i2c)
-            self.sensor.gain = Gain.GAIN_256X
+            # gemeinsamer Bus und gemeinsamer AS7341 (auch für die Sequenz); Register
+            # schreibt nur update_loop, jeweils im selben batch(0x39) wie die Messung
+            self.bus = I2CBusManager.instance()
+            self.sensor = self.bus.device(0x39, "AS7341", AS7341)
+            self.integration_ms = integration_time_ms(DEFAULT_ATIME, DEFAULT_ASTEP)
+            # (gain_code, atime, astep) der nächsten Messung, ohne Register zurückzulesen
+            self.meas_config = (Gain.GAIN_256X, DEFAULT_ATIME, DEFAULT_ASTEP)
+            self.light_on = False
+            self._light_applied = None
+            # Auto-Range (Standard): Gain/Integration aus dem vorigen Spektrum
+            self.ranger = AutoRanger(self.sensor, *self.meas_config)
+            self._latest_raw = None      # (werte, config) für die Balken
         except Exception as e:
             ttk.Label(self, text=f"[Fehler beim Sensorinit: {e}]").pack()
             return
 
         self.build_ui()
         threading.Thread(target=self.update_loop, daemon=True).start()
+        self._render_job = self.after(self.render_ms, self.render)
 
     def build_ui(self):
         self.bars = {}
@@ -33,26 +58,15 @@ class SensorMonitor(tk.Toplevel):
         frame = ttk.Frame(self)
         frame.pack(padx=20, pady=10)
 
-        # Spektralkanäle
-        self.channels = [
-            ("415 nm", lambda: self.sensor.channel_415nm),
-            ("445 nm", lambda: self.sensor.channel_445nm),
-            ("480 nm", lambda: self.sensor.channel_480nm),
-            ("515 nm", lambda: self.sensor.channel_515nm),
-            ("555 nm", lambda: self.sensor.channel_555nm),
-            ("590 nm", lambda: self.sensor.channel_590nm),
-            ("630 nm", lambda: self.sensor.channel_630nm),
-            ("680 nm", lambda: self.sensor.channel_680nm),
-            ("NIR",    lambda: self.sensor.channel_nir),
-            ("CLEAR",  lambda: self.sensor.channel_clear),
-        ]
-
-        for label_text, _ in self.channels:
+        # Spektralkanäle (ein Dual-Bank-Zyklus liefert alle Werte)
+        self.rate = RateMeter()
+        for label_text in CHANNEL_LABELS:
             row = ttk.Frame(frame)
             row.pack(fill='x', pady=2)
 
             ttk.Label(row, text=label_text, width=8).pack(side='left')
-            progress = ttk.Progressbar(row, orient='horizontal', length=250, mode='determinate', maximum=60000)
+            progress = ttk.Progressbar(row, orient='horizontal', length=250, mode='determinate',
+                                       maximum=full_scale(DEFAULT_ATIME, DEFAULT_ASTEP))
             progress.pack(side='left', padx=5)
             value_label = ttk.Label(row, text="0")
             value_label.pack(side='right')
@@ -60,13 +74,13 @@ class SensorMonitor(tk.Toplevel):
             self.bars[label_text] = (progress, value_label)
 
         # LED-Steuerung
-        self.light_on = False
         self.led_btn = ttk.Button(self, text="Licht EIN", command=self.toggle_light)
         self.led_btn.pack(pady=10)
 
         # Gain-Auswahl
         ttk.Label(self, text="Gain wählen:").pack()
         self.gain_options = {
+            "auto": None,
             "0.5x": Gain.GAIN_0_5X,
             "1x": Gain.GAIN_1X,
             "4x": Gain.GAIN_4X,
@@ -75,34 +89,216 @@ class SensorMonitor(tk.Toplevel):
             "128x": Gain.GAIN_128X,
             "256x": Gain.GAIN_256X
         }
-        self.selected_gain = tk.StringVar(value="256x")
+        self.selected_gain = tk.StringVar(value="auto")
         gain_menu = ttk.OptionMenu(self, self.selected_gain, self.selected_gain.get(), *self.gain_options.keys(), command=self.set_gain)
         gain_menu.pack(pady=5)
 
+        # Integration: t = (ATIME+1) * (ASTEP+1) * 2.78 µs pro Bank
+        integ = ttk.Frame(self)
+        integ.pack(pady=5)
+        self.atime_var = tk.IntVar(value=DEFAULT_ATIME)
+        self.astep_var = tk.IntVar(value=DEFAULT_ASTEP)
+        ttk.Label(integ, text="ATIME").pack(side='left')
+        ttk.Spinbox(integ, from_=0, to=255, width=5, textvariable=self.atime_var).pack(side='left', padx=3)
+        ttk.Label(integ, text="ASTEP").pack(side='left')
+        ttk.Spinbox(integ, from_=0, to=65534, increment=50, width=7, textvariable=self.astep_var).pack(side='left', padx=3)
+        ttk.Button(integ, text="Setzen", command=self.set_integration).pack(side='left', padx=3)
+
+        self.rate_label = ttk.Label(self, text=self._rate_text())
+        self.rate_label.pack(pady=2)
+
+        # Verlauf aller Kanäle (min/max pro Pixelspalte)
+        hist_row = ttk.Frame(self)
+        hist_row.pack(fill='x', padx=10)
+        ttk.Label(hist_row, text="Verlauf:").pack(side='left')
+        self.window_options = {"10 s": 10, "1 min": 60, "5 min": 300, "15 min": 900}
+        self.window_var = tk.StringVar(value="1 min")
+        ttk.OptionMenu(hist_row, self.window_var, self.window_var.get(), *self.window_options.keys()).pack(side='left')
+        self.log_scale = tk.BooleanVar(value=False)
+        ttk.Checkbutton(hist_row, text="log", variable=self.log_scale).pack(side='left', padx=5)
+        self.history_canvas = tk.Canvas(self, width=380, height=180, bg="black", highlightthickness=0)
+        self.history_canvas.pack(padx=10, pady=5)
+
+        # Binärlog (spectral_log.py)
+        log_row = ttk.Frame(self)
+        log_row.pack(pady=5)
+        self.log_btn = ttk.Button(log_row, text="Log starten", command=self.toggle_log)
+        self.log_btn.pack(side='left', padx=5)
+        self.log_label = ttk.Label(log_row, text="kein Log")
+        self.log_label.pack(side='left')
+
+        ttk.Button(self, text="I2C-Statistik", command=self.show_bus_stats).pack(pady=5)
+
     def toggle_light(self):
+        # geschaltet wird im Lese-Thread (update_loop)
         self.light_on = not self.light_on
-        self.sensor.led_current = 20
-        self.sensor.led = self.light_on
         self.led_btn.config(text="Licht AUS" if self.light_on else "Licht EIN")
 
     def set_gain(self, label):
         try:
-            self.sensor.gain = self.gain_options[label]
+            code = self.gain_options[label]
+            if code is None:
+                gain_code, atime, astep = self.meas_config
+                self.ranger = AutoRanger(self.sensor, gain_code, atime, astep)
+                print("[INFO] Gain/Integration automatisch")
+                return
+            self.ranger = None
+            self.meas_config = (code,) + self.meas_config[1:]
             print(f"[INFO] Gain gesetzt auf {label}")
         except Exception as e:
             print(f"[Fehler] Gain konnte nicht gesetzt werden: {e}")
 
+    def set_integration(self):
+        try:
+            atime = max(0, min(255, int(self.atime_var.get())))
+            astep = max(0, min(65534, int(self.astep_var.get())))
+            self.integration_ms = integration_time_ms(atime, astep)
+            self.meas_config = (self.meas_config[0], atime, astep)
+            if self.ranger is not None:
+                # neue Basis-Integration für die Auto-Range-Leiter
+                self.ranger = AutoRanger(self.sensor, self.meas_config[0], atime, astep)
+            for progress, _ in self.bars.values():
+                progress['maximum'] = full_scale(atime, astep)
+            print(f"[INFO] Integration {self.integration_ms:.1f} ms pro Bank")
+        except Exception as e:
+            print(f"[Fehler] Integration konnte nicht gesetzt werden: {e}")
+
+    def _rate_text(self):
+        gain_code, atime, astep = self.meas_config
+        mode = "auto" if self.ranger is not None else "fest"
+        return (f"Gain {gain_factor(gain_code):g}x, {integration_time_ms(atime, astep):.1f} ms/Bank ({mode})"
+                f"  |  {self.rate.rate:.1f} Spektren/s")
+
+    def toggle_log(self):
+        if self.logger is not None:
+            with self._log_lock:
+                logger, self.logger = self.logger, None
+            logger.close()
+            print(f"[INFO] Log geschlossen: {logger.path} ({logger.count} Spektren)")
+            self.log_btn.config(text="Log starten")
+            self.log_label.config(text=f"gespeichert: {logger.count}")
+            return
+
+        path = filedialog.asksaveasfilename(
+            parent=self, title="AS7341-Log speichern",
+            defaultextension=".as7341",
+            initialfile=time.strftime("as7341_%Y%m%d_%H%M%S.as7341"),
+            filetypes=[("AS7341-Log", "*.as7341"), ("Alle Dateien", "*.*")])
+        if not path:
+            return
+        try:
+            logger = SpectralLogWriter(path)
+        except Exception as e:
+            messagebox.showerror("Log", f"Log konnte nicht angelegt werden:\n{e}", parent=self)
+            return
+        with self._log_lock:
+            self.logger = logger
+        self.log_btn.config(text="Log stoppen")
+
+    def show_bus_stats(self):
+        report = self.bus.report()
+        print(report)
+        messagebox.showinfo("I2C-Statistik", report, parent=self)
+
     def update_loop(self):
+        # nur Sensor + Ringpuffer; alle Widgets werden in render() (Tk-Thread) gesetzt
         while self.running:
             try:
-                for label_text, getter in self.channels:
-                    value = getter()
-                    self.bars[label_text][0]['value'] = value
-                    self.bars[label_text][1]['text'] = str(value)
+                with self.bus.batch(0x39):
+                    t = time.time()
+                    cfg = self.meas_config
+                    apply_config(self.sensor, cfg)
+                    if self._light_applied != self.light_on:
+                        self.sensor.led_current = 20
+                        self.sensor.led = self._light_applied = self.light_on
+                    values = read_spectrum(self.sensor)
+                    ranger = self.ranger
+                    if ranger is not None and ranger.update(values):
+                        self.meas_config = ranger.config
+                # Verlauf normiert (Counts pro Gain*ms), damit Gainwechsel keine Sprünge machen
+                self.history.append(normalize_counts(values, *cfg), t)
+                self._latest_raw = (values, cfg)
+                self.rate.tick()
+                with self._log_lock:
+                    if self.logger is not None:
+                        gain_code, atime, astep = cfg
+                        self.logger.append(values, gain_factor(gain_code), atime, astep, t)
             except Exception as e:
                 print("Fehler beim Sensorlesen:", e)
-            time.sleep(0.5)
+                time.sleep(0.5)
+
+    # ---------- Tk-Seite ----------
+
+    def render(self):
+        self._render_job = None
+        if not self.running:
+            return
+        try:
+            if self.history.seq != self._rendered_seq:
+                self._rendered_seq = self.history.seq
+                latest = self._latest_raw
+                if latest is not None:
+                    values, (_, atime, astep) = latest
+                    fs = full_scale(atime, astep)
+                    for label_text, value in zip(CHANNEL_LABELS, values):
+                        progress, value_label = self.bars[label_text]
+                        progress['maximum'] = fs
+                        progress['value'] = value
+                        value_label['text'] = str(int(value))
+                self.draw_history()
+            self.rate_label['text'] = self._rate_text()
+            logger = self.logger
+            if logger is not None:
+                mb = logger.count * RECORD_DTYPE.itemsize / 1e6
+                self.log_label['text'] = f"{logger.total} Spektren, {mb:.1f} MB"
+        except Exception as e:
+            print("Fehler bei der Anzeige:", e)
+        self._render_job = self.after(self.render_ms, self.render)
+
+    def draw_history(self):
+        c = self.history_canvas
+        c.delete("all")
+        w = int(c.winfo_width()) if c.winfo_width() > 1 else int(c['width'])
+        h = int(c.winfo_height()) if c.winfo_height() > 1 else int(c['height'])
+
+        window_s = self.window_options.get(self.window_var.get(), 60)
+        t, data = self.history.snapshot(window_s)
+        if len(t) < 2:
+            return
+        tb, mins, maxs = decimate_minmax(t, data, w // 2)
+
+        top = max(float(maxs.max()), 1e-6)
+        if self.log_scale.get():
+            scale = lambda v: np.log1p(v) / np.log1p(top)
+        else:
+            scale = lambda v: v / top
+        t_end = t[-1]
+        xs = (w - 1) - (t_end - tb) / window_s * (w - 1)
+
+        for ch, color in enumerate(CHANNEL_COLORS):
+            y_lo = (h - 1) - np.clip(scale(mins[:, ch]), 0, 1) * (h - 1)
+            y_hi = (h - 1) - np.clip(scale(maxs[:, ch]), 0, 1) * (h - 1)
+            # Hüllkurve: pro Spalte erst max, dann min
+            pts = np.empty(4 * len(xs))
+            pts[0::4] = xs
+            pts[1::4] = y_hi
+            pts[2::4] = xs
+            pts[3::4] = y_lo
+            c.create_line(*pts.tolist(), fill=color)
+
+        c.create_text(4, 4, anchor='nw', fill="white",
+                      text=f"{len(t)} Werte / {window_s} s, max {top:.3g} Counts/(Gain·ms)")
 
     def destroy(self):
         self.running = False
+        with self._log_lock:
+            logger, self.logger = self.logger, None
+        if logger is not None:
+            logger.close()
+        if self._render_job is not None:
+            try:
+                self.after_cancel(self._render_job)
+            except Exception:
+                pass
+            self._render_job = None
         super().destroy()
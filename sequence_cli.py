@@ -0,0 +1,185 @@
+# sequence_cli.py
+"""
+Gespeicherte Sequenz (JSON aus dem Sequenz-Dialog) ohne GUI ausführen.
+
+    python3 sequence_cli.py plan.json
+    python3 sequence_cli.py plan.json --save-dir /data/nacht --shutter 20000 --gain 1.0
+    python3 sequence_cli.py plan.json --order        # nur geplante Reihenfolge zeigen
+    python3 sequence_cli.py plan.json --every 10m --for 48h   # Zeitraffer
+    python3 sequence_cli.py --resume /data/sequence_20250101_120000   # fortsetzen
+    MSCAM_SIM=1 python3 sequence_cli.py plan.json    # Simulation
+
+Gleicher Ablauf wie im Dialog (sequence_engine), aber ohne Tk-Fenster,
+matplotlib und Vorschau-Darstellung; libcamera-vid läuft nur, solange die
+Kamera-Regelung Bilder braucht. Fortschritt auf stdout, Zeitbericht in
+timeline.json des Laufs und als Tabelle am Ende.
+Mit --every läuft der Plan im festen Zeitraster (timelapse.py); die Hardware
+bleibt zwischen den Läufen offen. --resume setzt einen Lauf anhand seines
+journal.jsonl fort (erledigte Schritte werden übersprungen).
+SIGTERM bricht nach dem laufenden Schritt ab (LEDs aus, Dateien vollständig).
+Exit-Code: 0 ok, 1 Fehler, 2 Hardware/Plan nicht nutzbar, 3 abgebrochen.
+"""
+import argparse
+import signal
+import sys
+import time
+
+T_START = time.perf_counter()
+
+from sequence_engine import (SequenceEngine, load_plan, open_ir_filter, open_spectral_sensor,
+                             plan_from_dict)
+from sequence_journal import SequenceJournal
+from sequence_planner import build_steps, order_steps, path_cost
+from timelapse import OVERRUN_MODES, TimelapseScheduler, parse_interval
+
+
+def _log(t0, text):
+    print(f"[{time.perf_counter() - t0:7.1f}s] {text}", flush=True)
+
+
+def print_order(plan, sensor_available):
+    steps = build_steps(plan, sensor_available=sensor_available)
+    ordered, cost = order_steps(steps) if plan.optimize_order else (steps, path_cost(steps))
+    for i, s in enumerate(ordered, 1):
+        flags = ",".join(s.formats) + (" kamera" if s.metered else "")
+        print(f"{i:3d}  {s.label:30s} {s.channel.mode:7s} {flags}")
+    print(f"geschätzte Umschaltzeit: {cost:.1f} s (Listenreihenfolge {path_cost(steps):.1f} s)")
+
+
+def print_report(summary, startup_s):
+    print()
+    print(f"{'Stufe':12s} {'n':>5s} {'Summe s':>9s} {'Mittel s':>9s} {'p95 s':>8s} {'Max s':>8s}")
+    for name, st in sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+        print(f"{name:12s} {st['count']:5d} {st['total_s']:9.2f} {st['mean_s']:9.3f} "
+              f"{st['p95_s']:8.3f} {st['max_s']:8.3f}")
+    print(f"Start {startup_s:.2f} s, Sequenz {summary['wall_s']:.1f} s, {summary['steps']} Schritte")
+    if summary.get("skipped_steps"):
+        print(f"{len(summary['skipped_steps'])} Schritte aus dem Journal übernommen")
+    if summary.get("dark_frames_skipped"):
+        print(f"Dunkelbilder übersprungen ({summary['dark_frames_skipped']}): --shutter angeben")
+    if summary.get("roi_fallback"):
+        print(f"ROI: {summary['roi_fallback']} -> Auto-ROI (roi_rect im Plan setzen)")
+    if summary.get("failed_steps"):
+        print("Fehlgeschlagen (mit --resume nachholen):", *summary["failed_steps"], sep="\n  ")
+    if summary.get("post_errors"):
+        print("Fehler beim Abschluss:", *summary["post_errors"], sep="\n  ")
+    print("Daten:", summary["base_dir"])
+
+
+def print_timelapse(stats):
+    d, late = stats["duration"], stats["lateness"]
+    print()
+    print(f"Zeitraffer: {stats['runs']} Läufe ({stats['ok']} ok, {stats['errors']} Fehler), "
+          f"{stats['skipped_slots']} Slots ausgelassen, Intervall {stats['interval_s']:.0f} s")
+    if d["count"]:
+        print(f"Dauer      mittel {d['mean_s']:.1f} s  p50 {d['p50_s']:.1f}  p95 {d['p95_s']:.1f}  max {d['max_s']:.1f}")
+        print(f"Verspätung mittel {late['mean_s']:.2f} s  p95 {late['p95_s']:.2f}  max {late['max_s']:.2f}")
+    print("Log:", stats["log"])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Aufnahmesequenz headless ausführen")
+    ap.add_argument("plan", nargs="?", help="Sequenz-Einstellungen (JSON)")
+    ap.add_argument("--resume", metavar="SEQ_DIR", help="abgebrochenen Lauf (sequence_*) fortsetzen")
+    ap.add_argument("--save-dir", help="Speicherort statt plan.save_dir")
+    ap.add_argument("--width", type=int, default=640, help="Vorschau-/Messauflösung")
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--framerate", type=int, default=15)
+    ap.add_argument("--shutter", type=int, help="Ausgangs-Shutter in µs")
+    ap.add_argument("--gain", type=float, help="Ausgangs-Gain")
+    ap.add_argument("--no-sensor", action="store_true", help="AS7341 nicht benutzen")
+    ap.add_argument("--order", action="store_true", help="nur Schrittfolge ausgeben")
+    ap.add_argument("--every", type=parse_interval, help="Zeitraffer-Intervall (z.B. 600, 10m, 1h)")
+    ap.add_argument("--count", type=int, default=0, help="Zeitraffer: Anzahl Läufe (0 = unbegrenzt)")
+    ap.add_argument("--for", dest="duration", type=parse_interval, default=0.0,
+                    help="Zeitraffer: Gesamtdauer (z.B. 48h)")
+    ap.add_argument("--overrun", choices=OVERRUN_MODES, default="skip",
+                    help="Lauf länger als Intervall: Slot auslassen oder sofort nachholen")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Regel-Status ausgeben")
+    args = ap.parse_args(argv)
+
+    if bool(args.plan) == bool(args.resume):
+        ap.error("entweder Plan-Datei oder --resume angeben")
+    try:
+        if args.resume:
+            plan_dict, _ = SequenceJournal(args.resume).load()
+            if plan_dict is None:
+                raise ValueError("kein journal.jsonl")
+            plan = plan_from_dict(plan_dict)
+        else:
+            plan = load_plan(args.plan)
+    except Exception as e:
+        print(f"Plan nicht lesbar: {e}", file=sys.stderr)
+        return 2
+    if args.save_dir:
+        plan.save_dir = args.save_dir
+    plan.ir_states = plan.ir_states or ["OUT"]
+    if not plan.save_dir or not any(c.enabled for c in plan.channels or []):
+        print("Plan ohne Speicherort oder ohne aktive Kanäle", file=sys.stderr)
+        return 2
+
+    sensor = None if args.no_sensor else open_spectral_sensor()
+    if args.order:
+        print_order(plan, sensor is not None)
+        return 0
+
+    from hw_backend import CameraStream
+    from led_control import LEDController
+
+    led = LEDController(use_gui=False)
+    if not getattr(led, "sorted_channels", None):
+        print("LED-Controller nicht verfügbar", file=sys.stderr)
+        return 2
+    ir_filter = open_ir_filter()
+    stream = CameraStream(width=args.width, height=args.height, framerate=args.framerate,
+                          shutter=args.shutter, gain=args.gain)
+
+    t0 = time.perf_counter()
+    engine = SequenceEngine(
+        stream, led, ir_filter=ir_filter, spectral_sensor=sensor,
+        on_progress=lambda t: _log(t0, t),
+        on_status=(lambda t: _log(t0, "  " + t)) if args.verbose else None,
+        on_target=lambda n, v: _log(t0, f"  {n}: AS7341-Ziel eingelernt {v:.4g}"),
+    )
+    startup_s = t0 - T_START
+    _log(t0, f"Start nach {startup_s:.2f} s, IR-Filter {'ja' if ir_filter else 'nein'}, "
+             f"AS7341 {'ja' if sensor else 'nein'}")
+
+    if args.every and not args.resume:
+        sched = TimelapseScheduler(engine, plan, args.every, count=args.count,
+                                   duration_s=args.duration, overrun=args.overrun,
+                                   on_log=lambda t: _log(t0, t))
+        signal.signal(signal.SIGTERM, lambda *_: sched.stop())
+        try:
+            stats = sched.run()
+        except KeyboardInterrupt:
+            sched.stop()
+            stats = sched.stats()
+        finally:
+            stream.stop()
+        print_timelapse(stats)
+        return 0 if stats["errors"] == 0 else 1
+
+    signal.signal(signal.SIGTERM, lambda *_: engine.abort())
+    try:
+        if args.resume:
+            summary = engine.resume(args.resume, startup_s=round(startup_s, 3), headless=True)
+        else:
+            summary = engine.run(plan, startup_s=round(startup_s, 3), headless=True)
+    except KeyboardInterrupt:
+        print("abgebrochen", file=sys.stderr)
+        return 3
+    except Exception as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return 1
+    finally:
+        stream.stop()
+
+    print_report(summary, startup_s)
+    if summary.get("aborted"):
+        return 3
+    return 1 if summary.get("failed_steps") or summary.get("post_errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
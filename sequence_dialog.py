@@ -1,57 +1,17 @@
 # sequence_dialog.py
+import copy
 import os
-import json
-import time
 import threading
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from dataclasses import replace
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-import numpy as np
-
-# Optional IR Filter
-try:
-    from filter_controller import IRFilterController
-except Exception:
-    IRFilterController = None
-
-
-@dataclass
-class ChannelPlan:
-    name: str
-    enabled: bool = True
-
-    mode: str = "fixed"     # "fixed" oder "auto"
-    pwm: float = 10.0       # nur für fixed
-
-    hist_channel: str = "Gray"   # <<< NEU: pro Kanal
-
-    jpeg: bool = True
-    raw: bool = False
-
-
-
-@dataclass
-class SequencePlan:
-    save_dir: str = ""
-    repeat_ir: bool = False           # ohne/mit IR Filter wiederholen
-    ir_states: list = None            # ["OUT","IN"] oder nur ["OUT"]
-    hist_channel: str = "Gray"        # für Auto-LED: Gray/R/G/B
-
-    # Auto-LED Parameter (global)
-    low_limit: int = 10
-    high_limit: int = 10
-    low_fraction_target: float = 0.05
-    high_fraction_target: float = 0.05
-    start_step: float = 20.0
-    min_step: float = 0.1
-    eps: float = 0.002
-    loop_ms: int = 800
-    max_cycles: int = 120
-
-    channels: list = None             # list[ChannelPlan]
+from exposure_metering import RoiTracker
+from sequence_engine import (ChannelPlan, SequencePlan, SequenceEngine, load_plan, save_plan,
+                             open_ir_filter, open_spectral_sensor)
+from sequence_journal import JOURNAL_NAME
+from timelapse import TimelapseScheduler
 
 
 class SequenceDialog(tk.Toplevel):
@@ -71,7 +31,6 @@ class SequenceDialog(tk.Toplevel):
         self.title("Aufnahmesequenz")
         self.geometry("780x520")
         self.configure(bg="#2e2e2e")
-        self._abort = False
 
         # LED Controller (headless bevorzugt)
         self.led = self.master.get_led_controller(force_gui=False)
@@ -86,20 +45,27 @@ class SequenceDialog(tk.Toplevel):
             self.destroy()
             return
 
-        # IR Filter optional
-        self.ir_filter = None
-        self.ir_available = False
-        if IRFilterController is not None:
-            try:
-                self.ir_filter = IRFilterController()
-                self.ir_available = True
-            except Exception:
-                self.ir_available = False
+        # IR Filter und AS7341 optional
+        self.ir_filter = open_ir_filter()
+        self.ir_available = self.ir_filter is not None
+        self.spectral_sensor = open_spectral_sensor()
+
+        # Ablauf ohne Tk (auch für sequence_cli.py); Callbacks kommen aus dem Sequenz-Thread
+        self.engine = SequenceEngine(
+            self.stream, self.led,
+            ir_filter=self.ir_filter,
+            spectral_sensor=self.spectral_sensor,
+            on_status=lambda t: self._ui(lambda: self.status_var.set(t)),
+            on_progress=lambda t: self._ui(lambda: self.progress_var.set(t)),
+            on_target=lambda n, v: self._ui(lambda: self._set_row_target(n, v)),
+        )
 
         # --- Plan State (Tk Vars) ---
         self.save_dir_var = tk.StringVar(value=os.path.expanduser("~/MultispectralCAM_Data"))
         self.repeat_ir_var = tk.BooleanVar(value=False)
         self.hist_channel_var = tk.StringVar(value="Gray")
+        preview_roi = getattr(self.master, "roi_tracker", None)
+        self.roi_mode_var = tk.StringVar(value=(preview_roi.mode if preview_roi else "off"))
 
         self.low_limit_var = tk.IntVar(value=10)
         self.high_limit_var = tk.IntVar(value=10)
@@ -109,18 +75,31 @@ class SequenceDialog(tk.Toplevel):
         self.min_step_var = tk.DoubleVar(value=0.1)
         self.loop_ms_var = tk.IntVar(value=800)
         self.max_cycles_var = tk.IntVar(value=120)
+        self.adjust_exposure_var = tk.BooleanVar(value=True)
+        self.allow_gain_var = tk.BooleanVar(value=False)
+        self.max_shutter_var = tk.IntVar(value=200000)
+        self.max_gain_var = tk.DoubleVar(value=8.0)
+        self.sample_spectrum_var = tk.BooleanVar(value=self.spectral_sensor is not None)
+        self.sensor_verify_var = tk.BooleanVar(value=True)
+        self.optimize_order_var = tk.BooleanVar(value=True)
+        self.dark_frames_var = tk.BooleanVar(value=False)
+        self.timelapse_min_var = tk.DoubleVar(value=0.0)    # 0 = einmal
+        self.timelapse_runs_var = tk.IntVar(value=0)        # 0 = bis Stopp
 
         self.status_var = tk.StringVar(value="Status: bereit")
         self.progress_var = tk.StringVar(value="")
 
         # Per-channel widgets
         self.channel_rows = []  # list[dict] with vars + name
+        # zuletzt geladener Plan: Felder ohne Widget (settle_*, sensor_band, ...) bleiben beim Speichern erhalten
+        self._base_plan = SequencePlan()
 
         self._build_ui()
         self._populate_channels()
 
         self._running = False
         self._thread = None
+        self._scheduler = None
 
     # ---------------- UI ----------------
 
@@ -146,6 +125,25 @@ class SequenceDialog(tk.Toplevel):
         ttk.OptionMenu(opt, self.hist_channel_var, self.hist_channel_var.get(),
                        "Gray", "R", "G", "B").grid(row=0, column=2, sticky="w", padx=(6, 0))
 
+        ttk.Label(opt, text="Mess-ROI:").grid(row=0, column=3, sticky="e", padx=(12, 0))
+        ttk.OptionMenu(opt, self.roi_mode_var, self.roi_mode_var.get(),
+                       *RoiTracker.MODES).grid(row=0, column=4, sticky="w", padx=(6, 0))
+
+        ttk.Checkbutton(opt, text="AS7341-Spektrum mitmessen",
+                        variable=self.sample_spectrum_var,
+                        state=("normal" if self.spectral_sensor is not None else "disabled")).grid(
+            row=1, column=0, sticky="w", pady=(4, 0))
+        ttk.Checkbutton(opt, text="AS7341-Modus: Kamera-Kontrollbild",
+                        variable=self.sensor_verify_var,
+                        state=("normal" if self.spectral_sensor is not None else "disabled")).grid(
+            row=1, column=1, columnspan=3, sticky="w", padx=(12, 0), pady=(4, 0))
+        ttk.Checkbutton(opt, text="Reihenfolge optimieren",
+                        variable=self.optimize_order_var).grid(
+            row=1, column=4, sticky="w", padx=(12, 0), pady=(4, 0))
+        ttk.Checkbutton(opt, text="Dunkelbilder (LEDs aus) abziehen",
+                        variable=self.dark_frames_var).grid(
+            row=2, column=0, columnspan=2, sticky="w", pady=(4, 0))
+
         # Auto-LED Parameter (kompakt)
         auto = ttk.LabelFrame(self, text="Auto-LED Parameter (global)")
         auto.pack(fill="x", **pad)
@@ -164,6 +162,13 @@ class SequenceDialog(tk.Toplevel):
         add_row(1, 4, "loop_ms", self.loop_ms_var)
         add_row(1, 6, "max_cycles", self.max_cycles_var)
 
+        ttk.Checkbutton(auto, text="Shutter anpassen", variable=self.adjust_exposure_var).grid(
+            row=2, column=0, columnspan=2, sticky="w", pady=2)
+        ttk.Checkbutton(auto, text="Gain erlauben", variable=self.allow_gain_var).grid(
+            row=2, column=2, columnspan=2, sticky="w", padx=(6, 0), pady=2)
+        add_row(2, 4, "max_shutter µs", self.max_shutter_var)
+        add_row(2, 6, "max_gain", self.max_gain_var)
+
         # Channel table (scrollable)
         mid = ttk.LabelFrame(self, text="Kanäle")
         mid.pack(fill="both", expand=True, **pad)
@@ -186,8 +191,8 @@ class SequenceDialog(tk.Toplevel):
         hdr = ttk.Frame(self.rows_frame)
         hdr.grid(row=0, column=0, sticky="ew", padx=6, pady=(6, 2))
 
-        headings = ["Use", "Kanal", "Mode", "PWM %", "Hist", "JPEG", "RAW"]
-        widths = [6, 8, 10, 8, 7, 6, 6]
+        headings = ["Use", "Kanal", "Mode", "PWM %", "Hist", "JPEG", "RAW", "AS-Ziel", "Mittel N"]
+        widths = [6, 8, 10, 8, 7, 6, 6, 8, 7]
         for i, (h, w) in enumerate(zip(headings, widths)):
             ttk.Label(hdr, text=h).grid(row=0, column=i, sticky="w", padx=(0, 10))
             hdr.columnconfigure(i, minsize=w*8)
@@ -202,10 +207,24 @@ class SequenceDialog(tk.Toplevel):
         self.start_btn = ttk.Button(bot, text="Messung starten", command=self.start_sequence)
         self.start_btn.grid(row=0, column=2, padx=(0, 6))
 
-        ttk.Button(bot, text="Schließen", command=self._on_close).grid(row=0, column=3)
+        self.stop_btn = ttk.Button(bot, text="Stopp", command=self.stop_sequence, state="disabled")
+        self.stop_btn.grid(row=0, column=3, padx=(0, 6))
 
-        ttk.Label(bot, textvariable=self.status_var).grid(row=1, column=0, columnspan=4, sticky="w", pady=(10, 0))
-        ttk.Label(bot, textvariable=self.progress_var).grid(row=2, column=0, columnspan=4, sticky="w", pady=(2, 0))
+        self.resume_btn = ttk.Button(bot, text="Fortsetzen…", command=self.resume_sequence)
+        self.resume_btn.grid(row=0, column=4, padx=(0, 6))
+
+        ttk.Button(bot, text="Schließen", command=self._on_close).grid(row=0, column=5)
+
+        tl = ttk.Frame(bot)
+        tl.grid(row=1, column=0, columnspan=6, sticky="w", pady=(8, 0))
+        ttk.Label(tl, text="Zeitraffer alle").pack(side="left")
+        ttk.Entry(tl, textvariable=self.timelapse_min_var, width=6).pack(side="left", padx=4)
+        ttk.Label(tl, text="min (0 = einmal), Läufe").pack(side="left")
+        ttk.Entry(tl, textvariable=self.timelapse_runs_var, width=5).pack(side="left", padx=4)
+        ttk.Label(tl, text="(0 = bis Stopp)").pack(side="left")
+
+        ttk.Label(bot, textvariable=self.status_var).grid(row=2, column=0, columnspan=6, sticky="w", pady=(10, 0))
+        ttk.Label(bot, textvariable=self.progress_var).grid(row=3, column=0, columnspan=6, sticky="w", pady=(2, 0))
 
     def _choose_dir(self):
         d = filedialog.askdirectory(title="Speicherort wählen", initialdir=self.save_dir_var.get())
@@ -248,14 +267,19 @@ class SequenceDialog(tk.Toplevel):
             jpeg = tk.BooleanVar(value=True)
             raw = tk.BooleanVar(value=False)
             hist_ch = tk.StringVar(value="Gray")
+            sensor_target = tk.DoubleVar(value=0.0)
+            average = tk.IntVar(value=1)
 
             ttk.Checkbutton(frm, variable=enabled).grid(row=0, column=0, sticky="w", padx=(0, 10))
             ttk.Label(frm, text=ch_name).grid(row=0, column=1, sticky="w", padx=(0, 10))
-            ttk.OptionMenu(frm, mode, mode.get(), "fixed", "auto").grid(row=0, column=2, sticky="w", padx=(0, 10))
+            modes = ("fixed", "auto", "sensor") if self.spectral_sensor is not None else ("fixed", "auto")
+            ttk.OptionMenu(frm, mode, mode.get(), *modes).grid(row=0, column=2, sticky="w", padx=(0, 10))
             ttk.Entry(frm, textvariable=pwm, width=8).grid(row=0, column=3, sticky="w", padx=(0, 14))
             ttk.OptionMenu(frm, hist_ch, hist_ch.get(), "Gray", "R", "G", "B").grid(row=0, column=4, sticky="w", padx=(0, 14))
             ttk.Checkbutton(frm, variable=jpeg).grid(row=0, column=4, sticky="w", padx=(0, 18))
             ttk.Checkbutton(frm, variable=raw).grid(row=0, column=5, sticky="w")
+            ttk.Entry(frm, textvariable=sensor_target, width=8).grid(row=0, column=6, sticky="w", padx=(14, 0))
+            ttk.Entry(frm, textvariable=average, width=4).grid(row=0, column=7, sticky="w", padx=(14, 0))
 
             self.channel_rows.append({
                 "frame": frm,
@@ -266,12 +290,14 @@ class SequenceDialog(tk.Toplevel):
                 "hist_channel": hist_ch,
                 "jpeg": jpeg,
                 "raw": raw,
+                "sensor_target": sensor_target,
+                "average_frames": average,
             })
 
     # ---------------- Plan Save/Load ----------------
 
     def _collect_plan(self) -> SequencePlan:
-        plan = SequencePlan()
+        plan = copy.deepcopy(self._base_plan)
         plan.save_dir = os.path.expanduser(self.save_dir_var.get())
         plan.repeat_ir = bool(self.repeat_ir_var.get())
         plan.ir_states = ["OUT", "IN"] if plan.repeat_ir else ["OUT"]
@@ -285,23 +311,40 @@ class SequenceDialog(tk.Toplevel):
         plan.min_step = float(self.min_step_var.get())
         plan.loop_ms = int(self.loop_ms_var.get())
         plan.max_cycles = int(self.max_cycles_var.get())
-
+        plan.adjust_exposure = bool(self.adjust_exposure_var.get())
+        plan.allow_gain = bool(self.allow_gain_var.get())
+        plan.max_shutter = int(self.max_shutter_var.get())
+        plan.max_gain = float(self.max_gain_var.get())
+        plan.sample_spectrum = bool(self.sample_spectrum_var.get())
+        plan.sensor_verify = bool(self.sensor_verify_var.get())
+        plan.optimize_order = bool(self.optimize_order_var.get())
+        plan.dark_frames = bool(self.dark_frames_var.get())
+
+        plan.roi_mode = self.roi_mode_var.get()
+        preview_roi = getattr(self.master, "roi_tracker", None)
+        if preview_roi is not None and preview_roi.rect:
+            plan.roi_rect = list(preview_roi.rect)
+
+        base_channels = {c.name: c for c in self._base_plan.channels or []}
         plan.channels = []
         for row in self.channel_rows:
-            cp = ChannelPlan(
-                name=row["name"],
+            cp = replace(
+                base_channels.get(row["name"]) or ChannelPlan(row["name"]),
                 enabled=bool(row["enabled"].get()),
                 mode=row["mode"].get(),
                 pwm=float(row["pwm"].get()),
                 hist_channel=row["hist_channel"].get(),
                 jpeg=bool(row["jpeg"].get()),
                 raw=bool(row["raw"].get()),
+                sensor_target=float(row["sensor_target"].get()),
+                average_frames=max(1, int(row["average_frames"].get())),
             )
             plan.channels.append(cp)
 
         return plan
 
     def _apply_plan(self, plan: SequencePlan):
+        self._base_plan = copy.deepcopy(plan)
         self.save_dir_var.set(plan.save_dir or self.save_dir_var.get())
         self.repeat_ir_var.set(bool(plan.repeat_ir))
         self.hist_channel_var.set(plan.hist_channel or "Gray")
@@ -314,6 +357,21 @@ class SequenceDialog(tk.Toplevel):
         self.min_step_var.set(float(plan.min_step))
         self.loop_ms_var.set(int(plan.loop_ms))
         self.max_cycles_var.set(int(plan.max_cycles))
+        self.adjust_exposure_var.set(bool(plan.adjust_exposure))
+        self.allow_gain_var.set(bool(plan.allow_gain))
+        self.max_shutter_var.set(int(plan.max_shutter))
+        self.max_gain_var.set(float(plan.max_gain))
+        if self.spectral_sensor is not None:
+            self.sample_spectrum_var.set(bool(plan.sample_spectrum))
+        self.sensor_verify_var.set(bool(plan.sensor_verify))
+        self.optimize_order_var.set(plan.optimize_order is not False)
+        self.dark_frames_var.set(bool(plan.dark_frames))
+
+        self.roi_mode_var.set(plan.roi_mode or "off")
+        preview_roi = getattr(self.master, "roi_tracker", None)
+        if preview_roi is not None and plan.roi_rect:
+            preview_roi.set_manual(plan.roi_rect)
+            preview_roi.set_mode(plan.roi_mode or "off")
 
         # rows nach name mappen
         row_by_name = {r["name"]: r for r in self.channel_rows}
@@ -327,6 +385,8 @@ class SequenceDialog(tk.Toplevel):
                     r["hist_channel"].set(cp.hist_channel or "Gray")
                     r["jpeg"].set(bool(cp.jpeg))
                     r["raw"].set(bool(cp.raw))
+                    r["sensor_target"].set(float(cp.sensor_target or 0.0))
+                    r["average_frames"].set(int(cp.average_frames or 1))
 
     def save_plan(self):
         plan = self._collect_plan()
@@ -338,10 +398,7 @@ class SequenceDialog(tk.Toplevel):
         if not path:
             return
         try:
-            data = asdict(plan)
-            # dataclasses -> list of dict ok
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            save_plan(plan, path)
             self.status_var.set(f"Status: gespeichert: {path}")
         except Exception as e:
             msg = str(e)
@@ -355,14 +412,7 @@ class SequenceDialog(tk.Toplevel):
         if not path:
             return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            plan = SequencePlan(**{k: data.get(k) for k in data.keys() if k != "channels"})
-            # channels separat
-            ch_list = []
-            for c in data.get("channels", []):
-                ch_list.append(ChannelPlan(**c))
-            plan.channels = ch_list
+            plan = load_plan(path)
             self._apply_plan(plan)
             self.status_var.set(f"Status: geladen: {path}")
         except Exception as e:
@@ -387,124 +437,106 @@ class SequenceDialog(tk.Toplevel):
             messagebox.showwarning("Sequenz", "Keine Kanäle ausgewählt.")
             return
 
+        if plan.roi_mode == "manual" and not plan.roi_rect:
+            if not messagebox.askokcancel(
+                    "Sequenz", "ROI „manual“, aber in der Vorschau ist kein Rechteck gezogen.\n"
+                               "Mit Auto-ROI messen?"):
+                return
+            plan.roi_mode = "auto"
+            self.roi_mode_var.set("auto")
+
         os.makedirs(plan.save_dir, exist_ok=True)
 
+        try:
+            interval_s = float(self.timelapse_min_var.get()) * 60.0
+            runs = int(self.timelapse_runs_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showwarning("Sequenz", "Zeitraffer: Intervall/Läufe ungültig.")
+            return
+
         self._running = True
         self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
         self.status_var.set("Status: Messung läuft …")
         self.progress_var.set("")
 
-        self._thread = threading.Thread(target=self._run_sequence_thread, args=(plan,), daemon=True)
+        if interval_s > 0:
+            # Hardware bleibt offen, Startzeiten im festen Raster
+            self._scheduler = TimelapseScheduler(
+                self.engine, plan, interval_s, count=runs,
+                on_log=lambda t: self._ui(lambda: self.status_var.set(f"Status: {t}")))
+            target = self._run_timelapse_thread
+        else:
+            target = self._run_sequence_thread
+        self._thread = threading.Thread(target=target, args=(plan,), daemon=True)
+        self._thread.start()
+
+    def resume_sequence(self):
+        """Abgebrochenen Lauf (sequence_*-Ordner mit journal.jsonl) fortsetzen."""
+        if self._running:
+            messagebox.showinfo("Sequenz", "Messung läuft bereits.")
+            return
+        d = filedialog.askdirectory(title="Sequenzordner zum Fortsetzen",
+                                    initialdir=self.save_dir_var.get())
+        if not d:
+            return
+        if not os.path.exists(os.path.join(d, JOURNAL_NAME)):
+            messagebox.showwarning("Sequenz", f"Kein {JOURNAL_NAME} in\n{d}")
+            return
+
+        self._running = True
+        self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.status_var.set("Status: Fortsetzen …")
+        self.progress_var.set("")
+        self._thread = threading.Thread(target=self._run_sequence_thread, args=(None, d), daemon=True)
         self._thread.start()
 
-    def _run_sequence_thread(self, plan: SequencePlan):
-        seq_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_dir = os.path.join(plan.save_dir, f"sequence_{seq_ts}")
-        os.makedirs(base_dir, exist_ok=True)
+    def stop_sequence(self):
+        # laufender Schritt wird noch fertig aufgenommen
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        else:
+            self.engine.abort()
+        self.status_var.set("Status: Stopp angefordert …")
 
-        # alles auf 0 setzen (sauberer Start)
+    def _run_timelapse_thread(self, plan: SequencePlan):
         try:
-            for ch in self.led.get_all_channels():
-                self.led.set_channel_by_name(ch, 0.0)
-        except Exception:
-            pass
+            st = self._scheduler.run()
+            d = st["duration"]
+            text = f"Status: Zeitraffer fertig, {st['runs']} Läufe, {st['skipped_slots']} ausgelassen"
+            if d["count"]:
+                text += f", Dauer p50 {d['p50_s']:.1f} s / max {d['max_s']:.1f} s"
+            self._ui(lambda t=text: self.status_var.set(t))
+        except Exception as e:
+            self._ui(lambda: self.status_var.set("Status: Fehler"))
+            msg = str(e)
+            self._ui(lambda m=msg: self.progress_var.set(m))
+        finally:
+            self._ui(self._finish_run)
 
+    def _run_sequence_thread(self, plan: SequencePlan, resume_dir=None):
         try:
-            total_steps = 0
-            for state in plan.ir_states:
-                for c in plan.channels:
-                    if c.enabled:
-                        total_steps += 1
-            done = 0
-
-            for ir_state in plan.ir_states:
-                if self._abort:
-                    break
-                # IR state setzen
-                self._ui(lambda: self.progress_var.set(f"IR State: {ir_state}"))
-                self._set_ir_state(ir_state)
-
-                state_dir = os.path.join(base_dir, f"IR_{ir_state}")
-                os.makedirs(state_dir, exist_ok=True)
-
-                for ch_plan in plan.channels:
-                    if self._abort:
-                        break
-                    if not ch_plan.enabled:
-                        continue
-
-                    done += 1
-                    self._ui(lambda n=ch_plan.name, d=done, t=total_steps:
-                             self.progress_var.set(f"{d}/{t}: {n}"))
-
-                    # alle LEDs auf 0, dann nur diese setzen
-                    self._set_all_leds(0.0)
-                    time.sleep(0.05)
-
-                    if ch_plan.mode == "fixed":
-                        pwm = float(ch_plan.pwm)
-                        self.led.set_channel_by_name(ch_plan.name, pwm)
-                        final_pwm = pwm
-                    else:
-                        final_pwm = self._auto_led_to_target(plan, ch_plan.name, ch_plan.hist_channel)
-
-
-                    # kurze Settling-Zeit
-                    time.sleep(0.15)
-
-                    # Captures
-                    ch_dir = os.path.join(state_dir, self._sanitize(ch_plan.name))
-                    os.makedirs(ch_dir, exist_ok=True)
-
-                    # Meta speichern
-                    meta = {
-                        "timestamp": datetime.now().isoformat(),
-                        "channel": ch_plan.name,
-                        "mode": ch_plan.mode,
-                        "final_pwm": final_pwm,
-                        "ir_state": ir_state,
-                        "hist_channel": plan.hist_channel,
-                        "auto_params": {
-                            "low_limit": plan.low_limit,
-                            "high_limit": plan.high_limit,
-                            "low_fraction_target": plan.low_fraction_target,
-                            "high_fraction_target": plan.high_fraction_target,
-                            "start_step": plan.start_step,
-                            "min_step": plan.min_step,
-                            "loop_ms": plan.loop_ms,
-                            "max_cycles": plan.max_cycles,
-                        },
-                    }
-                    with open(os.path.join(ch_dir, "meta.json"), "w", encoding="utf-8") as f:
-                        json.dump(meta, f, indent=2)
-
-                    if ch_plan.jpeg:
-                        jpg_path = os.path.join(ch_dir, "capture.jpg")
-                        self.stream.capture_still(jpg_path, fmt="jpg")
-
-                    if ch_plan.raw:
-                        dng_path = os.path.join(ch_dir, "capture.dng")
-                        self.stream.capture_raw_dng(dng_path, both=False)
-
-            self._ui(lambda: self.status_var.set(f"Status: fertig  ({base_dir})"))
+            if resume_dir:
+                summary = self.engine.resume(resume_dir)
+            else:
+                summary = self.engine.run(plan)
+            text = f"Status: fertig in {summary['wall_s']:.1f} s  ({summary['base_dir']})"
+            if summary.get("failed_steps"):
+                text += f" – {len(summary['failed_steps'])} fehlgeschlagen, „Fortsetzen…“ holt sie nach"
+            self._ui(lambda t=text: self.status_var.set(t))
             self._ui(lambda: self.progress_var.set(""))
-
         except Exception as e:
             self._ui(lambda: self.status_var.set("Status: Fehler"))
             msg = str(e)
             self._ui(lambda m=msg: self.progress_var.set(m))
-
         finally:
-            # LEDs aus
-            try:
-                self._set_all_leds(0.0)
-            except Exception:
-                pass
             self._ui(self._finish_run)
 
     def _finish_run(self):
         self._running = False
-        self._abort = False
+        self._scheduler = None
+        self.stop_btn.config(state="disabled")
         self.start_btn.config(state="normal")
 
     def _ui(self, fn):
@@ -514,119 +546,13 @@ class SequenceDialog(tk.Toplevel):
         except Exception:
             pass
 
-    # ---------------- helpers ----------------
-
-    def _sanitize(self, s: str) -> str:
-        return "".join(c for c in s if c.isalnum() or c in ("-", "_", ".", " ")).strip().replace(" ", "_")
-
-    def _set_all_leds(self, pwm: float):
-        for n in self.led.get_all_channels():
-            self.led.set_channel_by_name(n, pwm)
-
-    def _set_ir_state(self, state: str):
-        if not self.ir_available or self.ir_filter is None:
-            return
-        try:
-            if state.upper() == "IN":
-                self.ir_filter.switch_in()
-            else:
-                self.ir_filter.switch_out()
-        except Exception:
-            pass
-
-    def _get_hist_channel_flat(self, frame_np: np.ndarray, sel: str):
-        if sel == "R":
-            chan = frame_np[:, :, 0]
-        elif sel == "G":
-            chan = frame_np[:, :, 1]
-        elif sel == "B":
-            chan = frame_np[:, :, 2]
-        else:
-            chan = np.mean(frame_np, axis=2)
-        return chan.astype(np.uint8, copy=False).ravel()
-
-    def _auto_led_to_target(self, plan: SequencePlan, channel_name: str, hist_channel: str) -> float:
-        """
-        Headless Auto-LED: regelt nur diesen Kanal, bis innerhalb Toleranz.
-        """
-        # Start bei 0
-        try:
-            self.led.set_channel_by_name(channel_name, 0.0)
-        except Exception:
-            pass
-
-        step = max(plan.start_step, plan.min_step)
-        prev_dir = 0
-        last_err = None
-        stagn = 0
-
-        pwm = 0.0
-
-        for cyc in range(plan.max_cycles):
-            frame = self.stream.get_frame()
-            if frame is None:
-                time.sleep(plan.loop_ms / 1000.0)
-                continue
-
-            f = np.array(frame)
-            chan = self._get_hist_channel_flat(f, hist_channel)
-            hist, _ = np.histogram(chan, bins=256, range=(0, 256))
-            total = max(1, chan.size)
-
-            low = hist[: plan.low_limit + 1].sum() / total
-            high = hist[255 - plan.high_limit :].sum() / total
-
-            err_dark = max(0.0, low - plan.low_fraction_target)
-            err_bright = max(0.0, high - plan.high_fraction_target)
-            err = err_dark - err_bright
-
-            if err > plan.eps:
-                direction = +1
-            elif err < -plan.eps:
-                direction = -1
-            else:
-                direction = 0
-
-            # adapt step
-            improved = True
-            if last_err is not None:
-                improved = (abs(err) < abs(last_err)) or (direction == 0)
-                if direction != 0 and prev_dir != 0 and direction != prev_dir:
-                    step = max(step / 2.0, plan.min_step)
-                elif not improved:
-                    stagn += 1
-                    if stagn >= 2:
-                        step = max(step / 2.0, plan.min_step)
-                        stagn = 0
-
-            # update pwm
-            if direction == +1:
-                pwm = min(100.0, pwm + step)
-            elif direction == -1:
-                pwm = max(0.0, pwm - step)
-
-            try:
-                self.led.set_channel_by_name(channel_name, pwm)
-            except Exception:
-                pass
-
-            # UI status (non-blocking)
-            self._ui(lambda p=pwm, s=step, lo=low, hi=high:
-                     self.status_var.set(f"Auto-LED {channel_name}: PWM {p:.1f}% step {s:.2f}% "
-                                         f"(low {lo:.1%}, high {hi:.1%})"))
-
-            prev_dir = direction
-            last_err = err
-
-            if direction == 0 and step <= plan.min_step:
-                break
-
-            time.sleep(plan.loop_ms / 1000.0)
-
-        return float(pwm)
+    def _set_row_target(self, name, value):
+        for row in self.channel_rows:
+            if row["name"] == name:
+                row["sensor_target"].set(round(float(value), 4))
 
     def _on_close(self):
         if self._running:
-            messagebox.showwarning("Sequenz", "Messung läuft – bitte warten bis fertig (oder Prozess stoppen).")
+            messagebox.showwarning("Sequenz", "Messung läuft – bitte warten bis fertig (oder Stopp).")
             return
         self.destroy()
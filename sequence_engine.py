@@ -0,0 +1,1033 @@
+# sequence_engine.py
+"""
+Ablauf einer Aufnahmesequenz ohne Tk: LED-Regelung (fixed / Kamera / AS7341),
+IR-Filter, Aufnahmen, meta.json und timeline.json.
+
+Benutzt von SequenceDialog (GUI) und sequence_cli.py (headless). Fortschritt
+und Status laufen über Callbacks; die GUI reicht sie per after() weiter.
+"""
+import os
+import json
+import shutil
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict, fields
+from datetime import datetime
+
+import numpy as np
+
+from exposure_metering import RoiTracker, SettleDetector, histogram_fractions, wait_settled
+from spectral_sensor import SpectrumSampler, band_for_led, configure_integration
+from led_servo import SensorLedServo
+from sequence_pipeline import AsyncIRFilter, PostWorker, StageTimeline
+from sequence_planner import build_steps, order_steps, path_cost
+from sequence_journal import SequenceJournal
+from dark_frames import dark_label, subtract_dark
+from frame_average import FrameAverager, subtract_dark_mean
+
+# so viele Schritte hintereinander fehlgeschlagen -> Lauf beenden (Kamera/Bus vermutlich weg)
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+@dataclass
+class ChannelPlan:
+    name: str
+    enabled: bool = True
+
+    mode: str = "fixed"     # "fixed", "auto" (Kamera) oder "sensor" (AS7341)
+    pwm: float = 10.0       # fixed; bei "sensor" Startwert der Regelung
+
+    # AS7341-Modus: Zielwert (Counts/(Gain*ms)) auf sensor_band ("" = passend zur LED);
+    # 0 = beim ersten Lauf per Kamera-Regelung einlernen
+    sensor_target: float = 0.0
+    sensor_band: str = ""
+
+    hist_channel: str = "Gray"   # <<< NEU: pro Kanal
+
+    jpeg: bool = True
+    raw: bool = False
+
+    # schwache Kanäle: Mittel über N Aufnahmen (Still-Sitzung oder Serie, frame_average)
+    average_frames: int = 1
+    average_variance: bool = False
+
+
+
+@dataclass
+class SequencePlan:
+    save_dir: str = ""
+    repeat_ir: bool = False           # ohne/mit IR Filter wiederholen
+    ir_states: list = None            # ["OUT","IN"] oder nur ["OUT"]
+    hist_channel: str = "Gray"        # für Auto-LED: Gray/R/G/B
+
+    # Auto-LED Parameter (global)
+    low_limit: int = 10
+    high_limit: int = 10
+    low_fraction_target: float = 0.05
+    high_fraction_target: float = 0.05
+    start_step: float = 20.0
+    min_step: float = 0.1
+    eps: float = 0.002
+    loop_ms: int = 800                # Zyklus wartet höchstens so lange auf ein stabiles Bild
+    max_cycles: int = 120
+
+    # Einschwingen nach LED-/Belichtungswechsel (exposure_metering.SettleDetector):
+    # stabil, wenn sich Mittelwert (DN) und Grobhistogramm (L1) settle_frames-mal
+    # in Folge weniger als die Toleranzen ändern
+    settle_frames: int = 2
+    settle_skip: int = 1              # Bilder direkt nach dem Wechsel verwerfen (Pipeline-Latenz)
+    settle_mean_tol: float = 0.5
+    settle_hist_tol: float = 0.02
+    settle_timeout_ms: int = 1500     # vor der Aufnahme
+    settle_min_ms: int = 150          # ohne Vorschaubilder: feste Wartezeit ab LED-Wechsel
+
+    # Belichtung nachführen, wenn die LED an 100 % (bzw. < min_useful_pwm) anschlägt
+    adjust_exposure: bool = True
+    allow_gain: bool = False
+    min_shutter: int = 100            # µs
+    max_shutter: int = 200000         # µs
+    max_gain: float = 8.0
+    min_useful_pwm: float = 5.0       # darunter ist die PWM-Quantisierung zu grob
+
+    # Mess-ROI für Auto-LED: "off" | "manual" | "auto"
+    roi_mode: str = "off"
+    roi_rect: list = None             # [x, y, w, h] relativ 0..1 (nur manual)
+
+    # AS7341 während jeder Aufnahme mitmessen (Mittelwert in meta.json)
+    sample_spectrum: bool = True
+
+    # AS7341-LED-Regelung (Kanal-Modus "sensor")
+    sensor_tolerance: float = 0.02    # relativ zum Zielwert
+    sensor_verify: bool = True        # danach ein Kamerabild prüfen
+    verify_tolerance: float = 0.02    # erlaubte Abweichung der Histogramm-Anteile
+
+    # Schritte in der Reihenfolge mit den geringsten Umschaltkosten (sequence_planner)
+    optimize_order: bool = True
+
+    # Dunkelbild (alle LEDs aus) pro IR-Zustand und Shutter/Gain, Abzug im PostWorker (dark_frames)
+    dark_frames: bool = False
+
+    channels: list = None             # list[ChannelPlan]
+
+
+def open_ir_filter():
+    """IRFilterController oder None (kein pigpio / Daemon aus)."""
+    try:
+        from filter_controller import IRFilterController
+        return IRFilterController()
+    except Exception:
+        return None
+
+
+def open_spectral_sensor():
+    """AS7341 am gemeinsamen Bus oder None."""
+    try:
+        from hw_backend import AS7341
+        from i2c_bus import I2CBusManager
+        bus = I2CBusManager.instance()
+        sensor = bus.device(0x39, "AS7341", AS7341)    # dasselbe Objekt wie im Sensorfenster
+        with bus.batch(0x39):
+            configure_integration(sensor)
+        return sensor
+    except Exception:
+        return None
+
+
+def _known_fields(cls, data: dict, where: str) -> dict:
+    # Plan-JSON einer anderen Version: unbekannte Schlüssel übergehen statt TypeError
+    names = {f.name for f in fields(cls)}
+    unknown = sorted(set(data) - names)
+    if unknown:
+        print(f"[WARN] {where}: unbekannte Schlüssel ignoriert: {', '.join(unknown)}")
+    return {k: v for k, v in data.items() if k in names}
+
+
+def plan_from_dict(data: dict) -> SequencePlan:
+    plan = SequencePlan(**{k: v for k, v in _known_fields(SequencePlan, data, "Plan").items()
+                           if k != "channels"})
+    plan.channels = [ChannelPlan(**_known_fields(ChannelPlan, c, f"Kanal {c.get('name', i)}"))
+                     for i, c in enumerate(data.get("channels", []))]
+    return plan
+
+
+def load_plan(path) -> SequencePlan:
+    with open(path, "r", encoding="utf-8") as f:
+        return plan_from_dict(json.load(f))
+
+
+def save_plan(plan: SequencePlan, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(asdict(plan), f, indent=2)
+
+
+class SequenceEngine:
+    """
+    stream: CameraStream, led: LEDController (headless), ir_filter/spectral_sensor optional.
+    Callbacks (aus dem Sequenz-Thread aufgerufen):
+      on_status(text), on_progress(text), on_target(kanal, gelernter AS7341-Zielwert)
+    """
+
+    def __init__(self, stream, led, ir_filter=None, spectral_sensor=None,
+                 on_status=None, on_progress=None, on_target=None):
+        self.stream = stream
+        self.led = led
+        self.ir_filter = ir_filter
+        self.spectral_sensor = spectral_sensor
+        self.on_status = on_status
+        self.on_progress = on_progress
+        self.on_target = on_target
+
+        self._abort = False
+        self._last_ir_state = None      # Filterstellung nach dem letzten Lauf (Planer spart den Puls)
+        self._roi = RoiTracker()
+        self._last_roi = None
+        # Ressourcen des laufenden Laufs (run() setzt sie)
+        self._journal = self._timeline = self._ir = self._post = None
+        self._servo = self._sampler = None
+        self._base_exposure = (None, None)
+        self._details = {}          # Schritt -> Feinzeiten (siehe _note)
+        self._step_detail = {}
+        self._led_settled = False   # Auto-LED endete mit stabilem Bild, LED seitdem unverändert
+        self._darks = {}            # dark_label -> Dateien relativ zum Sequenzordner
+        self._dark_skip = None      # Grund, falls plan.dark_frames nicht umsetzbar ist
+        self._warned_oneshot_avg = False
+
+    def abort(self):
+        """Nach dem laufenden Schritt abbrechen."""
+        self._abort = True
+
+    def _status(self, text):
+        if self.on_status is not None:
+            self.on_status(text)
+
+    def _progress(self, text):
+        if self.on_progress is not None:
+            self.on_progress(text)
+
+    def resume(self, base_dir, **report):
+        """
+        Abgebrochenen/fehlerhaften Lauf im selben Ordner fortsetzen: Plan aus dem
+        Journal, erledigte Schritte (Prüfsummen ok) überspringen, geregelte PWM übernehmen.
+        """
+        plan_dict, _ = SequenceJournal(base_dir).load()
+        if plan_dict is None:
+            raise ValueError(f"{base_dir}: kein Sequenz-Journal gefunden")
+        return self.run(plan_from_dict(plan_dict), resume_dir=base_dir, **report)
+
+    def run(self, plan: SequencePlan, resume_dir=None, **report):
+        """
+        Sequenz im aufrufenden Thread ausführen (GUI: eigener Thread, CLI: direkt).
+        Ein fehlgeschlagener Schritt wird im Journal vermerkt und übersprungen;
+        erst MAX_CONSECUTIVE_FAILURES Fehler hintereinander beenden den Lauf.
+        report: zusätzliche Einträge für timeline.json.
+        Rückgabe: Inhalt von timeline.json (+ base_dir); Fehler werden nach dem Aufräumen weitergereicht.
+        """
+        self._abort = False
+        seq_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if resume_dir:
+            base_dir = resume_dir
+            journal = SequenceJournal(base_dir)
+            _, journaled = journal.load()
+            # gelernte AS7341-Ziele wiederverwenden
+            for cp in plan.channels or []:
+                for label, rec in journaled.items():
+                    led_rec = rec["led"] or {}
+                    if label.endswith("/" + cp.name) and led_rec.get("sensor_target") and not cp.sensor_target:
+                        cp.sensor_target = led_rec["sensor_target"]
+            timeline_name = f"timeline_resume_{seq_ts}.json"
+        else:
+            base_dir = os.path.join(plan.save_dir, f"sequence_{seq_ts}")
+            n = 1
+            while os.path.exists(base_dir):         # Zeitraffer: mehrere Läufe pro Sekunde möglich
+                base_dir = os.path.join(plan.save_dir, f"sequence_{seq_ts}_{n}")
+                n += 1
+            os.makedirs(base_dir)
+            journal = SequenceJournal(base_dir)
+            journal.write_plan(asdict(plan))
+            journaled = {}
+            timeline_name = "timeline.json"
+        self._journal = journal
+        self._details = {}
+        self._warned_oneshot_avg = False
+        # Dunkelbilder: beim Fortsetzen die geprüften aus dem Journal weiterverwenden
+        self._darks = {label: rec["done"]["files"] for label, rec in journaled.items()
+                       if "/dark_" in (label or "") and rec["done"] and journal.verify(rec["done"])}
+
+        # Mess-ROI einmal pro Lauf; Auto-ROI wird über alle Kanäle gecacht.
+        # "manual" ohne Rechteck würde still das ganze Bild messen -> ausdrücklich auf auto
+        roi_mode, roi_fallback = plan.roi_mode or "off", None
+        if roi_mode == "manual" and not plan.roi_rect:
+            roi_mode, roi_fallback = "auto", "manual ohne Rechteck"
+            self._progress("Manuelle ROI ohne Rechteck: Messung mit Auto-ROI")
+        self._roi = RoiTracker(mode=roi_mode, rect=plan.roi_rect)
+
+        # Ausgangsbelichtung; Auto-LED darf sie pro Kanal verändern
+        self._base_exposure = (self.stream.shutter, self.stream.gain)
+
+        # Dunkelbilder brauchen eine feste Belichtung, sonst passen sie zu keinem Kanal
+        dark_skip = None
+        if plan.dark_frames and (not self.stream.shutter
+                                 or (getattr(self.stream, "extra_opts", None) or {}).get("ae", False)):
+            dark_skip = "auto exposure"
+            self._progress("Dunkelbilder übersprungen: keine feste Belichtung (Shutter setzen, AE aus)")
+        self._dark_skip = dark_skip
+
+        # alles auf 0 setzen (sauberer Start)
+        try:
+            self._set_all_leds(0.0)
+        except Exception:
+            pass
+
+        # AS7341 misst durchgehend mit; pro Aufnahme wird das Zeitfenster gemittelt
+        sampler = None
+        if plan.sample_spectrum and self.spectral_sensor is not None:
+            sampler = SpectrumSampler(self.spectral_sensor)
+            sampler.start()
+        self._sampler = sampler
+
+        # LED-Regelung über den AS7341 (Kanal-Modus "sensor"); teilt sich den Sensor mit dem Sampler
+        self._servo = None
+        if self.spectral_sensor is not None:
+            self._servo = SensorLedServo(self.spectral_sensor, self.led,
+                                         lock=sampler.sensor_lock if sampler is not None else None,
+                                         tolerance=plan.sensor_tolerance)
+
+        # Pipeline: IR-Filter und meta.json laufen neben dem nächsten Schritt
+        timeline = self._timeline = StageTimeline()
+        ir = self._ir = AsyncIRFilter(self._set_ir_state, timeline)
+        post = self._post = PostWorker(timeline)
+
+        # Vorschau für die ganze Sequenz aus; nur Kamera-Regelung startet sie bei Bedarf
+        cam_mode = getattr(self.stream, "sequence_mode", None)
+        cam_mode = cam_mode(work_dir=base_dir) if cam_mode is not None else nullcontext()
+        cam_mode.__enter__()
+
+        try:
+            # Schrittfolge: günstigste Reihenfolge der Übergänge (IR-Puls, Kamera, LED)
+            steps = build_steps(plan, sensor_available=self._servo is not None)
+            list_cost = path_cost(steps)
+            if plan.optimize_order:
+                steps, planned_cost = order_steps(steps, start_ir=self._last_ir_state)
+            else:
+                planned_cost = list_cost
+            total_steps = len(steps)
+            done = 0
+            skipped = []
+            failed = []
+            consecutive = 0
+            ir_state = None
+
+            for st in steps:
+                if self._abort:
+                    break
+                done += 1
+                prev = journaled.get(st.label)
+                if prev and prev["done"] and journal.verify(prev["done"]):
+                    skipped.append(st.label)
+                    self._progress(f"{done}/{total_steps}: {st.name} (bereits erledigt)")
+                    continue
+
+                if st.ir_state != ir_state:
+                    ir_state = st.ir_state
+                    # IR state anstoßen; gewartet wird erst vor Kamera-Messung/Aufnahme
+                    self._progress(f"IR State: {ir_state}")
+                    ir.request(ir_state)
+                    state_dir = os.path.join(base_dir, f"IR_{ir_state}")
+                    os.makedirs(state_dir, exist_ok=True)
+
+                self._progress(f"{done}/{total_steps}: {st.name}")
+                try:
+                    self._run_step(plan, st, state_dir, done, prev["led"] if prev else None)
+                    consecutive = 0
+                except Exception as e:
+                    failed.append(st.label)
+                    consecutive += 1
+                    journal.failed(st.label, e)
+                    self._status(f"{st.label} fehlgeschlagen: {e}")
+                    if consecutive >= MAX_CONSECUTIVE_FAILURES:
+                        raise RuntimeError(f"{consecutive} Schritte nacheinander fehlgeschlagen ({e}); "
+                                           f"fortsetzbar: {base_dir}") from e
+
+            with timeline.stage("drain"):
+                post.drain()
+            timeline.save_summary(os.path.join(base_dir, timeline_name.replace("timeline", "summary")),
+                                  details=self._details, steps=done,
+                                  resumed=bool(resume_dir), skipped_steps=len(skipped),
+                                  failed_steps=len(failed), dark_frames_skipped=dark_skip,
+                                  roi_fallback=roi_fallback,
+                                  still_launches=getattr(self.stream, "still_launches", None))
+            summary = timeline.save(os.path.join(base_dir, timeline_name),
+                                    steps=done, post_errors=post.errors,
+                                    order=[s.label for s in steps],
+                                    order_cost_s={"planned": round(planned_cost, 2),
+                                                  "list_order": round(list_cost, 2)},
+                                    still_launches=getattr(self.stream, "still_launches", None),
+                                    resumed=bool(resume_dir), skipped_steps=skipped,
+                                    failed_steps=failed, dark_frames=sorted(self._darks),
+                                    dark_frames_skipped=dark_skip, roi_fallback=roi_fallback,
+                                    aborted=self._abort, **report)
+            summary["base_dir"] = base_dir
+            return summary
+
+        finally:
+            post.drain()
+            ir.shutdown()
+            self._last_ir_state = ir.state
+            if sampler is not None:
+                sampler.stop()
+            # Belichtung noch im Sequenz-Modus zurück: reconfigure() startet dort die
+            # Vorschau nicht, sequence_mode stellt danach den Zustand von vorher her
+            try:
+                self._restore_exposure(self._base_exposure)
+            except Exception:
+                pass
+            cam_mode.__exit__(None, None, None)
+            # LEDs aus
+            try:
+                self._set_all_leds(0.0)
+            except Exception:
+                pass
+
+    def _run_step(self, plan: SequencePlan, st, state_dir, order_index, replay=None):
+        """
+        Ein Schritt: LED regeln (bzw. aus dem Journal übernehmen), IR/Belichtung,
+        Aufnahme; meta.json und Journal-Eintrag im PostWorker.
+        """
+        ch_plan = st.channel
+        ir_state = st.ir_state
+        step = st.label
+        timeline, ir, servo = self._timeline, self._ir, self._servo
+        base_exposure = self._base_exposure
+
+        self._last_roi = None
+        self._led_settled = False
+        self._step_detail = self._details[step] = {}
+        servo_info = None
+        exposure_restored = False
+        with timeline.stage("led", step, mode="journal" if replay else ch_plan.mode):
+            if replay:
+                # Fortsetzen: geregelte PWM und Belichtung des abgebrochenen Laufs
+                final_pwm = float(replay["pwm"])
+                self._set_only_led(ch_plan.name, final_pwm)
+                servo_info = {"replayed": True} if ch_plan.mode == "sensor" else None
+            elif ch_plan.mode == "fixed":
+                # Szenenwechsel: nur dieser Kanal an, ein Transfer pro PCA9685
+                pwm = float(ch_plan.pwm)
+                self._set_only_led(ch_plan.name, pwm)
+                final_pwm = pwm
+            elif ch_plan.mode == "sensor" and servo is not None and (ch_plan.sensor_target or 0) > 0:
+                # AS7341 sieht den IR-Filter nicht -> läuft parallel zur Filterbewegung
+                final_pwm, servo_info = self._sensor_led_to_target(plan, ch_plan, servo)
+            else:
+                # Kamera-Regelung braucht Filter in Endlage und die Ausgangsbelichtung
+                ir.wait()
+                self._restore_exposure(base_exposure)
+                exposure_restored = True
+                if ch_plan.mode == "sensor" and servo is not None:
+                    final_pwm, servo_info = self._sensor_led_to_target(plan, ch_plan, servo)
+                else:
+                    # alle LEDs aus, dann regeln (wartet selbst auf das dunkle Bild)
+                    self._set_only_led(ch_plan.name, 0.0)
+                    final_pwm = self._auto_led_to_target(plan, ch_plan.name, ch_plan.hist_channel)
+        t_led = time.monotonic()
+
+        with timeline.stage("ir_wait", step):
+            ir.wait()
+        if not exposure_restored:
+            with timeline.stage("exposure", step):
+                if replay:
+                    self._restore_exposure((replay.get("shutter_us"), replay.get("gain")))
+                else:
+                    self._restore_exposure(base_exposure)
+
+        # Regelergebnis sichern, bevor die Aufnahme scheitern kann
+        if not replay:
+            target = (servo_info or {}).get("target")
+            self._journal.led(step, final_pwm, self.stream.shutter, self.stream.gain,
+                              **({"sensor_target": target} if target else {}))
+
+        with timeline.stage("settle", step):
+            settle_info = self._settle_step(plan, ch_plan, servo_info, t_led, exposure_restored)
+
+        # AS7341-Modus: ein Kontrollbild, sobald Filter und Belichtung stehen
+        if (plan.sensor_verify and servo_info is not None
+                and not servo_info.get("learned") and not servo_info.get("replayed")):
+            with timeline.stage("verify", step):
+                servo_info["verify"] = self._verify_frame(plan, ch_plan.hist_channel)
+
+        # Captures
+        ch_dir = os.path.join(state_dir, self._sanitize(ch_plan.name))
+        os.makedirs(ch_dir, exist_ok=True)
+
+        # Meta speichern
+        meta = {
+            "timestamp": datetime.now().isoformat(),
+            "order_index": order_index,
+            "channel": ch_plan.name,
+            "mode": ch_plan.mode,
+            "final_pwm": final_pwm,
+            "shutter_us": self.stream.shutter,
+            "gain": self.stream.gain,
+            "exposure_adjusted": (self.stream.shutter, self.stream.gain) != base_exposure,
+            "ir_state": ir_state,
+            "hist_channel": plan.hist_channel,
+            "roi_mode": self._roi.mode,
+            "roi": self._last_roi,
+            "sensor_servo": servo_info,
+            "settle": settle_info,
+            "resumed": bool(replay),
+            "auto_params": {
+                "low_limit": plan.low_limit,
+                "high_limit": plan.high_limit,
+                "low_fraction_target": plan.low_fraction_target,
+                "high_fraction_target": plan.high_fraction_target,
+                "start_step": plan.start_step,
+                "min_step": plan.min_step,
+                "loop_ms": plan.loop_ms,
+                "max_cycles": plan.max_cycles,
+                "settle_frames": plan.settle_frames,
+                "settle_mean_tol": plan.settle_mean_tol,
+                "settle_hist_tol": plan.settle_hist_tol,
+                "adjust_exposure": plan.adjust_exposure,
+                "allow_gain": plan.allow_gain,
+                "max_shutter": plan.max_shutter,
+                "max_gain": plan.max_gain,
+            },
+        }
+
+        with timeline.stage("capture", step):
+            cap_t0 = time.time()
+            meta["files"] = self._capture_step(ch_dir, ch_plan)
+            if (ch_plan.average_frames or 1) > 1:
+                meta["average"] = self._capture_average(step, ch_dir, ch_plan, meta["files"])
+            cap_t1 = time.time()
+
+        # Dunkelbild mit derselben Belichtung: nur beim ersten Kanal dieser Kombination
+        dark = None
+        if plan.dark_frames and not self._dark_skip:
+            dark = self._dark_frame(plan, ir_state, state_dir)
+
+        # meta.json (inkl. Spektrum über das Aufnahmefenster) + Journal im Hintergrund
+        self._post.submit("finalize", step, self._finalize_step,
+                          step, ch_dir, meta, self._sampler, cap_t0, cap_t1, dark)
+
+    def _capture_step(self, ch_dir, ch_plan: ChannelPlan, stem="capture"):
+        """
+        Alle Formate eines Schritts mit möglichst wenigen libcamera-still-Aufrufen.
+        JPEG + RAW: ein Aufruf mit -r, beide Dateien aus demselben Frame.
+        """
+        jpg_path = os.path.join(ch_dir, stem + ".jpg")
+        dng_path = os.path.join(ch_dir, stem + ".dng")
+        if ch_plan.jpeg and ch_plan.raw:
+            jpg, dng = self.stream.capture_raw_dng(jpg_path, both=True)
+            self._note_capture()
+            return {"jpeg": os.path.basename(jpg), "raw": os.path.basename(dng), "single_shot": True}
+        files = {}
+        if ch_plan.jpeg:
+            files["jpeg"] = os.path.basename(self.stream.capture_still(jpg_path, fmt="jpg"))
+            self._note_capture()
+        if ch_plan.raw:
+            files["raw"] = os.path.basename(self.stream.capture_raw_dng(dng_path, both=False))
+            self._note_capture()
+        return files
+
+    def _capture_average(self, step, ch_dir, ch_plan: ChannelPlan, files):
+        """
+        Weitere average_frames-1 Aufnahmen nach _average/: je ein Trigger der offenen
+        Still-Sitzung; ohne Sitzung alle in einem libcamera-still-Aufruf (Serie),
+        nur wenn auch das fehlt je ein eigener Aufruf. Jedes Bild ist eine volle
+        Still-Aufnahme (Belichtung + JPEG/DNG schreiben), der PostWorker rechnet
+        sie ein und schreibt zum Schluss Mittelwert (und Varianz) neben capture.*.
+        files (meta["files"]) wird dort ergänzt.
+        Rückgabe: meta.json "average" (vom PostWorker vervollständigt).
+        """
+        fmts = [f for f in ("jpeg", "raw") if isinstance(files.get(f), str)]
+        avg = FrameAverager(fmts, variance=ch_plan.average_variance)
+        path = (getattr(self.stream, "last_capture_timing", None) or {}).get("path")
+        burst = path == "oneshot" and getattr(self.stream, "burst_supported", lambda: False)()
+        if burst:
+            path = "burst"
+        info = {"requested": int(ch_plan.average_frames), "variance": bool(ch_plan.average_variance),
+                "path": path}
+        notes = dict(avg.skipped)
+        if path == "oneshot":
+            # weder Sitzung noch Serie: jedes Bild kostet einen vollen Kamera-Start
+            notes["path"] = "keine Still-Sitzung, ein libcamera-still-Aufruf pro Bild"
+            if not self._warned_oneshot_avg:
+                self._warned_oneshot_avg = True
+                self._progress("Warnung: Mittelung ohne libcamera-still-Sitzung, "
+                               "jedes Bild ist eine volle Einzelaufnahme")
+        if notes:
+            info["notes"] = notes
+        if not avg.acc:
+            return info
+
+        post = self._post
+        post.submit("average", step, avg.add, {f: os.path.join(ch_dir, files[f]) for f in fmts})
+        tmp_dir = os.path.join(ch_dir, "_average")
+        os.makedirs(tmp_dir, exist_ok=True)
+        t = time.perf_counter()
+        extra_n = int(ch_plan.average_frames) - 1
+        if burst and not self._abort:
+            frames = self.stream.capture_burst(tmp_dir, extra_n, jpeg=ch_plan.jpeg, raw=ch_plan.raw)
+            self._note_capture()
+            for extra in frames or ():
+                post.submit("average", step, avg.add, extra, remove=True)
+        else:
+            for i in range(1, extra_n + 1):
+                if self._abort:
+                    break
+                extra = self._capture_step(tmp_dir, ch_plan, stem=f"frame_{i:03d}")
+                post.submit("average", step, avg.add,
+                            {f: os.path.join(tmp_dir, v) for f, v in extra.items() if isinstance(v, str)},
+                            remove=True)
+        self._note("average", captures=extra_n, capture_s=time.perf_counter() - t, path=path)
+        post.submit("average", step, self._finish_average, avg, ch_dir, tmp_dir, files, info)
+        return info
+
+    def _finish_average(self, avg, ch_dir, tmp_dir, files, info):
+        # PostWorker: nach dem letzten avg.add, vor _finalize_step
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        info["frames"] = avg.frames()
+        files.update(avg.write(ch_dir))
+
+    def _note(self, group, detail=None, **values):
+        # Feinzeiten des laufenden Schritts: meta.json "timing.detail", summiert in summary.json.
+        # Aus dem PostWorker nur mit detail=self._details[schritt]: _step_detail gehört dort
+        # schon dem nächsten Schritt des Sequenz-Threads.
+        d = (self._step_detail if detail is None else detail).setdefault(group, {})
+        for k, v in values.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                d[k] = round(d.get(k, 0) + v, 4)
+            else:
+                d[k] = v
+
+    def _note_capture(self):
+        timing = dict(getattr(self.stream, "last_capture_timing", None) or {})
+        self._note("capture", calls=1, **timing)
+
+    def _finalize_step(self, step, ch_dir, meta, sampler, cap_t0, cap_t1, dark=None):
+        # läuft im PostWorker; der Sampler hält die letzten Sekunden vor
+        detail = self._details.setdefault(step, {})
+        if sampler is not None:
+            meta["spectrum"] = sampler.average(cap_t0, cap_t1)
+        if dark is not None:
+            t = time.perf_counter()
+            files, notes = subtract_dark(ch_dir, meta["files"], self._journal.base_dir, dark["files"])
+            mean_files, mean_notes = subtract_dark_mean(ch_dir, meta["files"], self._journal.base_dir,
+                                                        dark["files"])
+            meta["files"].update(files)
+            meta["files"].update(mean_files)
+            notes.update(mean_notes)
+            meta["dark"] = {"label": dark["label"], "files": dark["files"], **({"notes": notes} if notes else {})}
+            self._note("dark", detail=detail, subtract_s=time.perf_counter() - t)
+        meta["timing"] = {
+            "phases": self._timeline.step_events(step),
+            "detail": detail,
+        }
+        with open(os.path.join(ch_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        # erst jetzt gilt der Schritt beim Fortsetzen als erledigt
+        self._journal.done(step, ch_dir, meta["files"], meta["final_pwm"])
+
+    def _dark_frame(self, plan: SequencePlan, ir_state, state_dir):
+        """
+        Dunkelbild für IR-Zustand und aktuelle Belichtung, einmal pro Kombination
+        aufgenommen (Formate aller Kanäle, gemittelt über das größte average_frames),
+        danach aus dem Cache.
+        Rückgabe {"label", "files"} (Pfade relativ zum Sequenzordner).
+        Nur mit fester Belichtung aufrufen (run() prüft das vorab).
+        """
+        shutter, gain = self.stream.shutter, self.stream.gain
+        label = dark_label(ir_state, shutter, gain)
+        if label not in self._darks:
+            # Zeiten unter dem eigenen Label, nicht beim auslösenden Kanal
+            step_detail, self._step_detail = self._step_detail, self._details.setdefault(label, {})
+            try:
+                with self._timeline.stage("dark", label):
+                    self._set_all_leds(0.0)
+                    # LED aus: wie vor der Aufnahme warten, bis das Licht weg ist
+                    t = time.monotonic()
+                    res = self._wait_settled(plan, "Gray", plan.settle_timeout_ms / 1000.0)
+                    if res is None:
+                        time.sleep(plan.settle_min_ms / 1000.0)
+                    self._note("dark", captures=1, settle_s=time.monotonic() - t)
+
+                    dark_dir = os.path.join(state_dir, label.split("/", 1)[1])
+                    os.makedirs(dark_dir, exist_ok=True)
+                    channels = [c for c in plan.channels or [] if c.enabled]
+                    fmt = ChannelPlan("dark", jpeg=any(c.jpeg for c in channels),
+                                      raw=any(c.raw for c in channels),
+                                      average_frames=max((c.average_frames or 1) for c in channels))
+                    cap_t0 = time.time()
+                    files = self._capture_step(dark_dir, fmt)
+                    average = None
+                    if fmt.average_frames > 1:
+                        average = self._capture_average(label, dark_dir, fmt, files)
+            finally:
+                self._step_detail = step_detail
+            meta = {
+                "timestamp": datetime.now().isoformat(),
+                "dark": True,
+                "ir_state": ir_state,
+                "shutter_us": shutter,
+                "gain": gain,
+                "files": files,
+                "average": average,
+            }
+            # Mittelwert-Dateien trägt _finalize_dark nach (PostWorker, vor den Kanälen)
+            self._darks[label] = self._dark_paths(dark_dir, files)
+            self._post.submit("finalize", label, self._finalize_dark,
+                              label, dark_dir, meta, self._sampler, cap_t0, time.time())
+        return {"label": label, "files": self._darks[label]}
+
+    def _finalize_dark(self, label, dark_dir, meta, sampler, cap_t0, cap_t1):
+        # Streulicht während des Dunkelbilds mitprotokollieren
+        if sampler is not None:
+            meta["spectrum"] = sampler.average(cap_t0, cap_t1)
+        meta["timing"] = {
+            "phases": self._timeline.step_events(label),
+            "detail": self._details.get(label, {}),
+        }
+        self._darks[label].update(self._dark_paths(dark_dir, meta["files"]))
+        with open(os.path.join(dark_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        self._journal.done(label, dark_dir, meta["files"], 0.0)
+
+    def _dark_paths(self, dark_dir, files):
+        return {k: os.path.relpath(os.path.join(dark_dir, v), self._journal.base_dir)
+                for k, v in files.items() if isinstance(v, str)}
+
+    # ---------------- helpers ----------------
+
+    def _sanitize(self, s: str) -> str:
+        return "".join(c for c in s if c.isalnum() or c in ("-", "_", ".", " ")).strip().replace(" ", "_")
+
+    def _set_all_leds(self, pwm: float):
+        if pwm == 0.0 and hasattr(self.led, "all_off"):
+            self.led.all_off()
+        elif hasattr(self.led, "set_many"):
+            # ein Blockwrite pro PCA9685 statt eines Writes pro Kanal
+            self.led.set_many({n: pwm for n in self.led.get_all_channels()})
+        else:
+            for n in self.led.get_all_channels():
+                self.led.set_channel_by_name(n, pwm)
+
+    def _set_only_led(self, name: str, pwm: float):
+        if hasattr(self.led, "set_only"):
+            self.led.set_only(name, pwm)
+        else:
+            self._set_all_leds(0.0)
+            self.led.set_channel_by_name(name, pwm)
+
+    def _set_ir_state(self, state: str):
+        if self.ir_filter is None:
+            return
+        try:
+            if state.upper() == "IN":
+                self.ir_filter.switch_in()
+            else:
+                self.ir_filter.switch_out()
+        except Exception:
+            pass
+
+    def _auto_led_to_target(self, plan: SequencePlan, channel_name: str, hist_channel: str) -> float:
+        """
+        Headless Auto-LED: regelt nur diesen Kanal, bis innerhalb Toleranz.
+        """
+        self._need_frames()
+        # Start bei 0
+        try:
+            self.led.set_channel_by_name(channel_name, 0.0)
+        except Exception:
+            pass
+        self._led_settled = False
+
+        step = max(plan.start_step, plan.min_step)
+        prev_dir = 0
+        last_err = None
+        stagn = 0
+        sat_high = 0       # Zyklen an 100 % und trotzdem zu dunkel
+        sat_low = 0        # Zyklen unter min_useful_pwm und nicht zu dunkel
+        exposure_changes = 0
+        loop_s = plan.loop_ms / 1000.0
+        t_auto = time.perf_counter()
+        cycles = no_frame = 0
+        waits = {"wait_s": 0.0, "settle_frames": 0, "settle_timeouts": 0}
+
+        pwm = 0.0
+        f, settled = self._settle_frame(plan, hist_channel, loop_s, waits)
+
+        for cyc in range(plan.max_cycles):
+            cycles += 1
+            if f is None:
+                no_frame += 1
+                f, settled = self._settle_frame(plan, hist_channel, loop_s, waits)
+                continue
+
+            roi = self._roi.get(f)
+            self._last_roi = list(roi) if roi else None
+            low, high = histogram_fractions(f, hist_channel, plan.low_limit, plan.high_limit, roi=roi)
+
+            err_dark = max(0.0, low - plan.low_fraction_target)
+            err_bright = max(0.0, high - plan.high_fraction_target)
+            err = err_dark - err_bright
+
+            if err > plan.eps:
+                direction = +1
+            elif err < -plan.eps:
+                direction = -1
+            else:
+                direction = 0
+
+            # adapt step
+            improved = True
+            if last_err is not None:
+                improved = (abs(err) < abs(last_err)) or (direction == 0)
+                if direction != 0 and prev_dir != 0 and direction != prev_dir:
+                    step = max(step / 2.0, plan.min_step)
+                elif not improved:
+                    stagn += 1
+                    if stagn >= 2:
+                        step = max(step / 2.0, plan.min_step)
+                        stagn = 0
+
+            # Sättigung früh erkennen statt max_cycles abzuwarten
+            sat_high = sat_high + 1 if (direction == +1 and pwm >= 100.0) else 0
+            sat_low = sat_low + 1 if (direction <= 0 and pwm < plan.min_useful_pwm) else 0
+
+            want = 2.0 if sat_high >= 2 else (0.5 if sat_low >= 2 else None)
+            if want is not None:
+                factor = None
+                if plan.adjust_exposure and exposure_changes < 8:
+                    factor = self._scale_exposure(plan, want)
+                if factor is None:
+                    sat_high = sat_low = 0
+                    if want > 1.0 or pwm <= 0.0:
+                        break   # Anschlag erreicht, weitere Zyklen bringen nichts
+                else:
+                    exposure_changes += 1
+                    if want < 1.0:
+                        # Helligkeit halten, PWM in den fein aufgelösten Bereich schieben
+                        pwm = min(100.0, pwm / factor)
+                    step = max(plan.start_step / 2.0, plan.min_step)
+                    prev_dir, last_err, stagn, sat_high, sat_low = 0, None, 0, 0, 0
+                    try:
+                        self.led.set_channel_by_name(channel_name, pwm)
+                    except Exception:
+                        pass
+                    self._status(f"Auto-LED {channel_name}: PWM {pwm:.1f}% "
+                                 f"→ Shutter {self.stream.shutter} µs, Gain {self.stream.gain}")
+                    f, settled = self._settle_frame(plan, hist_channel, loop_s, waits)
+                    continue
+
+            # update pwm
+            if direction == +1:
+                pwm = min(100.0, pwm + step)
+            elif direction == -1:
+                pwm = max(0.0, pwm - step)
+
+            try:
+                self.led.set_channel_by_name(channel_name, pwm)
+            except Exception:
+                pass
+
+            self._status(f"Auto-LED {channel_name}: PWM {pwm:.1f}% step {step:.2f}% "
+                         f"(low {low:.1%}, high {high:.1%})")
+
+            # in Toleranz: PWM bleibt, Schritt schrumpft dort nicht mehr -> fertig,
+            # sobald das Bild eingeschwungen war (sonst noch ein Bild zur Bestätigung)
+            in_tol = direction == 0 and (settled or prev_dir == 0 or step <= plan.min_step)
+            prev_dir = direction
+            last_err = err
+
+            if in_tol:
+                # LED unverändert seit dem letzten (stabilen) Bild
+                self._led_settled = settled
+                break
+
+            f, settled = self._settle_frame(plan, hist_channel, loop_s, waits)
+
+        self._note("auto_led", cycles=cycles, no_frame=no_frame, **waits,
+                   exposure_changes=exposure_changes,
+                   total_s=time.perf_counter() - t_auto)
+        return float(pwm)
+
+    def _sensor_led_to_target(self, plan: SequencePlan, ch_plan: ChannelPlan, servo):
+        """
+        AS7341-Modus: LED auf den Sensor-Zielwert regeln (wenige Messungen à ~8 ms
+        statt Kamera-Zyklen). Ohne Zielwert einmal per Kamera regeln und den
+        dann gemessenen Sensorwert als Ziel übernehmen.
+        Rückgabe (pwm, info für meta.json).
+        """
+        band = ch_plan.sensor_band or band_for_led(ch_plan.name)
+        self._set_only_led(ch_plan.name, 0.0)
+
+        if not ch_plan.sensor_target or ch_plan.sensor_target <= 0:
+            pwm = self._auto_led_to_target(plan, ch_plan.name, ch_plan.hist_channel)
+            target = servo.measure(band)
+            ch_plan.sensor_target = target
+            if self.on_target is not None:
+                self.on_target(ch_plan.name, target)
+            return pwm, {"pwm": pwm, "band": band, "target": target, "learned": True}
+
+        info = servo.servo(ch_plan.name, ch_plan.sensor_target,
+                           start_pwm=ch_plan.pwm or 10.0, band=band)
+        self._note("servo", total_s=info["elapsed_ms"] / 1000.0, iterations=info["iterations"])
+        self._status(f"AS7341 {ch_plan.name}: PWM {info['pwm']:.1f}% in {info['elapsed_ms']:.0f} ms "
+                     f"({info['iterations']} Schritte, {info['band']})")
+        return float(info["pwm"]), info
+
+    def _verify_frame(self, plan: SequencePlan, hist_channel: str):
+        """Ein Kamerabild nach der Sensor-Regelung: Histogramm-Anteile gegen die Auto-LED-Ziele."""
+        self._need_frames()
+        f = None
+        if hasattr(self.stream, "wait_frame"):
+            # ein Bild verwerfen (MJPEG-Latenz), das nächste zeigt die neue PWM
+            seq, f = self.stream.wait_frame(self.stream.frame_seq, timeout=1.0)
+            seq, f = self.stream.wait_frame(seq, timeout=1.0)
+        else:
+            frame = self.stream.get_frame()
+            f = None if frame is None else np.array(frame)
+        if f is None:
+            return None
+
+        roi = self._roi.get(f)
+        self._last_roi = list(roi) if roi else None
+        low, high = histogram_fractions(f, hist_channel, plan.low_limit, plan.high_limit, roi=roi)
+        ok = (low <= plan.low_fraction_target + plan.verify_tolerance
+              and high <= plan.high_fraction_target + plan.verify_tolerance)
+        return {"low_fraction": round(low, 4), "high_fraction": round(high, 4), "ok": bool(ok)}
+
+    # ---------------- Belichtung (Shutter/Gain) ----------------
+
+    def _need_frames(self):
+        # Sequenz-Modus: Vorschau erst starten, wenn Kamerabilder gemessen werden
+        if hasattr(self.stream, "ensure_preview") and not self.stream.running:
+            t = time.perf_counter()
+            self.stream.ensure_preview()
+            self._note("camera", preview_starts=1, preview_start_s=time.perf_counter() - t)
+
+    def _wait_for_frame(self, timeout: float = 3.0):
+        t_end = time.time() + timeout
+        while time.time() < t_end:
+            if self.stream.get_frame() is not None:
+                return True
+            time.sleep(0.02)
+        return False
+
+    # ---------------- Einschwingen ----------------
+
+    def _wait_settled(self, plan: SequencePlan, hist_channel: str, timeout: float):
+        """
+        Bis die Vorschau nach einer Änderung stabil ist (SettleDetector), höchstens
+        timeout s. None, wenn keine Vorschau läuft.
+        """
+        if (not getattr(self.stream, "running", False) or getattr(self.stream, "preview_paused", False)
+                or not hasattr(self.stream, "wait_frame")):
+            return None
+        seq = self.stream.frame_seq
+
+        def next_frame(rest):
+            nonlocal seq
+            seq, f = self.stream.wait_frame(seq, timeout=rest)
+            return f
+
+        det = SettleDetector(hist_channel, mean_tol=plan.settle_mean_tol,
+                             hist_tol=plan.settle_hist_tol, k=plan.settle_frames)
+        return wait_settled(next_frame, det, timeout, skip=plan.settle_skip)
+
+    def _settle_frame(self, plan: SequencePlan, hist_channel: str, max_s: float, waits: dict):
+        """Auto-LED-Zyklus: stabiles Bild nach der letzten PWM-Änderung. Rückgabe (ndarray|None, settled)."""
+        t = time.perf_counter()
+        res = self._wait_settled(plan, hist_channel, max_s)
+        if res is None:
+            # ohne Bildstrom (kein wait_frame) wie früher: feste Zykluszeit
+            time.sleep(max_s)
+            frame = self.stream.get_frame()
+            f, settled = (None if frame is None else np.array(frame)), False
+        else:
+            f, settled = res["frame"], res["settled"]
+            waits["settle_frames"] += res["frames"]
+            waits["settle_timeouts"] += 0 if settled else 1
+        waits["wait_s"] += time.perf_counter() - t
+        return f, settled
+
+    def _settle_step(self, plan: SequencePlan, ch_plan: ChannelPlan, servo_info, t_led, exposure_restored):
+        """
+        Wartezeit vor der Aufnahme, so kurz wie möglich:
+          auto_led  Regelung endete mit stabilem Bild, seitdem nichts verändert -> 0
+          servo     AS7341 hat auf das Ziel geregelt (misst das eingeschwungene Licht) -> 0
+          frames    Vorschau läuft -> bis die Bildfolge stabil ist (settle_timeout_ms)
+          fixed     keine Bilder -> settle_min_ms ab LED-Wechsel (IR-Wartezeit zählt mit)
+        Rückgabe für meta.json "settle".
+        """
+        t = time.monotonic()
+        info = {"method": "fixed"}
+        if self._led_settled and exposure_restored:
+            info["method"] = "auto_led"
+        elif servo_info is not None and not servo_info.get("replayed"):
+            info["method"] = "servo"
+        else:
+            res = self._wait_settled(plan, ch_plan.hist_channel, plan.settle_timeout_ms / 1000.0)
+            if res is not None:
+                info = {"method": "frames", "settled": res["settled"], "frames": res["frames"]}
+                if res["delta"] is not None:
+                    info["d_mean"] = round(res["delta"][0], 3)
+                    info["d_hist"] = round(res["delta"][1], 4)
+            else:
+                rest = plan.settle_min_ms / 1000.0 - (time.monotonic() - t_led)
+                if rest > 0:
+                    time.sleep(rest)
+        info["s"] = round(time.monotonic() - t, 4)
+        self._note("settle", total_s=info["s"], **{info["method"]: 1})
+        return info
+
+    def _apply_exposure(self, shutter, gain):
+        # gleiche Capture-Session: nur libcamera-vid neu parametrieren
+        t = time.perf_counter()
+        self.stream.reconfigure(shutter=shutter, gain=gain)
+        if getattr(self.stream, "running", True):
+            self._wait_for_frame()
+        self._note("camera", reconfigures=1, reconfigure_s=time.perf_counter() - t)
+
+    def _restore_exposure(self, exposure):
+        shutter, gain = exposure
+        if (self.stream.shutter, self.stream.gain) != (shutter, gain):
+            self._apply_exposure(shutter, gain)
+
+    def _scale_exposure(self, plan: SequencePlan, factor: float):
+        """
+        Belichtung um 'factor' ändern (Shutter zuerst, Gain nur wenn erlaubt;
+        beim Abdunkeln erst Gain zurück Richtung 1.0).
+        Rückgabe: tatsächlich erreichter Faktor oder None (Anschlag / AE aktiv).
+        """
+        extra = getattr(self.stream, "extra_opts", None) or {}
+        sh = self.stream.shutter
+        if not sh or extra.get("ae", False):
+            return None
+        gn = float(self.stream.gain) if self.stream.gain is not None else 1.0
+
+        # Grenzen nur in Wirkrichtung anwenden: liegt der Shutter schon jenseits
+        # (Startwert/manuell), bleibt er stehen statt in die Gegenrichtung zu springen
+        new_sh, new_gn = sh, gn
+        if factor > 1.0:
+            if sh < plan.max_shutter:
+                new_sh = min(int(plan.max_shutter), int(sh * factor))
+            rest = factor * sh / new_sh
+            if rest > 1.001 and plan.allow_gain and gn < plan.max_gain:
+                new_gn = min(float(plan.max_gain), gn * rest)
+        else:
+            rest = factor
+            if plan.allow_gain and gn > 1.0:
+                new_gn = max(1.0, gn * factor)
+                rest = factor * gn / new_gn
+            if sh > plan.min_shutter:
+                new_sh = max(int(plan.min_shutter), int(sh * rest))
+
+        applied = (new_sh / sh) * (new_gn / gn)
+        if abs(applied - 1.0) < 0.01:
+            return None
+
+        self._apply_exposure(new_sh, new_gn if new_gn != gn else self.stream.gain)
+        return applied
@@ -0,0 +1,113 @@
+# sequence_journal.py
+"""
+Append-only Journal eines Sequenzlaufs (journal.jsonl im Sequenzordner).
+
+Zeilen:
+  {"event": "plan", ...}     Kopf: kompletter SequencePlan
+  {"event": "led", ...}      Schritt geregelt: PWM, Shutter, Gain (ggf. gelerntes AS7341-Ziel)
+  {"event": "done", ...}     Schritt fertig: Dateien + SHA-256
+  {"event": "failed", ...}   Schritt fehlgeschlagen (Lauf ging weiter)
+
+Jede Zeile wird sofort geflusht und per fsync geschrieben; eine halbe letzte
+Zeile nach Stromausfall wird beim Lesen ignoriert. Beim Fortsetzen gelten
+Schritte mit "done" und passenden Prüfsummen als erledigt, für die übrigen
+werden PWM und Belichtung aus "led" übernommen statt neu zu regeln.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class SequenceJournal:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, JOURNAL_NAME)
+        self._lock = threading.Lock()
+
+    # ---------- Schreiben (Sequenz-Thread und PostWorker) ----------
+
+    def _append(self, event, **rec):
+        rec = {"event": event, "t": round(time.time(), 3), **rec}
+        line = json.dumps(rec) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def write_plan(self, plan_dict):
+        self._append("plan", plan=plan_dict)
+
+    def led(self, step, pwm, shutter, gain, **info):
+        self._append("led", step=step, pwm=pwm, shutter_us=shutter, gain=gain, **info)
+
+    def done(self, step, ch_dir, files, final_pwm):
+        """files: {"jpeg": "capture.jpg", ...} relativ zu ch_dir; Prüfsummen werden hier gerechnet."""
+        rel_dir = os.path.relpath(ch_dir, self.base_dir)
+        paths = {k: os.path.join(rel_dir, v) for k, v in files.items() if isinstance(v, str)}
+        sums = {k: file_sha256(os.path.join(self.base_dir, p)) for k, p in paths.items()}
+        self._append("done", step=step, final_pwm=final_pwm, files=paths, sha256=sums)
+
+    def failed(self, step, error):
+        self._append("failed", step=step, error=str(error))
+
+    # ---------- Lesen ----------
+
+    def read(self):
+        """Alle vollständigen Zeilen (kaputte letzte Zeile wird übersprungen)."""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def load(self):
+        """
+        Rückgabe (plan_dict, steps) mit steps[label] = {"led": rec, "done": rec, "failed": n};
+        spätere Einträge überschreiben frühere.
+        """
+        plan = None
+        steps = {}
+        for rec in self.read():
+            ev = rec.get("event")
+            if ev == "plan":
+                plan = rec["plan"]
+                continue
+            st = steps.setdefault(rec.get("step"), {"led": None, "done": None, "failed": 0})
+            if ev == "led":
+                st["led"] = rec
+            elif ev == "done":
+                st["done"] = rec
+            elif ev == "failed":
+                st["failed"] += 1
+        return plan, steps
+
+    def verify(self, done_rec):
+        """Dateien eines "done"-Eintrags vorhanden und unverändert?"""
+        for key, rel in (done_rec.get("files") or {}).items():
+            path = os.path.join(self.base_dir, rel)
+            if not os.path.exists(path):
+                return False
+            if file_sha256(path) != (done_rec.get("sha256") or {}).get(key):
+                return False
+        return True
@@ -0,0 +1,216 @@
+# sequence_pipeline.py
+"""
+Bausteine für den gestaffelten Sequenzablauf (SequenceEngine):
+
+  StageTimeline   Zeitachse pro Schritt und Stufe (led, ir_wait, settle,
+                  capture, finalize, ...), am Ende als timeline.json und
+                  summary.json (Summen und Perzentile pro Stufe)
+  AsyncIRFilter   IR-Filter im eigenen Thread umschalten; gewartet wird erst,
+                  wenn die Kamera das Ergebnis braucht
+  PostWorker      ein Hintergrund-Thread für meta.json, Dateiabschluss und
+                  Nachbearbeitung, läuft parallel zum nächsten Schritt
+  duration_stats  count/mean/p50/p95/max einer Liste von Dauern
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, q):
+    """q in 0..100, linear interpoliert; sorted_values aufsteigend sortiert."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def duration_stats(values):
+    """count, total, mean, p50, p95, max (Sekunden, gerundet)."""
+    vals = sorted(float(v) for v in values)
+    if not vals:
+        return {"count": 0}
+    return {
+        "count": len(vals),
+        "total_s": round(sum(vals), 4),
+        "mean_s": round(sum(vals) / len(vals), 4),
+        "p50_s": round(percentile(vals, 50), 4),
+        "p95_s": round(percentile(vals, 95), 4),
+        "max_s": round(vals[-1], 4),
+    }
+
+
+class StageTimeline:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.started = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, end, step=None, **info):
+        ev = {
+            "step": step,
+            "stage": stage,
+            "start_s": round(start - self.t0, 4),
+            "end_s": round(end - self.t0, 4),
+            "dur_s": round(end - start, 4),
+            "thread": threading.current_thread().name,
+        }
+        ev.update(info)
+        with self._lock:
+            self.events.append(ev)
+        return ev
+
+    @contextmanager
+    def stage(self, stage, step=None, **info):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, start, time.perf_counter(), step, **info)
+
+    def wall_s(self):
+        return time.perf_counter() - self.t0
+
+    def summary(self):
+        """Pro Stufe: count, total_s, mean_s, p50_s, p95_s, max_s."""
+        with self._lock:
+            events = list(self.events)
+        by_stage = {}
+        for ev in events:
+            by_stage.setdefault(ev["stage"], []).append(ev["dur_s"])
+        return {stage: duration_stats(durs) for stage, durs in by_stage.items()}
+
+    def step_events(self, step):
+        """Stufen eines Schritts (Start/Ende relativ zum Laufbeginn, monotone Uhr)."""
+        with self._lock:
+            events = [e for e in self.events if e["step"] == step]
+        return [{k: e[k] for k in ("stage", "start_s", "end_s", "dur_s")} for e in events]
+
+    def save_summary(self, path, details=None, **extra):
+        """
+        summary.json: Stufen-Statistik, Schrittdauern (Summe der Stufen pro Schritt),
+        langsamste Schritte mit ihrer größten Stufe; details = {schritt: {..}} werden
+        numerisch aufsummiert (z.B. Auto-LED-Zyklen, Kamera-Startzeiten).
+        """
+        with self._lock:
+            events = list(self.events)
+        per_step = {}
+        for ev in events:
+            if ev["step"] is None or ev["stage"] == "ir_move":
+                continue
+            st = per_step.setdefault(ev["step"], {})
+            st[ev["stage"]] = st.get(ev["stage"], 0.0) + ev["dur_s"]
+        totals = {step: sum(st.values()) for step, st in per_step.items()}
+        slowest = sorted(totals, key=totals.get, reverse=True)[:5]
+
+        detail_totals = {}
+        for d in (details or {}).values():
+            for group, vals in d.items():
+                tgt = detail_totals.setdefault(group, {})
+                for k, v in vals.items():
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        tgt[k] = round(tgt.get(k, 0) + v, 4)
+
+        data = {
+            "started": self.started,
+            "wall_s": round(self.wall_s(), 3),
+            "phases": self.summary(),
+            "step_total": duration_stats(totals.values()),
+            "slowest_steps": [
+                {"step": s, "total_s": round(totals[s], 3),
+                 "dominant": max(per_step[s], key=per_step[s].get)}
+                for s in slowest
+            ],
+            "details": detail_totals,
+        }
+        data.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return data
+
+    def save(self, path, **extra):
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e["start_s"])
+        data = {
+            "started": self.started,
+            "wall_s": round(self.wall_s(), 3),
+            "stages": self.summary(),
+            "events": events,
+        }
+        data.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return data
+
+
+class AsyncIRFilter:
+    """
+    set_state_fn(state) (blockiert ~0.5 s Pulsdauer) läuft im eigenen Thread.
+    request() kehrt sofort zurück; wait() erst vor Kamera-Messung/Aufnahme.
+    """
+
+    def __init__(self, set_state_fn, timeline=None):
+        self.set_state_fn = set_state_fn
+        self.timeline = timeline
+        self.state = None
+        self._future = None
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ir-filter")
+
+    def _move(self, state):
+        if self.timeline is not None:
+            with self.timeline.stage("ir_move", step=f"IR_{state}"):
+                self.set_state_fn(state)
+        else:
+            self.set_state_fn(state)
+
+    def request(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        self._future = self._ex.submit(self._move, state)
+
+    @property
+    def busy(self):
+        return self._future is not None and not self._future.done()
+
+    def wait(self, timeout=10.0):
+        fut = self._future
+        if fut is None:
+            return
+        try:
+            fut.result(timeout)
+        except Exception as e:
+            print("[IRFilter] Umschalten fehlgeschlagen:", e)
+
+    def shutdown(self):
+        self.wait()
+        self._ex.shutdown(wait=True)
+
+
+class PostWorker:
+    """Ein Thread, Aufträge in Reihenfolge; Fehler werden gesammelt statt geworfen."""
+
+    def __init__(self, timeline=None, name="seq-post"):
+        self.timeline = timeline
+        self.errors = []
+        self._ex = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    def submit(self, stage, step, fn, *args, **kwargs):
+        def run():
+            try:
+                if self.timeline is not None:
+                    with self.timeline.stage(stage, step=step):
+                        return fn(*args, **kwargs)
+                return fn(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(f"{step}: {e}")
+                print(f"[Sequenz] {stage} für {step} fehlgeschlagen:", e)
+        return self._ex.submit(run)
+
+    def drain(self):
+        """Warten, bis alle Aufträge erledigt sind."""
+        self._ex.shutdown(wait=True)
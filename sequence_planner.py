@@ -0,0 +1,160 @@
+# sequence_planner.py
+"""
+Reihenfolge der Sequenzschritte (IR-Zustand x Kanal) mit minimalen Umschaltkosten.
+
+Jeder Übergang kostet geschätzte Sekunden (TRANSITION_COSTS):
+  ir_pulse       IR-Filter umlegen
+  preview        libcamera-vid starten (Kamera-Regelung / Kontrollbild)
+  still_session  libcamera-still-Sitzung neu öffnen (anderes Format, nach Vorschau)
+  reconfigure    Belichtung nach Auto-LED zurücksetzen
+  led_switch     anderer LED-Kanal (gleicher Kanal bleibt warm)
+
+Pro IR-Zustand wird exakt optimiert (Held-Karp bis EXACT_MAX Schritte, sonst
+Nearest Neighbour), die Zustände selbst in der günstigsten Reihenfolge.
+Ordner bleiben IR_<state>/<kanal>, nur die Abarbeitung ändert sich.
+"""
+from dataclasses import dataclass, field
+from itertools import permutations
+
+TRANSITION_COSTS = {
+    "ir_pulse": 0.6,
+    "preview": 1.0,
+    "still_session": 1.5,
+    "reconfigure": 0.5,
+    "led_switch": 0.15,
+}
+
+EXACT_MAX = 10          # Schritte pro IR-Zustand, bis zu denen exakt gesucht wird
+MAX_STATE_PERMS = 4     # bis zu so vielen IR-Zuständen alle Reihenfolgen probieren
+
+
+@dataclass(frozen=True)
+class Step:
+    ir_state: str
+    name: str
+    formats: tuple = ()             # ("jpeg", "raw")
+    metered: bool = False           # braucht Kamerabilder (Vorschau)
+    moves_exposure: bool = False    # kann die Belichtung verstellen
+    index: int = -1                 # Position in Listenreihenfolge
+    channel: object = field(default=None, compare=False, hash=False)   # ChannelPlan
+
+    @property
+    def label(self):
+        return f"IR_{self.ir_state}/{self.name}"
+
+
+def build_steps(plan, sensor_available=True):
+    """Schritte in Listenreihenfolge (ir_states x aktivierte Kanäle)."""
+    steps = []
+    for ir_state in plan.ir_states or ["OUT"]:
+        for cp in plan.channels or []:
+            if not cp.enabled:
+                continue
+            sensor = cp.mode == "sensor" and sensor_available
+            learn = sensor and not (cp.sensor_target and cp.sensor_target > 0)
+            camera_auto = (not sensor and cp.mode != "fixed") or learn
+            metered = camera_auto or (sensor and bool(plan.sensor_verify))
+            formats = tuple(f for f, on in (("jpeg", cp.jpeg), ("raw", cp.raw)) if on)
+            steps.append(Step(ir_state, cp.name, formats, metered,
+                              camera_auto and bool(plan.adjust_exposure), len(steps), cp))
+    return steps
+
+
+def transition_cost(a, b, costs=TRANSITION_COSTS):
+    """Geschätzte Sekunden von Schritt a nach b (a=None: Sequenzstart)."""
+    c = 0.0
+    if a is None or a.ir_state != b.ir_state:
+        c += costs["ir_pulse"]
+    if b.metered:
+        # Vorschau starten schließt die Still-Sitzung, die Aufnahme öffnet sie neu
+        c += costs["preview"] + costs["still_session"]
+    elif a is None or a.metered or a.formats != b.formats:
+        c += costs["still_session"]
+    if a is not None and a.moves_exposure:
+        c += costs["reconfigure"]
+    if a is None or a.name != b.name:
+        c += costs["led_switch"]
+    return c
+
+
+def path_cost(steps, costs=TRANSITION_COSTS, start=None):
+    total, prev = 0.0, start
+    for s in steps:
+        total += transition_cost(prev, s, costs)
+        prev = s
+    return total
+
+
+def _extend(layer, group, costs):
+    """
+    layer: {letzter Schritt: (kosten, pfad)} -> dasselbe nach Abarbeitung von group,
+    pro möglichem letzten Schritt der günstigste Pfad.
+    """
+    n = len(group)
+    if n > EXACT_MAX:
+        # Nearest Neighbour ab dem günstigsten Eintrag
+        prev, (c, path) = min(layer.items(), key=lambda kv: kv[1][0])
+        rest = list(group)
+        path = list(path)
+        while rest:
+            nxt = min(rest, key=lambda s: transition_cost(prev, s, costs))
+            c += transition_cost(prev, nxt, costs)
+            path.append(nxt)
+            rest.remove(nxt)
+            prev = nxt
+        return {prev: (c, path)}
+
+    dp = {}
+    for j, s in enumerate(group):
+        best = None
+        for prev, (c, path) in layer.items():
+            cand = c + transition_cost(prev, s, costs)
+            if best is None or cand < best[0]:
+                best = (cand, path)
+        dp[(1 << j, j)] = (best[0], best[1] + [s])
+
+    for mask in range(1, 1 << n):
+        for j in range(n):
+            cur = dp.get((mask, j))
+            if cur is None:
+                continue
+            for k in range(n):
+                if mask & (1 << k):
+                    continue
+                cand = cur[0] + transition_cost(group[j], group[k], costs)
+                key = (mask | (1 << k), k)
+                if key not in dp or cand < dp[key][0]:
+                    dp[key] = (cand, cur[1] + [group[k]])
+
+    full = (1 << n) - 1
+    return {group[j]: dp[(full, j)] for j in range(n)}
+
+
+def order_steps(steps, costs=None, start_ir=None):
+    """
+    Günstigste Reihenfolge. start_ir: bekannte Filterstellung vor dem Lauf (spart einen Puls).
+    Rückgabe (schritte, geschätzte_kosten_s).
+    """
+    costs = costs or TRANSITION_COSTS
+    if not steps:
+        return [], 0.0
+    start = Step(start_ir, None) if start_ir is not None else None
+
+    groups = {}
+    for s in steps:
+        groups.setdefault(s.ir_state, []).append(s)
+    states = list(groups)
+    if len(states) <= MAX_STATE_PERMS:
+        state_orders = permutations(states)
+    else:
+        state_orders = [states]
+
+    best = None
+    for order in state_orders:
+        layer = {start: (0.0, [])}
+        for st in order:
+            layer = _extend(layer, groups[st], costs)
+        c, path = min(layer.values(), key=lambda v: v[0])
+        if best is None or c < best[0] - 1e-9:
+            best = (c, path)
+    return best[1], best[0]
@@ -2,6 +2,7 @@ import os, time, json
 import cv2
 import numpy as np
 from picamera2 import Picamera2
+from exposure_metering import RoiTracker
 from 4928d159-3e78-4a31-bcad-aa2d75829fb9 import LEDController  # deine Datei importieren
 
 # --- LED Controller ---
@@ -28,18 +29,8 @@ picam2.set_controls(controls)
 picam2.start()
 time.sleep(1)
 
-# --- ROI automatisch finden ---
-def find_roi(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    _, mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    if contours:
-        c = max(contours, key=cv2.contourArea)
-        x, y, w, h = cv2.boundingRect(c)
-        return (x, y, w, h)
-    else:
-        return (0, 0, frame.shape[1], frame.shape[0])
+# --- ROI automatisch finden (einmal, gecacht bis sich die Szene ändert) ---
+roi_tracker = RoiTracker(mode="auto")
 
 # --- Iterative Kalibrierung ---
 def calibrate_channel(channel, target_mean=0.5, tolerance=0.05, max_trials=10):
@@ -49,7 +40,7 @@ def calibrate_channel(channel, target_mean=0.5, tolerance=0.05, max_trials=10):
         time.sleep(0.3)
 
         frame = picam2.capture_array("main")
-        x, y, w, h = find_roi(frame)
+        x, y, w, h = roi_tracker.get(frame)
         roi_frame = frame[y:y+h, x:x+w]
 
         mean_intensity = roi_frame.mean() / 255.0
@@ -9,7 +9,8 @@ matplotlib.use("TkAgg")
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-from camera_stream import CameraStream
+from hw_backend import CameraStream
+from exposure_metering import RoiTracker, crop_roi
 
 
 class SequenceRunnerGUI(tk.Tk):
@@ -67,6 +68,14 @@ class SequenceRunnerGUI(tk.Tk):
         self.image_label = ttk.Label(self.preview_frame)
         self.image_label.place(relx=0.5, rely=0.5, anchor="center")
 
+        # Mess-ROI: Rechteck mit der Maus in der Vorschau ziehen
+        self.roi_tracker = RoiTracker()
+        self._preview_geom = None   # (offset_x, offset_y, scale, frame_w, frame_h)
+        self._roi_drag = None       # (x0, y0, x1, y1) in Vorschau-Koordinaten
+        self.image_label.bind("<ButtonPress-1>", self._on_roi_press)
+        self.image_label.bind("<B1-Motion>", self._on_roi_drag)
+        self.image_label.bind("<ButtonRelease-1>", self._on_roi_release)
+
         # Histogramm (pyplot)
         self.hist_bg = BG  # oder "#2e2e2e" passend zu deinem UI
 
@@ -99,6 +108,8 @@ class SequenceRunnerGUI(tk.Tk):
                    command=self.capture_jpeg).pack(pady=2, fill="x")
         ttk.Button(self.left, text="Einzelaufnahme (RAW)",
                    command=self.capture_raw).pack(pady=2, fill="x")
+        ttk.Button(self.left, text="Einzelaufnahme (JPEG + RAW)",
+                   command=self.capture_jpeg_raw).pack(pady=2, fill="x")
 
         ttk.Separator(self.left).pack(pady=6, fill="x")
 
@@ -108,6 +119,11 @@ class SequenceRunnerGUI(tk.Tk):
         ttk.Button(self.left, text="Aufnahmesequenz",
                    command=self.open_sequence_dialog).pack(pady=2, fill="x")
 
+        ttk.Label(self.left, text="Mess-ROI:").pack(pady=(6, 0), fill="x")
+        self.roi_mode_var = tk.StringVar(value=self.roi_tracker.mode)
+        ttk.OptionMenu(self.left, self.roi_mode_var, self.roi_mode_var.get(),
+                       *RoiTracker.MODES, command=self._on_roi_mode).pack(pady=2, fill="x")
+
         self.hist_log = tk.BooleanVar(value=True)
         ttk.Checkbutton(
             self.left,
@@ -220,6 +236,22 @@ class SequenceRunnerGUI(tk.Tk):
             messagebox.showerror("RAW-Aufnahme",
                                  f"Fehler bei DNG:\n{e}")
 
+    def capture_jpeg_raw(self):
+        path = filedialog.asksaveasfilename(
+            title="Speichern als JPEG + DNG",
+            defaultextension=".jpg",
+            filetypes=[("JPEG + DNG", "*.jpg")],
+        )
+        if not path:
+            return
+        try:
+            # ein libcamera-still-Aufruf (-r): beide Dateien aus demselben Frame
+            jpg, dng = self.stream.capture_raw_dng(path, both=True)
+            messagebox.showinfo("Einzelaufnahme", f"Gespeichert:\n{jpg}\n{dng}")
+        except Exception as e:
+            messagebox.showerror("Einzelaufnahme",
+                                 f"Fehler bei JPEG + DNG:\n{e}")
+
     def start_auto_led(self):
         try:
             from auto_led_dialog import AutoLEDDialog
@@ -304,24 +336,11 @@ class SequenceRunnerGUI(tk.Tk):
 
         frame = self.stream.get_frame()
         if frame:
-            imgtk = ImageTk.PhotoImage(image=frame)
-            # Bild auf feste Vorschaugröße skalieren (ohne Layout-Änderung)
-            img = frame.copy()
-            img.thumbnail((self.preview_w, self.preview_h))  # Seitenverhältnis bleibt
-
-            # Optional: Letterbox in feste Fläche (damit Label nicht "shrinken" kann)
-            from PIL import Image
-            canvas = Image.new("RGB", (self.preview_w, self.preview_h), (30, 30, 30))  # dunkles Grau
-            x = (self.preview_w - img.width) // 2
-            y = (self.preview_h - img.height) // 2
-            canvas.paste(img, (x, y))
-
-            imgtk = ImageTk.PhotoImage(image=canvas)
-            self.image_label.imgtk = imgtk
-            self.image_label.configure(image=imgtk)
-
+            f = np.array(frame)
+            roi = self.roi_tracker.get(f)
+            self._show_preview(frame, roi)
             try:
-                self._render_histogram(np.array(frame))
+                self._render_histogram(crop_roi(f, roi))
             except Exception:
                 pass
 
@@ -331,23 +350,83 @@ class SequenceRunnerGUI(tk.Tk):
         frame = self.stream.get_frame()
         if not frame:
             return
-        imgtk = ImageTk.PhotoImage(image=frame)
+        f = np.array(frame)
+        roi = self.roi_tracker.get(f)
+        self._show_preview(frame, roi)
+        self._render_histogram(crop_roi(f, roi))
+
+    def _show_preview(self, frame, roi=None):
         # Bild auf feste Vorschaugröße skalieren (ohne Layout-Änderung)
         img = frame.copy()
         img.thumbnail((self.preview_w, self.preview_h))  # Seitenverhältnis bleibt
 
         # Optional: Letterbox in feste Fläche (damit Label nicht "shrinken" kann)
-        from PIL import Image
+        from PIL import Image, ImageDraw
         canvas = Image.new("RGB", (self.preview_w, self.preview_h), (30, 30, 30))  # dunkles Grau
         x = (self.preview_w - img.width) // 2
         y = (self.preview_h - img.height) // 2
         canvas.paste(img, (x, y))
 
+        scale = img.width / float(frame.width)
+        self._preview_geom = (x, y, scale, frame.width, frame.height)
+
+        draw = ImageDraw.Draw(canvas)
+        if self._roi_drag:
+            draw.rectangle(self._normalize_drag(self._roi_drag), outline=(255, 200, 0), width=2)
+        elif roi:
+            rx, ry, rw, rh = roi
+            draw.rectangle((x + rx * scale, y + ry * scale,
+                            x + (rx + rw) * scale, y + (ry + rh) * scale),
+                           outline=(0, 220, 0), width=2)
+
         imgtk = ImageTk.PhotoImage(image=canvas)
         self.image_label.imgtk = imgtk
         self.image_label.configure(image=imgtk)
 
-        self._render_histogram(np.array(frame))
+    # ---------- Mess-ROI ----------
+
+    def _on_roi_mode(self, mode):
+        if mode == "manual" and not self.roi_tracker.rect:
+            messagebox.showinfo("Mess-ROI", "Bitte ein Rechteck in der Vorschau ziehen.")
+            self.roi_mode_var.set(self.roi_tracker.mode)
+            return
+        self.roi_tracker.set_mode(mode)
+
+    @staticmethod
+    def _normalize_drag(d):
+        x0, y0, x1, y1 = d
+        return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+    def _on_roi_press(self, event):
+        self._roi_drag = (event.x, event.y, event.x, event.y)
+
+    def _on_roi_drag(self, event):
+        if self._roi_drag:
+            x0, y0, _, _ = self._roi_drag
+            self._roi_drag = (x0, y0, event.x, event.y)
+
+    def _on_roi_release(self, event):
+        if not self._roi_drag or not self._preview_geom:
+            self._roi_drag = None
+            return
+        x0, y0, x1, y1 = self._normalize_drag((self._roi_drag[0], self._roi_drag[1], event.x, event.y))
+        self._roi_drag = None
+        ox, oy, scale, fw, fh = self._preview_geom
+        # Vorschau -> Bildkoordinaten
+        fx0 = max(0.0, min(fw, (x0 - ox) / scale))
+        fy0 = max(0.0, min(fh, (y0 - oy) / scale))
+        fx1 = max(0.0, min(fw, (x1 - ox) / scale))
+        fy1 = max(0.0, min(fh, (y1 - oy) / scale))
+        if fx1 - fx0 < 4 or fy1 - fy0 < 4:
+            # Klick ohne Ziehen: Rechteck verwerfen
+            if self.roi_tracker.mode == "manual":
+                self.roi_tracker.set_mode("off")
+                self.roi_mode_var.set("off")
+            return
+        self.roi_tracker.set_manual_pixels((fx0, fy0, fx1 - fx0, fy1 - fy0), (fw, fh))
+        self.roi_mode_var.set("manual")
+        if not self.live_enabled.get():
+            self.update_gui_once()
 
     def _render_histogram(self, frame_np: np.ndarray):
         r = frame_np[:, :, 0].ravel()
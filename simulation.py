@@ -0,0 +1,708 @@
+# simulation.py
+"""
+Simulierte Hardware für Läufe ohne Raspberry Pi (MSCAM_SIM=1, siehe hw_backend.py).
+
+  FakeI2C         busio.I2C-Ersatz; leitet Transfers an Registermodelle weiter,
+                  modelliert die Busdauer und zählt Transaktionen
+  FakePCA9685     API wie adafruit_pca9685.PCA9685, Register-genau
+                  (Auto-Increment, ALL_LED-Register)
+  FakeAS7341      API wie adafruit_as7341.AS7341, Messwerte aus den LED-Duty-Cycles
+  fake_pigpio     pigpio-Ersatz (Pegel werden nur gespeichert)
+  SimCameraStream CameraStream ohne libcamera; Bildhelligkeit folgt den LEDs,
+                  Shutter und Gain
+
+Alle Geräte hängen an einer gemeinsamen SimWorld (WORLD), die die aktuelle
+Beleuchtung aus den PCA9685-Registern berechnet.
+"""
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+
+# ---------------- Welt / Lichtmodell ----------------
+
+# relative Effizienz (Kamera-Signal pro % PWM); UV/NIR bewusst schwach
+LED_EFFICIENCY = {
+    "378 nm": 0.05, "391 nm": 0.15, "863 nm": 0.08, "968 nm": 0.04,
+    "3000 K": 1.5, "5000 K": 1.6, "pink": 1.0,
+}
+WHITE_LEDS = {"3000 K": 590.0, "5000 K": 540.0, "pink": 600.0}
+
+AS7341_BANDS = [
+    ("415nm", 415.0), ("445nm", 445.0), ("480nm", 480.0), ("515nm", 515.0),
+    ("555nm", 555.0), ("590nm", 590.0), ("630nm", 630.0), ("680nm", 680.0),
+]
+AS7341_NIR = 910.0
+
+
+def led_wavelength(name):
+    if name in WHITE_LEDS:
+        return WHITE_LEDS[name]
+    m = re.search(r"(\d+)", name or "")
+    return float(m.group(1)) if m else 550.0
+
+
+def _gauss(x, mu, sigma):
+    return float(np.exp(-0.5 * ((x - mu) / sigma) ** 2))
+
+
+class SimWorld:
+    """Gemeinsamer Zustand aller simulierten Geräte."""
+
+    def __init__(self):
+        self.devices = {}          # I2C-Adresse -> Registermodell
+        self.labels = {}           # (Adresse, Kanal) -> LED-Name
+        self.ambient = 0.002       # Streulicht (relativ)
+        self.noise = 1.5           # Kamera-Rauschen in DN
+        # Busmodell (100 kHz): Grundlast pro Transfer + ~9 Bit pro Byte
+        self.i2c_base_s = 120e-6
+        self.i2c_byte_s = 90e-6
+        self.still_latency_s = 0.8  # libcamera-still Start + Capture
+        self.time_scale = float(os.environ.get("MSCAM_SIM_TIME_SCALE", "1.0"))
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        if self.time_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def device(self, address, factory):
+        with self._lock:
+            dev = self.devices.get(address)
+            if dev is None:
+                dev = self.devices[address] = factory()
+            return dev
+
+    def leds(self):
+        """[(name, duty 0..1)] aller beschrifteten LED-Kanäle."""
+        out = []
+        for (addr, ch), name in list(self.labels.items()):
+            dev = self.devices.get(addr)
+            if isinstance(dev, PCA9685Registers):
+                out.append((name, dev.duty(ch)))
+        return out
+
+    def rgb_irradiance(self):
+        """Beleuchtung als (R, G, B) relativ; 1.0 ~ Weiß-LED auf 100 %."""
+        r = g = b = self.ambient
+        for name, duty in self.leds():
+            if duty <= 0.0:
+                continue
+            wl = led_wavelength(name)
+            p = duty * LED_EFFICIENCY.get(name, 0.6)
+            if name in WHITE_LEDS:
+                r += 0.9 * p
+                g += 1.0 * p
+                b += 0.8 * p
+                continue
+            # grobe Bayer-Empfindlichkeit inkl. NIR-Durchlass aller Kanäle
+            r += p * (_gauss(wl, 610, 45) + 0.35 * _gauss(wl, 880, 80))
+            g += p * (_gauss(wl, 535, 40) + 0.30 * _gauss(wl, 880, 80))
+            b += p * (_gauss(wl, 460, 35) + 0.30 * _gauss(wl, 880, 80) + 0.2 * _gauss(wl, 390, 20))
+        return np.array([r, g, b], dtype=np.float32)
+
+    def band_irradiance(self, center, sigma=18.0):
+        total = self.ambient
+        for name, duty in self.leds():
+            if duty <= 0.0:
+                continue
+            p = duty * LED_EFFICIENCY.get(name, 0.6)
+            if name in WHITE_LEDS:
+                total += 0.4 * p * (1.0 if center < 720 else 0.05)
+            else:
+                total += p * _gauss(led_wavelength(name), center, sigma)
+        return total
+
+    # ---- Kamera ----
+
+    def _scene(self, w, h):
+        # heller Hintergrund, dunklere Probe in der Bildmitte
+        refl = np.full((h, w), 0.85, dtype=np.float32)
+        refl[h // 4: 3 * h // 4, w // 3: 2 * w // 3] = 0.35
+        return refl
+
+    def render(self, w, h, shutter_us, gain, rng=None):
+        rng = rng or np.random.default_rng()
+        shutter_us = shutter_us or 10000
+        gain = gain or 1.0
+        scale = 180.0 * (shutter_us / 10000.0) * gain
+        rgb = self.rgb_irradiance() * scale
+        img = self._scene(w, h)[:, :, None] * rgb[None, None, :]
+        img += rng.normal(0.0, self.noise, size=img.shape).astype(np.float32)
+        return np.clip(img, 0, 255).astype(np.uint8)
+
+
+WORLD = SimWorld()
+
+
+# ---------------- I2C ----------------
+
+class FakeI2C:
+    """busio.I2C-Ersatz: Transfers gehen an die Registermodelle in WORLD."""
+
+    def __init__(self, *args, world=None):
+        self.world = world or WORLD
+        self._locked = False
+        self.transactions = 0
+        self.bytes = 0
+
+    def try_lock(self):
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        self._locked = False
+
+    def scan(self):
+        return sorted(self.world.devices)
+
+    def deinit(self):
+        pass
+
+    def _dev(self, address):
+        dev = self.world.devices.get(address)
+        if dev is None:
+            raise OSError(121, f"Remote I/O error (keine Sim-Hardware an 0x{address:02X})")
+        return dev
+
+    def _transfer(self, n):
+        self.transactions += 1
+        self.bytes += n
+        self.world.sleep(self.world.i2c_base_s + n * self.world.i2c_byte_s)
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        dev = self._dev(address)
+        self._transfer(len(data))
+        if data:
+            dev.write(data)
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        dev = self._dev(address)
+        end = len(buffer) if end is None else end
+        self._transfer(end - start)
+        buffer[start:end] = dev.read(end - start)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *,
+                              out_start=0, out_end=None, in_start=0, in_end=None):
+        out = bytes(buffer_out[out_start:out_end])
+        dev = self._dev(address)
+        in_end = len(buffer_in) if in_end is None else in_end
+        self._transfer(len(out) + in_end - in_start)
+        if out:
+            dev.write(out)
+        buffer_in[in_start:in_end] = dev.read(in_end - in_start)
+
+
+class _FakeI2CDevice:
+    """Minimaler Ersatz für adafruit_bus_device.i2c_device.I2CDevice."""
+
+    def __init__(self, i2c, address):
+        self.i2c = i2c
+        self.device_address = address
+
+    def __enter__(self):
+        while not self.i2c.try_lock():
+            time.sleep(0)
+        return self
+
+    def __exit__(self, *exc):
+        self.i2c.unlock()
+        return False
+
+    def write(self, buf, *, start=0, end=None):
+        self.i2c.writeto(self.device_address, buf, start=start, end=end)
+
+    def readinto(self, buf, *, start=0, end=None):
+        self.i2c.readfrom_into(self.device_address, buf, start=start, end=end)
+
+    def write_then_readinto(self, out_buffer, in_buffer, *,
+                            out_start=0, out_end=None, in_start=0, in_end=None):
+        self.i2c.writeto_then_readfrom(self.device_address, out_buffer, in_buffer,
+                                       out_start=out_start, out_end=out_end,
+                                       in_start=in_start, in_end=in_end)
+
+
+class RegisterFile:
+    """256 Byte Register mit Auto-Increment; write(data) = [reg, werte...]."""
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.pointer = 0
+
+    def write(self, data):
+        self.pointer = data[0]
+        for b in data[1:]:
+            self.store(self.pointer, b)
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def store(self, reg, value):
+        self.regs[reg] = value
+
+    def read(self, n):
+        out = bytes(self.regs[(self.pointer + i) & 0xFF] for i in range(n))
+        self.pointer = (self.pointer + n) & 0xFF
+        return out
+
+
+# ---------------- PCA9685 ----------------
+
+class PCA9685Registers(RegisterFile):
+    MODE1 = 0x00
+    LED0_ON_L = 0x06
+    ALL_LED_ON_L = 0xFA
+    PRESCALE = 0xFE
+
+    def __init__(self):
+        super().__init__()
+        self.regs[self.MODE1] = 0x11
+        for ch in range(16):
+            self.regs[self.LED0_ON_L + 4 * ch + 3] = 0x10   # Power-on: voll aus
+        self.regs[self.PRESCALE] = 0x1E
+
+    def store(self, reg, value):
+        if self.ALL_LED_ON_L <= reg <= self.ALL_LED_ON_L + 3:
+            # ALL_LED_* wird in alle LEDn-Register übernommen
+            off = reg - self.ALL_LED_ON_L
+            for ch in range(16):
+                self.regs[self.LED0_ON_L + 4 * ch + off] = value
+            return
+        self.regs[reg] = value
+
+    def channel_regs(self, ch):
+        base = self.LED0_ON_L + 4 * ch
+        r = self.regs
+        return r[base] | (r[base + 1] << 8), r[base + 2] | (r[base + 3] << 8)
+
+    def duty(self, ch):
+        on, off = self.channel_regs(ch)
+        if off & 0x1000:
+            return 0.0
+        if on & 0x1000:
+            return 1.0
+        return ((off - on) & 0x0FFF) / 4096.0
+
+
+class _FakePWMChannel:
+    def __init__(self, pca, index):
+        self._pca = pca
+        self._index = index
+
+    @property
+    def duty_cycle(self):
+        on, off = self._pca._read_pwm(self._index)
+        if on == 0x1000:
+            return 0xFFFF
+        if off == 0x1000:
+            return 0x0000
+        return off << 4
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError(f"Out of range: value {value} not 0 <= value <= 65,535")
+        if value == 0xFFFF:
+            regs = (0x1000, 0)
+        elif value < 0x0010:
+            regs = (0, 0x1000)
+        else:
+            regs = (0, value >> 4)
+        self._pca._write_pwm(self._index, *regs)
+
+
+class FakePCA9685:
+    """API-kompatibel zu adafruit_pca9685.PCA9685 (frequency, channels, i2c_device)."""
+
+    def __init__(self, i2c_bus, *, address=0x40, reference_clock_speed=25000000):
+        self.address = address
+        self.reference_clock_speed = reference_clock_speed
+        self.world = getattr(i2c_bus, "world", WORLD)
+        self.world.device(address, PCA9685Registers)
+        self.i2c_device = _FakeI2CDevice(i2c_bus, address)
+        self.channels = [_FakePWMChannel(self, i) for i in range(16)]
+        self.reset()
+
+    def sim_label(self, channel, name):
+        """LED-Namen für das Lichtmodell (wird vom LEDController gesetzt)."""
+        self.world.labels[(self.address, channel)] = name
+
+    def _write_reg(self, reg, *values):
+        with self.i2c_device as dev:
+            dev.write(bytes([reg, *values]))
+
+    def _read_reg(self, reg, n=1):
+        buf = bytearray(n)
+        with self.i2c_device as dev:
+            dev.write_then_readinto(bytes([reg]), buf)
+        return buf
+
+    def _write_pwm(self, index, on, off):
+        self._write_reg(PCA9685Registers.LED0_ON_L + 4 * index,
+                        on & 0xFF, on >> 8, off & 0xFF, off >> 8)
+
+    def _read_pwm(self, index):
+        b = self._read_reg(PCA9685Registers.LED0_ON_L + 4 * index, 4)
+        return b[0] | (b[1] << 8), b[2] | (b[3] << 8)
+
+    def reset(self):
+        self._write_reg(PCA9685Registers.MODE1, 0x00)
+
+    @property
+    def frequency(self):
+        prescale = self._read_reg(PCA9685Registers.PRESCALE)[0]
+        return self.reference_clock_speed / 4096 / (prescale + 1)
+
+    @frequency.setter
+    def frequency(self, freq):
+        prescale = int(self.reference_clock_speed / 4096.0 / freq + 0.5) - 1
+        if prescale < 3:
+            raise ValueError("PCA9685 cannot output at the given frequency")
+        old_mode = self._read_reg(PCA9685Registers.MODE1)[0]
+        self._write_reg(PCA9685Registers.MODE1, (old_mode & 0x7F) | 0x10)
+        self._write_reg(PCA9685Registers.PRESCALE, prescale)
+        self._write_reg(PCA9685Registers.MODE1, old_mode)
+        self._write_reg(PCA9685Registers.MODE1, old_mode | 0xA0)   # Restart + Auto-Increment
+
+    def deinit(self):
+        self.reset()
+
+
+# ---------------- AS7341 ----------------
+
+class Gain:
+    """Wie adafruit_as7341.Gain (Wert n entspricht 0.5 * 2**n)."""
+    GAIN_0_5X = 0
+    GAIN_1X = 1
+    GAIN_2X = 2
+    GAIN_4X = 3
+    GAIN_8X = 4
+    GAIN_16X = 5
+    GAIN_32X = 6
+    GAIN_64X = 7
+    GAIN_128X = 8
+    GAIN_256X = 9
+    GAIN_512X = 10
+
+
+class FakeAS7341:
+    """
+    API-kompatibel zu adafruit_as7341.AS7341 (channel_*, all_channels, gain,
+    atime, astep, led, led_current). Bank-Verhalten wie im Treiber:
+    _all_channels = (ASTATUS, ADC0..ADC5) der zuletzt abgeschlossenen Messung,
+    neu gemessen wird nur beim Bankwechsel oder über _color_meas_enabled.
+    Jede Messung kostet Integrationszeit und einige I2C-Transfers.
+    """
+    ADDRESS = 0x39
+    ASTATUS_REG = 0x94
+    STATUS2_REG = 0xA3
+    ENABLE_REG = 0x80
+    CFG1_REG = 0xAA
+    ATIME_REG = 0x81
+    ASTEP_REG = 0xCA
+
+    def __init__(self, i2c_bus, address=ADDRESS):
+        self.world = getattr(i2c_bus, "world", WORLD)
+        self.world.device(address, RegisterFile)
+        self.i2c_device = _FakeI2CDevice(i2c_bus, address)
+        self._gain = Gain.GAIN_128X
+        self._atime = 100
+        self._astep = 999
+        self._led = False
+        self._bank = 0
+        self._low_channels_configured = False
+        self._high_channels_configured = False
+        self._data = (0,) * 7
+        self.led_current = 4
+        self.measurements = 0
+        self._rng = np.random.default_rng()
+
+    # --- Register-Verkehr (nur für Statistik/Timing) ---
+    def _write_reg(self, reg, value):
+        with self.i2c_device as dev:
+            dev.write(bytes([reg, value & 0xFF]))
+
+    def _read_regs(self, reg, n):
+        buf = bytearray(n)
+        with self.i2c_device as dev:
+            dev.write_then_readinto(bytes([reg]), buf)
+        return buf
+
+    # --- Konfiguration ---
+    @property
+    def gain(self):
+        return self._gain
+
+    @gain.setter
+    def gain(self, value):
+        self._gain = int(value)
+        self._write_reg(self.CFG1_REG, self._gain)
+
+    @property
+    def atime(self):
+        return self._atime
+
+    @atime.setter
+    def atime(self, value):
+        self._atime = int(value)
+        self._write_reg(self.ATIME_REG, self._atime)
+
+    @property
+    def astep(self):
+        return self._astep
+
+    @astep.setter
+    def astep(self, value):
+        self._astep = int(value)
+        self._write_reg(self.ASTEP_REG, self._astep & 0xFF)
+        self._write_reg(self.ASTEP_REG + 1, self._astep >> 8)
+
+    @property
+    def led(self):
+        return self._led
+
+    @led.setter
+    def led(self, value):
+        self._led = bool(value)
+
+    @property
+    def integration_time_ms(self):
+        return (self._atime + 1) * (self._astep + 1) * 2.78e-3
+
+    # --- Messung ---
+    def _full_scale(self):
+        return min(65535, (self._atime + 1) * (self._astep + 1))
+
+    def _counts(self, irradiance):
+        gain = 0.5 * 2 ** self._gain
+        value = irradiance * gain * self.integration_time_ms * 40.0
+        value += self._rng.normal(0.0, 2.0)
+        return int(max(0, min(self._full_scale(), value)))
+
+    def _integrate(self):
+        """Eine Integration der gewählten Bank (F1-F4/F5-F8, CLEAR, NIR) in die Datenregister."""
+        self.world.sleep(self.integration_time_ms / 1000.0)
+        self.measurements += 1
+        led_boost = 0.05 if self._led else 0.0
+        bands = AS7341_BANDS[4 * self._bank: 4 * self._bank + 4]
+        out = []
+        for c in [c for _, c in bands] + [None, AS7341_NIR]:
+            if c is None:
+                irr = sum(self.world.band_irradiance(b, 60.0) for b in (450.0, 550.0, 650.0)) / 3.0
+            else:
+                irr = self.world.band_irradiance(c)
+            out.append(self._counts(irr + led_boost))
+        astatus = (0x80 if max(out) >= self._full_scale() else 0) | (self._gain & 0x0F)
+        self._data = (astatus,) + tuple(out)
+
+    @property
+    def _color_meas_enabled(self):
+        return bool(self._read_regs(self.ENABLE_REG, 1)[0] & 0x02)
+
+    @_color_meas_enabled.setter
+    def _color_meas_enabled(self, value):
+        # SP_EN an startet eine neue Integration
+        self._write_reg(self.ENABLE_REG, 0x03 if value else 0x01)
+        if value:
+            self._integrate()
+
+    def _wait_for_data(self, timeout=1.0):
+        self._read_regs(self.STATUS2_REG, 1)
+
+    def _configure_bank(self, bank):
+        flags = ("_low_channels_configured", "_high_channels_configured")
+        if getattr(self, flags[bank]):
+            _ = self._all_channels          # Treiber: Bank schon gewählt -> keine neue Messung
+            return
+        setattr(self, flags[1 - bank], False)
+        self._color_meas_enabled = False
+        self._write_reg(self.ENABLE_REG, 0x11)   # SMUX-Konfiguration
+        self._bank = bank
+        self._color_meas_enabled = True
+        setattr(self, flags[bank], True)
+        self._wait_for_data()
+
+    def _configure_f1_f4(self):
+        self._configure_bank(0)
+
+    def _configure_f5_f8(self):
+        self._configure_bank(1)
+
+    @property
+    def _all_channels(self):
+        self._read_regs(self.ASTATUS_REG, 13)
+        return self._data
+
+    @property
+    def all_channels(self):
+        # echter Treiber: zwei SMUX-Durchläufe (F1-F4 + F5-F8), ohne ASTATUS/CLEAR/NIR
+        self._configure_f1_f4()
+        reads = self._all_channels[1:-2]
+        self._configure_f5_f8()
+        return reads + self._all_channels[1:-2]
+
+    @property
+    def channel_clear(self):
+        return self._all_channels[5]
+
+    @property
+    def channel_nir(self):
+        return self._all_channels[6]
+
+
+def _make_band_property(index):
+    def get(self):
+        self._configure_bank(index // 4)
+        return self._all_channels[1 + index % 4]
+    return property(get)
+
+
+for _i, (_name, _center) in enumerate(AS7341_BANDS):
+    setattr(FakeAS7341, f"channel_{_name}", _make_band_property(_i))
+
+
+# ---------------- pigpio ----------------
+
+class _FakePi:
+    def __init__(self, host="localhost", port=8888):
+        self.connected = True
+        self.levels = {}
+        self.modes = {}
+        self.writes = 0
+
+    def set_mode(self, gpio, mode):
+        self.modes[gpio] = mode
+
+    def set_pull_up_down(self, gpio, pud):
+        pass
+
+    def write(self, gpio, level):
+        self.levels[gpio] = 1 if level else 0
+        self.writes += 1
+
+    def read(self, gpio):
+        return self.levels.get(gpio, 0)
+
+    def stop(self):
+        self.connected = False
+
+
+class _FakePigpioModule:
+    INPUT = 0
+    OUTPUT = 1
+    PUD_OFF = 0
+    PUD_DOWN = 1
+    PUD_UP = 2
+    pi = _FakePi
+
+
+fake_pigpio = _FakePigpioModule()
+
+
+# ---------------- Kamera ----------------
+
+def _sim_camera_base():
+    from camera_stream import CameraStream
+    return CameraStream
+
+
+class SimCameraStream(_sim_camera_base()):
+    """
+    CameraStream ohne libcamera: Vorschau-Thread erzeugt Bilder aus WORLD,
+    Still-/DNG-Aufnahmen schreiben synthetische Dateien. Stop/Start der
+    Vorschau und die Kommandozeilen bleiben die des echten CameraStream.
+    """
+
+    def __init__(self, *args, world=None, **kwargs):
+        self.world = world or WORLD
+        self._rng = np.random.default_rng()
+        self._gen_thread = None
+        super().__init__(*args, **kwargs)
+
+    def _probe_supported_options(self, toolname):
+        # Serienaufnahme wie libcamera-still; keine --signal-Sitzung
+        return {"--frames", "--timelapse"} if toolname == "libcamera-still" else set()
+
+    def start(self):
+        with self.proc_lock:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._generate, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.proc_lock:
+            if not self.running:
+                return
+            self.running = False
+            if self.thread:
+                self.thread.join(timeout=1)
+                self.thread = None
+
+    def _generate(self):
+        period = 1.0 / max(1, int(self.framerate))
+        next_t = time.monotonic()
+        while self.running:
+            img = self.world.render(self.width, self.height, self.shutter, self.gain, self._rng)
+            if not self.preview_paused:
+                from PIL import Image
+                img.flags.writeable = False
+                with self._frame_cond:
+                    self.frame_np = img
+                    self.frame = Image.fromarray(img)
+                    self.frame_seq += 1
+                    self._frame_cond.notify_all()
+            next_t += period
+            time.sleep(max(0.0, next_t - time.monotonic()))
+
+    @staticmethod
+    def _opt(cmd, name, default=None):
+        if name in cmd:
+            i = cmd.index(name)
+            if i + 1 < len(cmd):
+                return cmd[i + 1]
+        return default
+
+    def _run_capture(self, cmd, timeout=10):
+        self.world.sleep(self.world.still_latency_s)
+
+        w = int(self._opt(cmd, "--width", self.width))
+        h = int(self._opt(cmd, "--height", self.height))
+        sh = self._opt(cmd, "--shutter")
+        gn = self._opt(cmd, "--gain")
+        out = self._opt(cmd, "-o")
+        enc = self._opt(cmd, "--encoding", "jpg")
+
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        if "--frames" in cmd:
+            # Serie: ein Start, danach je Bild nur die Belichtung
+            for n in range(int(self._opt(cmd, "--frames"))):
+                if n:
+                    self.world.sleep((int(sh) if sh else 0) / 1e6)
+                img = self.world.render(w, h, int(sh) if sh else None, float(gn) if gn else None, self._rng)
+                self._write_still(out % n, img, enc, "-r" in cmd)
+            return
+
+        img = self.world.render(w, h, int(sh) if sh else None, float(gn) if gn else None, self._rng)
+        if "--raw" in cmd:
+            self._write_dng(out, img)
+            return
+        self._write_still(out, img, enc, "-r" in cmd)
+
+    def _write_still(self, out, img, enc, with_dng):
+        from PIL import Image
+        Image.fromarray(img).save(out, format={"jpg": "JPEG", "png": "PNG",
+                                               "tiff": "TIFF", "bmp": "BMP"}.get(enc, "JPEG"))
+        if with_dng:
+            self._write_dng(os.path.splitext(out)[0] + ".dng", img)
+
+    @staticmethod
+    def _write_dng(path, img):
+        from PIL import Image
+        # kein echtes DNG: 16-bit Graustufen-TIFF mit .dng-Endung
+        raw = (img.astype(np.uint16).sum(axis=2) * 85).astype(np.uint16)
+        Image.fromarray(raw).save(path, format="TIFF")
@@ -0,0 +1,134 @@
+# spectral_log.py
+"""
+Append-only Binärlog für AS7341-Spektren.
+
+Aufbau: 64-Byte-Header + feste Records (RECORD_DTYPE, little endian).
+Die Datei wird in Blöcken vorab vergrößert; der Header-Zähler wird erst nach
+den Daten geschrieben, d.h. nach einem Absturz ist alles bis zum letzten
+Flush lesbar. Lesen per np.memmap ohne Kopie:
+
+    log = read_spectral_log("drift.as7341")
+    log["t"], log["gain"], log["counts"][:, 4]   # 555 nm
+"""
+import os
+import struct
+import time
+
+import numpy as np
+
+from spectral_sensor import CHANNEL_LABELS
+
+MAGIC = b"AS7341LG"
+VERSION = 1
+HEADER_FMT = "<8sIIQd"          # magic, version, record_size, count, created
+HEADER_SIZE = 64
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),                          # Unix-Zeit
+    ("gain", "<f4"),                       # Verstärkungsfaktor (0.5 ... 512)
+    ("atime", "<u2"),
+    ("astep", "<u2"),
+    ("counts", "<u2", (len(CHANNEL_LABELS),)),
+])
+
+
+class SpectralLogWriter:
+    """
+    Schreibt Records gepuffert; Flush alle flush_interval Sekunden oder
+    wenn batch_records voll sind. Nur aus einem Thread benutzen.
+    """
+
+    def __init__(self, path, chunk_records=65536, batch_records=256, flush_interval=2.0):
+        self.path = path
+        self.chunk_records = int(chunk_records)
+        self.flush_interval = float(flush_interval)
+        self.count = 0                 # auf Platte (im Header bestätigt)
+        self.created = time.time()
+
+        self._buf = np.zeros(int(batch_records), dtype=RECORD_DTYPE)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "w+b")
+        self._allocated = 0
+        self._write_header()
+        self._grow(self.chunk_records)
+
+    @property
+    def total(self):
+        return self.count + self._pending
+
+    def _write_header(self):
+        head = struct.pack(HEADER_FMT, MAGIC, VERSION, RECORD_DTYPE.itemsize, self.count, self.created)
+        self._f.seek(0)
+        self._f.write(head.ljust(HEADER_SIZE, b"\0"))
+
+    def _grow(self, n_records):
+        self._allocated += n_records
+        self._f.truncate(HEADER_SIZE + self._allocated * RECORD_DTYPE.itemsize)
+
+    def append(self, counts, gain, atime, astep, t=None):
+        rec = self._buf[self._pending]
+        rec["t"] = time.time() if t is None else t
+        rec["gain"] = gain
+        rec["atime"] = atime
+        rec["astep"] = astep
+        rec["counts"] = counts
+        self._pending += 1
+        if (self._pending >= len(self._buf)
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        n = self._pending
+        while self.count + n > self._allocated:
+            self._grow(self.chunk_records)
+        self._f.seek(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        self._f.write(self._buf[:n].tobytes())
+        self._f.flush()
+        self.count += n
+        self._pending = 0
+        self._write_header()
+        self._f.flush()
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.flush()
+        # Vorallokation abschneiden
+        self._f.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_log_header(path):
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+    magic, version, record_size, count, created = struct.unpack_from(HEADER_FMT, head)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: kein AS7341-Log")
+    if version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: Version {version} / Recordgröße {record_size} nicht unterstützt")
+    return {"version": version, "record_size": record_size, "count": count, "created": created}
+
+
+def read_spectral_log(path, mmap=True):
+    """Strukturiertes Array (RECORD_DTYPE) aller bestätigten Records."""
+    count = read_log_header(path)["count"]
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    if mmap:
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        return np.fromfile(f, dtype=RECORD_DTYPE, count=count)
@@ -0,0 +1,408 @@
+# spectral_sensor.py
+"""
+AS7341-Auslesen mit einem Messzyklus pro Spektrum.
+
+Die Einzel-Properties des Adafruit-Treibers (channel_415nm, ...) schalten je
+nach Kanal den SMUX um und warten jeweils eine Integration ab. read_spectrum()
+macht genau zwei Bank-Messungen (F1-F4 und F5-F8, CLEAR/NIR aus der zweiten
+Bank) und liefert alle 10 Werte.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from i2c_bus import device_batch
+
+CHANNEL_LABELS = (
+    "415 nm", "445 nm", "480 nm", "515 nm", "555 nm",
+    "590 nm", "630 nm", "680 nm", "NIR", "CLEAR",
+)
+
+# Adafruit-Defaults: ATIME=100, ASTEP=999 -> ~280 ms pro Bank
+DEFAULT_ATIME = 29
+DEFAULT_ASTEP = 599
+
+
+def integration_time_ms(atime, astep):
+    """Integrationszeit einer Bank laut Datenblatt: (ATIME+1)*(ASTEP+1)*2.78 µs."""
+    return (int(atime) + 1) * (int(astep) + 1) * 2.78e-3
+
+
+def full_scale(atime, astep):
+    """Maximaler ADC-Wert bei dieser Integration."""
+    return min(65535, (int(atime) + 1) * (int(astep) + 1))
+
+
+def gain_factor(gain_code):
+    """AS7341-Gain-Code (0..10, wie adafruit_as7341.Gain) -> Faktor 0.5 ... 512."""
+    return 0.5 * 2 ** int(gain_code)
+
+
+def configure_integration(sensor, atime=DEFAULT_ATIME, astep=DEFAULT_ASTEP):
+    atime = max(0, min(255, int(atime)))
+    astep = max(0, min(65534, int(astep)))
+    sensor.atime = atime
+    sensor.astep = astep
+    return integration_time_ms(atime, astep)
+
+
+def _bank_channels(sensor, bank):
+    """
+    Rohwerte einer Bank über den Adafruit-Treiber: (F1-F4 bzw. F5-F8, CLEAR, NIR).
+    _all_channels liest ab ASTATUS (Struct "<BHHHHHH") -> Index 0 verwerfen.
+    Ist die Bank schon gewählt, kehrt _configure_f*() sofort zurück und die
+    Register hielten noch die vorige Integration (vor PWM-/Gain-Wechsel):
+    dann die Messung selbst neu starten und abwarten.
+    """
+    selected = getattr(sensor, ("_low_channels_configured", "_high_channels_configured")[bank], False)
+    if bank == 0:
+        sensor._configure_f1_f4()
+    else:
+        sensor._configure_f5_f8()
+    if selected:
+        sensor._color_meas_enabled = False
+        sensor._color_meas_enabled = True
+        sensor._wait_for_data()
+    return tuple(sensor._all_channels)[1:]
+
+
+def apply_config(sensor, config):
+    """
+    (gain_code, atime, astep) schreiben. Der AS7341 ist ein gemeinsames Objekt
+    (Sensorfenster, SpectrumSampler, LED-Servo): jeder Nutzer stellt seine
+    Einstellung im selben device_batch() wie die Messung ein.
+    """
+    gain_code, atime, astep = config
+    sensor.gain = gain_code
+    sensor.atime = atime
+    sensor.astep = astep
+
+
+def read_bank(sensor, bank):
+    """
+    Eine SMUX-Bank messen: bank 0 -> F1-F4, bank 1 -> F5-F8; jeweils + CLEAR, NIR.
+    Halb so lang wie read_spectrum(), z.B. für Regelschleifen auf einem Kanal.
+    """
+    if hasattr(sensor, "_configure_f1_f4") and hasattr(sensor, "_all_channels"):
+        return _bank_channels(sensor, bank)
+    values = read_spectrum(sensor)
+    return tuple(values[4 * bank: 4 * bank + 4]) + (values[9], values[8])
+
+
+# Kanal -> (Bank, Index im Ergebnis von read_bank)
+BAND_SLOTS = {label: (i // 4, i % 4) for i, label in enumerate(CHANNEL_LABELS[:8])}
+BAND_SLOTS["CLEAR"] = (0, 4)
+BAND_SLOTS["NIR"] = (0, 5)
+BAND_CENTERS = {label: float(label.split()[0]) for label in CHANNEL_LABELS[:8]}
+
+
+def band_for_led(name):
+    """Passender AS7341-Kanal für einen LED-Namen ("450 nm" -> "445 nm", Weiß -> CLEAR)."""
+    digits = "".join(c if c.isdigit() else " " for c in name or "").split()
+    if not digits or not name.strip().endswith("nm"):
+        return "CLEAR"
+    wl = float(digits[0])
+    if wl >= 750.0:
+        return "NIR"
+    return min(BAND_CENTERS, key=lambda b: abs(BAND_CENTERS[b] - wl))
+
+
+def read_spectrum(sensor):
+    """
+    Alle 10 Kanäle (Reihenfolge CHANNEL_LABELS) aus einem Dual-Bank-Zyklus.
+    Nutzt die internen Bank-Funktionen des Adafruit-Treibers, sonst
+    all_channels + clear/nir.
+    """
+    if hasattr(sensor, "_configure_f1_f4") and hasattr(sensor, "_all_channels"):
+        low = _bank_channels(sensor, 0)    # F1-F4, CLEAR, NIR
+        high = _bank_channels(sensor, 1)   # F5-F8, CLEAR, NIR
+        return low[0:4] + high[0:4] + (high[5], high[4])
+
+    spectral = tuple(sensor.all_channels)
+    return spectral + (sensor.channel_nir, sensor.channel_clear)
+
+
+def normalize_counts(values, gain_code, atime, astep):
+    """Rohwerte -> Counts pro (Gain-Faktor * ms), vergleichbar über alle Einstellungen."""
+    scale = gain_factor(gain_code) * integration_time_ms(atime, astep)
+    return np.asarray(values, dtype=np.float64) / scale
+
+
+class AutoRanger:
+    """
+    Wählt Gain und Integration aus dem jeweils vorigen Spektrum.
+      - Aussteuerung = größter Kanal / Vollausschlag; nur außerhalb
+        [low, high] wird umgeschaltet (Hysterese), Ziel ist target
+      - Stellgröße ist eine Leiter in Zweierstufen: erst Gain; erst an
+        den Gain-Grenzen wird ASTEP verlängert/verkürzt (Vollausschlag
+        wächst mit ASTEP, die Aussteuerung ändert sich dann nur über
+        den 65535-Deckel bzw. die absoluten Counts)
+      - übersteuert/leer: Sprung um jump_stops Stufen
+    update() schreibt die neue Einstellung direkt in den Sensor; die nächste
+    Messung ist damit schon gültig.
+    """
+
+    def __init__(self, sensor, gain_code=None, atime=DEFAULT_ATIME, astep=DEFAULT_ASTEP,
+                 low=0.15, high=0.85, target=0.45, jump_stops=4,
+                 min_gain=0, max_gain=10, min_astep=59, max_astep=9999):
+        self.sensor = sensor
+        self.atime = int(atime)
+        self.base_astep = int(astep)
+        self.astep = int(astep)
+        if gain_code is None:
+            try:
+                gain_code = int(sensor.gain)
+            except Exception:
+                gain_code = 5
+        self.gain_code = int(gain_code)
+        self.low, self.high, self.target = float(low), float(high), float(target)
+        self.jump_stops = int(jump_stops)
+        self.min_gain, self.max_gain = int(min_gain), int(max_gain)
+        self.min_astep, self.max_astep = int(min_astep), int(max_astep)
+        self.changes = 0
+
+    @property
+    def config(self):
+        return self.gain_code, self.atime, self.astep
+
+    def normalize(self, values, config=None):
+        g, at, ast = config or self.config
+        return normalize_counts(values, g, at, ast)
+
+    def _position(self):
+        return self.gain_code + float(np.log2((self.astep + 1) / (self.base_astep + 1)))
+
+    def _from_position(self, pos):
+        if pos > self.max_gain:
+            code, extra = self.max_gain, pos - self.max_gain
+        elif pos < self.min_gain:
+            code, extra = self.min_gain, pos - self.min_gain
+            if full_scale(self.atime, self.base_astep) < 65535:
+                extra = 0.0   # kürzer integrieren senkt die Aussteuerung hier nicht
+        else:
+            code, extra = int(round(pos)), 0.0
+        astep = int(round((self.base_astep + 1) * 2.0 ** extra)) - 1
+        return code, max(self.min_astep, min(self.max_astep, astep))
+
+    def update(self, values):
+        """Neue Einstellung aus dem letzten Spektrum; True wenn geändert."""
+        fs = full_scale(self.atime, self.astep)
+        peak = float(max(values))
+        level = peak / fs
+        if self.low <= level <= self.high:
+            return False
+
+        if peak >= 0.98 * fs:
+            stops = -self.jump_stops
+        elif peak <= 0:
+            stops = self.jump_stops
+        else:
+            stops = int(round(np.log2(self.target / level)))
+        code, astep = self._from_position(self._position() + stops)
+        if (code, astep) == (self.gain_code, self.astep):
+            return False   # Anschlag
+
+        if code != self.gain_code:
+            self.sensor.gain = code
+        if astep != self.astep:
+            self.sensor.astep = astep
+        self.gain_code, self.astep = code, astep
+        self.changes += 1
+        return True
+
+
+class RateMeter:
+    """Gleitende Rate (Ereignisse pro Sekunde) über ein Zeitfenster."""
+
+    def __init__(self, window_s=2.0):
+        self.window_s = float(window_s)
+        self._t0 = time.monotonic()
+        self._count = 0
+        self.rate = 0.0
+        self.total = 0
+
+    def tick(self, n=1):
+        self._count += n
+        self.total += n
+        now = time.monotonic()
+        dt = now - self._t0
+        if dt >= self.window_s:
+            self.rate = self._count / dt
+            self._t0 = now
+            self._count = 0
+        return self.rate
+
+
+class SpectrumRingBuffer:
+    """
+    Feste Zeitreihe (Zeitstempel + 10 Kanäle) als numpy-Ringpuffer.
+    Ein Schreiber (Lese-Thread), beliebige Leser (Tk); Leser bekommen Kopien.
+    """
+
+    def __init__(self, capacity=8192, n_channels=len(CHANNEL_LABELS)):
+        self.capacity = int(capacity)
+        self.t = np.zeros(self.capacity, dtype=np.float64)
+        self.data = np.zeros((self.capacity, n_channels), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._next = 0
+        self.count = 0
+        self.seq = 0                    # zählt jede append()-Operation
+
+    def append(self, values, t=None):
+        with self._lock:
+            i = self._next
+            self.t[i] = time.time() if t is None else t
+            self.data[i] = values
+            self._next = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.seq += 1
+
+    def latest(self):
+        """(t, werte) des letzten Eintrags oder None."""
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self._next - 1) % self.capacity
+            return float(self.t[i]), self.data[i].copy()
+
+    def snapshot(self, window_s=None):
+        """Chronologische Kopie (t, data), optional nur die letzten window_s Sekunden."""
+        with self._lock:
+            n = self.count
+            start = (self._next - n) % self.capacity
+            idx = (start + np.arange(n)) % self.capacity
+            t = self.t[idx]
+            data = self.data[idx]
+        if window_s is not None and n:
+            keep = np.searchsorted(t, t[-1] - float(window_s))
+            t, data = t[keep:], data[keep:]
+        return t, data
+
+
+def decimate_minmax(t, data, n_bins):
+    """
+    Auf n_bins Zeitfenster reduzieren: pro Fenster Mittelzeit, Minimum und
+    Maximum je Kanal, so bleiben Spitzen auch bei langen Fenstern sichtbar.
+    Rückgabe (t_bins, mins, maxs); bei wenig Daten unverändert.
+    """
+    n = len(t)
+    if n <= n_bins or n_bins < 1:
+        return t, data, data
+    edges = np.linspace(0, n, n_bins + 1).astype(np.intp)
+    starts = edges[:-1]
+    mins = np.minimum.reduceat(data, starts, axis=0)
+    maxs = np.maximum.reduceat(data, starts, axis=0)
+    t_bins = (t[starts] + t[np.maximum(edges[1:] - 1, starts)]) * 0.5
+    return t_bins, mins, maxs
+
+
+class SpectrumSampler:
+    """
+    Misst im Hintergrund fortlaufend Spektren und hält die letzten keep_s
+    Sekunden vor. average(t0, t1) mittelt alle Messungen, die das Fenster
+    überlappen, ohne auf eine laufende Messung zu warten (kostet dem
+    Aufrufer also keine Zeit). Mit auto_range stellt ein AutoRanger
+    Gain/Integration nach; gemittelt wird dann normiert.
+    """
+
+    def __init__(self, sensor, keep_s=30.0, auto_range=True):
+        self.sensor = sensor
+        self.keep_s = float(keep_s)
+        self.auto_range = bool(auto_range)
+        self.ranger = None
+        self._samples = deque()          # (t0, t1, werte, (gain_code, atime, astep))
+        self._lock = threading.Lock()
+        # wer den Sensor zwischendurch selbst nutzt (LED-Servo), hält dieses Lock
+        self.sensor_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.errors = 0
+        self.config = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with device_batch(self.sensor):
+            try:
+                gain, atime, astep = (int(getattr(self.sensor, k)) for k in ("gain", "atime", "astep"))
+            except Exception:
+                gain, atime, astep = 5, DEFAULT_ATIME, DEFAULT_ASTEP
+        self.config = (gain, atime, astep)
+        if self.auto_range:
+            self.ranger = AutoRanger(self.sensor, gain, atime, astep)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.sensor_lock, device_batch(self.sensor):
+                    t0 = time.time()
+                    cfg = self.config
+                    apply_config(self.sensor, cfg)
+                    values = read_spectrum(self.sensor)
+                    if self.ranger is not None and self.ranger.update(values):
+                        self.config = self.ranger.config
+            except Exception as e:
+                self.errors += 1
+                if self.errors in (1, 10, 100):
+                    print("[SpectrumSampler] Lesefehler:", e)
+                self._stop.wait(0.2)
+                continue
+            t1 = time.time()
+            with self._lock:
+                self._samples.append((t0, t1, values, cfg))
+                while self._samples and self._samples[0][1] < t1 - self.keep_s:
+                    self._samples.popleft()
+
+    def average(self, t0, t1):
+        """Mittelwert-Spektrum für [t0, t1] (Unix-Zeit) als dict für meta.json oder None."""
+        with self._lock:
+            samples = list(self._samples)
+        hits = [s for s in samples if s[1] >= t0 and s[0] <= t1]
+        in_window = bool(hits)
+        if not hits and samples:
+            # Fenster kürzer als eine Messung: nächstliegende nehmen
+            mid = 0.5 * (t0 + t1)
+            hits = [min(samples, key=lambda s: abs(0.5 * (s[0] + s[1]) - mid))]
+        if not hits:
+            return None
+
+        # übersteuerte Messungen (z.B. direkt nach dem LED-Wechsel) nur, wenn nichts anderes da ist
+        sat = [max(h[2]) >= full_scale(h[3][1], h[3][2]) for h in hits]
+        used = [h for h, s in zip(hits, sat) if not s] or hits
+
+        norm = np.asarray([normalize_counts(h[2], *h[3]) for h in used])
+        configs = sorted({h[3] for h in used})
+        out = {
+            "channels": list(CHANNEL_LABELS),
+            "mean_norm": np.round(norm.mean(axis=0), 4).tolist(),
+            "std_norm": np.round(norm.std(axis=0), 4).tolist(),
+            "norm_unit": "counts/(gain*ms)",
+            "n": len(used),
+            "n_saturated": int(sum(sat)),
+            "in_window": in_window,
+            "timestamp": datetime.fromtimestamp(0.5 * (hits[0][0] + hits[-1][1])).isoformat(),
+            "t_start": hits[0][0],
+            "t_end": hits[-1][1],
+            "saturated": all(sat),
+            "settings": [{"gain": gain_factor(g), "atime": at, "astep": ast,
+                          "integration_ms": round(integration_time_ms(at, ast), 2)}
+                         for g, at, ast in configs],
+        }
+        if len(configs) == 1:
+            # Rohwerte nur bei einheitlicher Einstellung sinnvoll
+            raw = np.asarray([h[2] for h in used], dtype=np.float64)
+            out["mean"] = np.round(raw.mean(axis=0), 2).tolist()
+            out["std"] = np.round(raw.std(axis=0), 2).tolist()
+        return out
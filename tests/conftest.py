@@ -0,0 +1,8 @@
+# conftest.py
+"""Tests laufen gegen die Simulation (hw_backend liest MSCAM_SIM beim Import)."""
+import os
+import sys
+
+os.environ["MSCAM_SIM"] = "1"
+os.environ["MSCAM_SIM_TIME_SCALE"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,104 @@
+# test_frame_average.py
+"""Mittelung (Welford), Mittelwert-Dateien und Dunkelbild-Abzug."""
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+Image = pytest.importorskip("PIL.Image")
+
+from dark_frames import dark_label, subtract_dark  # noqa: E402
+from frame_average import (DARKSUB, FrameAverager, RunningMean, read_mean,  # noqa: E402
+                           subtract_dark_mean, write_mean)
+
+
+def _frames(n=5, shape=(6, 8, 3), seed=1):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(n)]
+
+
+def _save_png(path, arr):
+    Image.fromarray(arr).save(path, format="PNG")
+
+
+def test_running_mean_matches_numpy():
+    frames = _frames()
+    acc = RunningMean(variance=True)
+    for f in frames:
+        acc.add(f)
+    stack = np.stack(frames).astype(np.float64)
+    assert acc.n == len(frames)
+    np.testing.assert_allclose(acc.mean, stack.mean(axis=0), atol=1e-3)
+    np.testing.assert_allclose(acc.variance(), stack.var(axis=0, ddof=1), rtol=1e-4, atol=1e-2)
+    with pytest.raises(ValueError):
+        acc.add(np.zeros((2, 2, 3)))
+
+
+def test_write_read_mean_roundtrip(tmp_path):
+    mean = np.stack(_frames(2)).astype(np.float32).mean(axis=0)
+    path = str(tmp_path / "m.tif")
+    write_mean(path, "jpeg", mean)
+    np.testing.assert_allclose(read_mean(path, "jpeg"), mean, atol=1.0 / 256)
+    npy = str(tmp_path / "m.npy")
+    write_mean(npy, "raw", mean)
+    np.testing.assert_array_equal(read_mean(npy, "raw"), mean)
+
+
+def test_frame_averager_removes_temp_files(tmp_path):
+    frames = _frames(3)
+    avg = FrameAverager(("jpeg",), variance=True)
+    for i, f in enumerate(frames):
+        p = str(tmp_path / f"f{i}.png")
+        _save_png(p, f)
+        avg.add({"jpeg": p}, remove=True)
+        assert not os.path.exists(p)
+    files = avg.write(str(tmp_path))
+    assert files == {"jpeg_mean": "capture_mean.tif", "jpeg_var": "capture_var.npy"}
+    assert avg.frames() == 3
+    np.testing.assert_allclose(read_mean(str(tmp_path / "capture_mean.tif"), "jpeg"),
+                               np.stack(frames).mean(axis=0), atol=1.0 / 256)
+
+
+def test_subtract_dark_mean(tmp_path):
+    ch_dir, base = tmp_path / "IR_OUT" / "a", tmp_path
+    ch_dir.mkdir(parents=True)
+    dark_dir = tmp_path / "IR_OUT" / "dark"
+    dark_dir.mkdir()
+    light = np.full((4, 4, 3), 100.0, np.float32)
+    dark = np.full((4, 4, 3), 30.0, np.float32)
+    dark[0, 0] = 150.0                                   # heißes Pixel -> auf 0 begrenzt
+    write_mean(str(ch_dir / "capture_mean.tif"), "jpeg", light)
+    write_mean(str(dark_dir / "capture_mean.tif"), "jpeg", dark)
+
+    out, notes = subtract_dark_mean(str(ch_dir), {"jpeg_mean": "capture_mean.tif"}, str(base),
+                                    {"jpeg_mean": os.path.join("IR_OUT", "dark", "capture_mean.tif")})
+    assert out == {"jpeg_mean_darksub": DARKSUB["jpeg"]} and notes == {}
+    res = read_mean(str(ch_dir / DARKSUB["jpeg"]), "jpeg")
+    assert res[1, 1].tolist() == [70.0] * 3
+    assert res[0, 0].tolist() == [0.0] * 3
+
+    # nur Einzel-Dunkelbild vorhanden: wird benutzt, aber vermerkt
+    _save_png(str(dark_dir / "capture.png"), dark.astype(np.uint8))
+    out, notes = subtract_dark_mean(str(ch_dir), {"jpeg_mean": "capture_mean.tif"}, str(base),
+                                    {"jpeg": os.path.join("IR_OUT", "dark", "capture.png")})
+    assert "jpeg_mean_darksub" in out and "jpeg_mean_darksub" in notes
+
+
+def test_subtract_dark_single(tmp_path):
+    img = np.full((4, 4, 3), 80, np.uint8)
+    dark = np.full((4, 4, 3), 20, np.uint8)
+    dark[0, 0] = 200
+    _save_png(str(tmp_path / "capture.png"), img)
+    _save_png(str(tmp_path / "dark.png"), dark)
+    out, notes = subtract_dark(str(tmp_path), {"jpeg": "capture.png", "raw": "capture.dng"},
+                               str(tmp_path), {"jpeg": "dark.png"})
+    assert out == {"jpeg_darksub": "capture_darksub.png"}
+    assert notes == {"raw": "kein Dunkelbild in diesem Format"}
+    res = np.asarray(Image.open(tmp_path / "capture_darksub.png"))
+    assert res[1, 1].tolist() == [60] * 3 and res[0, 0].tolist() == [0] * 3
+
+
+def test_dark_label():
+    assert dark_label("OUT", 20000, None) == "IR_OUT/dark_20000us_g1"
+    assert dark_label("IN", 1500.7, 2.5) == "IR_IN/dark_1500us_g2.5"
@@ -0,0 +1,57 @@
+# test_i2c_bus.py
+"""Gemeinsame Treiberobjekte und Geräte-Batches."""
+import threading
+import time
+from contextlib import nullcontext
+
+from i2c_bus import I2CBusManager, device_batch
+
+
+class FakeBus:
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        pass
+
+
+def test_device_is_shared(monkeypatch):
+    bus = I2CBusManager(i2c=FakeBus())
+    monkeypatch.setattr(I2CBusManager, "_instance", bus)
+    created = []
+    factory = lambda i2c: created.append(i2c) or object()
+    a = bus.device(0x39, "AS7341", factory)
+    assert bus.device(0x39, "AS7341", factory) is a
+    assert len(created) == 1
+    assert bus._names[0x39] == "AS7341"
+    assert isinstance(device_batch(object()), nullcontext)     # nicht geteilt: kein Lock
+
+
+def test_device_batch_excludes_same_device_only(monkeypatch):
+    bus = I2CBusManager(i2c=FakeBus())
+    monkeypatch.setattr(I2CBusManager, "_instance", bus)
+    sensor = bus.device(0x39, "AS7341", lambda i2c: object())
+    order = []
+
+    def other_sensor_user():
+        with device_batch(sensor):
+            order.append("sensor")
+
+    def led_write():
+        with bus.i2c:                      # einzelner Transfer eines anderen Geräts
+            bus.i2c.writeto(0x40, b"\0")
+        order.append("led")
+
+    with device_batch(sensor):
+        t1 = threading.Thread(target=other_sensor_user)
+        t2 = threading.Thread(target=led_write)
+        t1.start()
+        t2.start()
+        t2.join(1.0)
+        time.sleep(0.05)
+        order.append("batch done")
+    t1.join(1.0)
+    assert order == ["led", "batch done", "sensor"]
@@ -0,0 +1,59 @@
+# test_led_control.py
+"""LEDController (Simulation): Slider nur im Tk-Thread nachführen."""
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from led_control import LEDController  # noqa: E402
+
+
+class FakeVar:
+    def __init__(self):
+        self.value = 0
+        self.thread = None
+
+    def set(self, value):
+        self.value = value
+        self.thread = threading.current_thread()
+
+
+class FakeWindow:
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, fn):
+        self.pending.append(fn)
+
+    def run_pending(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+@pytest.fixture
+def led():
+    ctl = LEDController(use_gui=False)
+    ctl.window = FakeWindow()
+    ctl.sliders = {name: FakeVar() for name in ctl.get_all_channels()}
+    return ctl
+
+
+def test_slider_update_from_worker_goes_through_after(led):
+    name = led.get_all_channels()[0]
+    worker = threading.Thread(target=led.set_channel_by_name, args=(name, 42.0))
+    worker.start()
+    worker.join()
+    assert led.get_channel_value(name) == 42.0        # PWM sofort geschrieben
+    assert led.sliders[name].value == 0                # Tk-Variable noch unberührt
+    led.window.run_pending()
+    assert led.sliders[name].value == 42.0
+    assert led.sliders[name].thread is threading.main_thread()
+
+
+def test_slider_update_on_tk_thread_is_direct(led):
+    a, b = led.get_all_channels()[:2]
+    led.set_channel_by_name(a, 10.0)
+    led.set_only(b, 20.0)
+    assert not led.window.pending
+    assert (led.sliders[a].value, led.sliders[b].value) == (0, 20.0)
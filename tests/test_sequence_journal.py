@@ -0,0 +1,54 @@
+# test_sequence_journal.py
+"""Journal: Schreiben, halbe letzte Zeile, Prüfsummen."""
+import os
+
+from sequence_journal import SequenceJournal
+
+
+def _capture(base_dir, rel_dir, data=b"\xff\xd8jpeg\xff\xd9"):
+    ch_dir = os.path.join(base_dir, rel_dir)
+    os.makedirs(ch_dir, exist_ok=True)
+    with open(os.path.join(ch_dir, "capture.jpg"), "wb") as f:
+        f.write(data)
+    return ch_dir
+
+
+def test_load_and_verify(tmp_path):
+    base = str(tmp_path)
+    j = SequenceJournal(base)
+    j.write_plan({"save_dir": base})
+    j.led("IR_OUT/a", 12.5, 20000, 1.0)
+    ch_dir = _capture(base, os.path.join("IR_OUT", "a"))
+    j.done("IR_OUT/a", ch_dir, {"jpeg": "capture.jpg", "single_shot": True}, 12.5)
+    j.failed("IR_OUT/b", RuntimeError("kaputt"))
+    j.failed("IR_OUT/b", RuntimeError("kaputt"))
+
+    plan, steps = SequenceJournal(base).load()
+    assert plan == {"save_dir": base}
+    done = steps["IR_OUT/a"]["done"]
+    assert steps["IR_OUT/a"]["led"]["pwm"] == 12.5
+    assert done["files"] == {"jpeg": os.path.join("IR_OUT", "a", "capture.jpg")}
+    assert j.verify(done)
+    assert steps["IR_OUT/b"] == {"led": None, "done": None, "failed": 2}
+
+    # Datei verändert -> nicht mehr erledigt
+    _capture(base, os.path.join("IR_OUT", "a"), b"anders")
+    assert not j.verify(done)
+    os.remove(os.path.join(ch_dir, "capture.jpg"))
+    assert not j.verify(done)
+
+
+def test_truncated_last_line(tmp_path):
+    j = SequenceJournal(str(tmp_path))
+    j.write_plan({"x": 1})
+    j.led("IR_OUT/a", 1.0, 100, 1.0)
+    with open(j.path, "a", encoding="utf-8") as f:
+        f.write('{"event": "done", "step": "IR_OU')       # Stromausfall mitten in der Zeile
+    plan, steps = j.load()
+    assert plan == {"x": 1}
+    assert steps["IR_OUT/a"]["done"] is None
+    assert len(j.read()) == 2
+
+
+def test_missing_journal(tmp_path):
+    assert SequenceJournal(str(tmp_path)).load() == (None, {})
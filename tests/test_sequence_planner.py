@@ -0,0 +1,78 @@
+# test_sequence_planner.py
+"""Schrittfolge: Kosten, exakte Suche, IR-Gruppen."""
+from itertools import permutations
+from types import SimpleNamespace
+
+import pytest
+
+from sequence_planner import (TRANSITION_COSTS, Step, build_steps, order_steps, path_cost,
+                               transition_cost)
+
+
+def _channel(name, mode="fixed", jpeg=True, raw=False, enabled=True, sensor_target=None):
+    return SimpleNamespace(name=name, mode=mode, jpeg=jpeg, raw=raw, enabled=enabled,
+                           sensor_target=sensor_target)
+
+
+def _plan(channels, ir_states=("OUT", "IN"), adjust_exposure=True, sensor_verify=False):
+    return SimpleNamespace(channels=list(channels), ir_states=list(ir_states),
+                           adjust_exposure=adjust_exposure, sensor_verify=sensor_verify)
+
+
+def test_build_steps_flags():
+    plan = _plan([
+        _channel("a", "fixed"),
+        _channel("b", "auto", raw=True),
+        _channel("c", "sensor", sensor_target=1.0),
+        _channel("d", "sensor"),
+        _channel("off", enabled=False),
+    ], ir_states=["OUT"])
+    steps = {s.name: s for s in build_steps(plan)}
+    assert set(steps) == {"a", "b", "c", "d"}
+    assert not steps["a"].metered and not steps["a"].moves_exposure
+    assert steps["b"].metered and steps["b"].moves_exposure
+    assert steps["b"].formats == ("jpeg", "raw")
+    assert not steps["c"].metered                   # Ziel bekannt: nur Sensor
+    assert steps["d"].metered                       # Ziel einlernen per Kamera
+    # ohne Sensor regeln Sensor-Kanäle per Kamera
+    assert {s.name for s in build_steps(plan, sensor_available=False) if s.metered} == {"b", "c", "d"}
+
+
+def test_transition_cost_start_and_same_channel():
+    a = Step("OUT", "x", ("jpeg",))
+    b = Step("OUT", "x", ("jpeg",))
+    assert transition_cost(None, a) > transition_cost(a, b)
+    assert transition_cost(a, b) == 0.0
+
+
+def test_order_is_optimal_and_groups_ir_states():
+    plan = _plan([
+        _channel("a", "fixed"),
+        _channel("b", "auto"),
+        _channel("c", "fixed", raw=True),
+        _channel("d", "auto"),
+    ])
+    steps = build_steps(plan)
+    ordered, cost = order_steps(steps)
+    assert sorted(s.index for s in ordered) == list(range(len(steps)))
+    assert cost == path_cost(ordered)
+    assert cost <= path_cost(steps)
+
+    states = [s.ir_state for s in ordered]
+    assert states == [states[0]] * 4 + [states[4]] * 4      # ein Filterwechsel
+
+    # innerhalb eines IR-Zustands exakt: nicht schlechter als jede Permutation
+    out = [s for s in steps if s.ir_state == "OUT"]
+    best = min(path_cost(p) for p in permutations(out))
+    assert order_steps(out)[1] <= best + 1e-9
+
+
+def test_start_ir_saves_pulse():
+    steps = build_steps(_plan([_channel("a")]))
+    ordered, cost = order_steps(steps, start_ir="IN")
+    assert ordered[0].ir_state == "IN"
+    assert cost == pytest.approx(order_steps(steps)[1] - TRANSITION_COSTS["ir_pulse"])
+
+
+def test_empty():
+    assert order_steps([]) == ([], 0.0)
@@ -0,0 +1,134 @@
+# test_sequence_sim.py
+"""SequenceEngine komplett in der Simulation: Ordner, meta.json, summary.json."""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("PIL")
+
+from hw_backend import CameraStream               # noqa: E402
+from led_control import LEDController             # noqa: E402
+from sequence_engine import (ChannelPlan, SequenceEngine, SequencePlan, open_ir_filter,  # noqa: E402
+                             plan_from_dict)
+
+
+@pytest.fixture
+def engine():
+    led = LEDController(use_gui=False)
+    stream = CameraStream()
+    stream.start()
+    try:
+        yield SequenceEngine(stream, led, ir_filter=open_ir_filter())
+    finally:
+        stream.stop()
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_sequence_layout(engine, tmp_path):
+    plan = SequencePlan(save_dir=str(tmp_path), ir_states=["OUT", "IN"], channels=[
+        ChannelPlan("644 nm", mode="fixed", pwm=30.0, raw=True),
+        ChannelPlan("510 nm", mode="auto"),
+    ])
+    summary = engine.run(plan, headless=True)
+
+    base_dir = summary["base_dir"]
+    assert os.path.dirname(base_dir) == str(tmp_path)
+    for name in ("journal.jsonl", "summary.json", "timeline.json"):
+        assert os.path.isfile(os.path.join(base_dir, name))
+
+    for state in ("OUT", "IN"):
+        for ch_dir, fixed in (("644_nm", True), ("510_nm", False)):
+            d = os.path.join(base_dir, f"IR_{state}", ch_dir)
+            meta = _load(os.path.join(d, "meta.json"))
+            assert meta["ir_state"] == state
+            assert meta["mode"] == ("fixed" if fixed else "auto")
+            for key in ("final_pwm", "settle", "timing", "files"):
+                assert key in meta
+            for fn in meta["files"].values():
+                if isinstance(fn, str):
+                    assert os.path.isfile(os.path.join(d, fn))
+            assert os.path.isfile(os.path.join(d, "capture.jpg"))
+            if fixed:
+                assert meta["final_pwm"] == pytest.approx(30.0)
+                assert os.path.isfile(os.path.join(d, "capture.dng"))
+            else:
+                # Regelung muss konvergieren statt max_cycles auszuschöpfen
+                assert 0.0 < meta["final_pwm"] <= 100.0
+                assert meta["timing"]["detail"]["auto_led"]["cycles"] < plan.max_cycles
+
+    data = _load(os.path.join(base_dir, "summary.json"))
+    for key in ("phases", "step_total", "slowest_steps", "details", "wall_s"):
+        assert key in data
+    assert data["steps"] == 4
+    assert data["failed_steps"] == 0
+    assert {"led", "settle", "capture"} <= set(data["phases"])
+
+
+def test_sensor_servo(engine):
+    from hw_backend import AS7341
+    from i2c_bus import I2CBusManager
+    from led_servo import SensorLedServo
+    from spectral_sensor import CHANNEL_LABELS, configure_integration, read_spectrum
+
+    sensor = AS7341(I2CBusManager.instance().i2c)
+    configure_integration(sensor)
+    sensor.gain = 5
+    led = engine.led
+    led.set_only("455 nm", 50.0)
+    values = read_spectrum(sensor)
+    assert CHANNEL_LABELS[values.index(max(values[:8]))] == "445 nm"
+
+    servo = SensorLedServo(sensor, led)
+    target = servo.measure("445 nm")
+    led.set_only("455 nm", 0.0)
+    info = servo.servo("455 nm", target, start_pwm=10.0)
+    assert info["converged"]
+    assert info["pwm"] == pytest.approx(50.0, abs=2.0)
+
+
+def test_preview_state_restored(engine, tmp_path):
+    stream = engine.stream
+    stream.stop()                        # z.B. CLI ohne Vorschau
+    plan = SequencePlan(save_dir=str(tmp_path), ir_states=["OUT"],
+                        channels=[ChannelPlan("510 nm", mode="auto")])
+    engine.run(plan, headless=True)
+    assert not stream.running            # per ensure_preview() gestartet, wieder gestoppt
+
+    stream.start()
+    engine.run(plan, headless=True)
+    assert stream.running
+
+
+def test_average_burst(engine, tmp_path):
+    # ohne --signal-Sitzung: Zusatzbilder als Serie in einem libcamera-still-Aufruf
+    plan = SequencePlan(save_dir=str(tmp_path), ir_states=["OUT"], channels=[
+        ChannelPlan("644 nm", mode="fixed", pwm=30.0, average_frames=3)])
+    summary = engine.run(plan, headless=True)
+
+    d = os.path.join(summary["base_dir"], "IR_OUT", "644_nm")
+    meta = _load(os.path.join(d, "meta.json"))
+    assert meta["average"]["path"] == "burst"
+    assert "notes" not in meta["average"]
+    assert meta["average"]["frames"] == 3
+    assert os.path.isfile(os.path.join(d, meta["files"]["jpeg_mean"]))
+    assert not os.path.exists(os.path.join(d, "_average"))
+
+
+def test_plan_from_dict_ignores_unknown_keys(capsys):
+    # Plan aus einer anderen Version: zusätzliche Schlüssel dürfen das Laden nicht verhindern
+    from dataclasses import asdict
+    data = asdict(SequencePlan(save_dir="x", channels=[ChannelPlan("510 nm", pwm=12.0)]))
+    data["future_option"] = 1
+    data["channels"][0]["future_channel_option"] = True
+    plan = plan_from_dict(data)
+    assert plan.save_dir == "x"
+    assert plan.channels == [ChannelPlan("510 nm", pwm=12.0)]
+    out = capsys.readouterr().out
+    assert "future_option" in out and "future_channel_option" in out
@@ -0,0 +1,45 @@
+# test_spectral_log.py
+"""Binärlog: Roundtrip, Header-Zähler nach Flush, Vorallokation."""
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from spectral_log import (HEADER_SIZE, RECORD_DTYPE, SpectralLogWriter,  # noqa: E402
+                          read_log_header, read_spectral_log)
+
+
+def test_roundtrip(tmp_path):
+    path = str(tmp_path / "drift.as7341")
+    with SpectralLogWriter(path, chunk_records=4, batch_records=3) as log:
+        for i in range(10):
+            log.append(np.arange(10) + i, gain=0.5 * 2 ** (i % 3), atime=29, astep=599, t=100.0 + i)
+    data = read_spectral_log(path)
+    assert len(data) == 10
+    assert data["t"].tolist() == [100.0 + i for i in range(10)]
+    assert data["counts"][7].tolist() == list(range(7, 17))
+    assert data["gain"][2] == 2.0
+    assert read_spectral_log(path, mmap=False).tobytes() == np.asarray(data).tobytes()
+    # Vorallokation beim Schließen abgeschnitten
+    assert os.path.getsize(path) == HEADER_SIZE + 10 * RECORD_DTYPE.itemsize
+
+
+def test_only_flushed_records_count(tmp_path):
+    path = str(tmp_path / "crash.as7341")
+    log = SpectralLogWriter(path, batch_records=4, flush_interval=3600.0)
+    for i in range(6):
+        log.append([i] * 10, 1.0, 29, 599, t=float(i))
+    # 4 geflusht, 2 gepuffert -> ein Absturz jetzt verliert nur die gepufferten
+    assert read_log_header(path)["count"] == 4
+    assert read_spectral_log(path, mmap=False)["t"].tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert log.total == 6
+    log.close()
+    assert read_log_header(path)["count"] == 6
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * HEADER_SIZE)
+    with pytest.raises(ValueError):
+        read_log_header(str(path))
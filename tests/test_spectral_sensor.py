@@ -0,0 +1,85 @@
+# test_spectral_sensor.py
+"""Bank-Auslese gegen das Registerlayout des Adafruit-Treibers."""
+import pytest
+
+pytest.importorskip("numpy")
+
+from spectral_sensor import BAND_SLOTS, CHANNEL_LABELS, read_bank, read_spectrum  # noqa: E402
+
+
+class DriverStub:
+    """
+    Wie adafruit_as7341.AS7341: _all_channels = (ASTATUS, ADC0..ADC5) der
+    zuletzt abgeschlossenen Messung; _configure_f*() misst nur beim Bankwechsel.
+    level: Helligkeit, die eine neue Messung sieht.
+    """
+    ASTATUS = 0x88
+
+    def __init__(self, f=(11, 12, 13, 14, 15, 16, 17, 18), clear=900, nir=950):
+        self.f, self.clear, self.nir = tuple(f), clear, nir
+        self.level = 1
+        self.measurements = 0
+        self._low_channels_configured = False
+        self._high_channels_configured = False
+        self._bank = 0
+        self._data = None
+
+    def _measure(self):
+        bank = self.f[4 * self._bank: 4 * self._bank + 4]
+        self._data = (self.ASTATUS,) + tuple(v * self.level for v in bank + (self.clear, self.nir))
+        self.measurements += 1
+
+    def _configure_f1_f4(self):
+        if self._low_channels_configured:
+            return
+        self._low_channels_configured, self._high_channels_configured = True, False
+        self._bank = 0
+        self._measure()
+
+    def _configure_f5_f8(self):
+        if self._high_channels_configured:
+            return
+        self._low_channels_configured, self._high_channels_configured = False, True
+        self._bank = 1
+        self._measure()
+
+    @property
+    def _color_meas_enabled(self):
+        return True
+
+    @_color_meas_enabled.setter
+    def _color_meas_enabled(self, value):
+        if value:
+            self._measure()
+
+    def _wait_for_data(self, timeout=1.0):
+        pass
+
+    @property
+    def _all_channels(self):
+        return self._data
+
+
+def test_read_spectrum_skips_astatus():
+    values = read_spectrum(DriverStub())
+    assert len(values) == len(CHANNEL_LABELS)
+    assert values[:8] == (11, 12, 13, 14, 15, 16, 17, 18)
+    assert values[CHANNEL_LABELS.index("NIR")] == 950
+    assert values[CHANNEL_LABELS.index("CLEAR")] == 900
+
+
+@pytest.mark.parametrize("band, expected", [
+    ("415 nm", 11), ("515 nm", 14), ("555 nm", 15), ("680 nm", 18), ("CLEAR", 900), ("NIR", 950),
+])
+def test_band_slots(band, expected):
+    bank, idx = BAND_SLOTS[band]
+    assert read_bank(DriverStub(), bank)[idx] == expected
+
+
+def test_read_bank_measures_again_on_selected_bank():
+    sensor = DriverStub()
+    bank, idx = BAND_SLOTS["445 nm"]
+    assert read_bank(sensor, bank)[idx] == 12
+    sensor.level = 3                      # z.B. LED-PWM geändert
+    assert read_bank(sensor, bank)[idx] == 36
+    assert sensor.measurements == 2
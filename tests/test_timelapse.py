@@ -0,0 +1,91 @@
+# test_timelapse.py
+"""Zeitraffer-Raster: Intervall-Parser, skip/queue bei Überlauf, Log."""
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from timelapse import TimelapseScheduler, parse_interval
+
+
+class FakeEngine:
+    """engine.run() dauert durations[i] Sekunden."""
+
+    def __init__(self, durations=(0.0,)):
+        self.durations = list(durations)
+        self.calls = []
+
+    def run(self, plan, **kw):
+        self.calls.append(kw)
+        time.sleep(self.durations[min(len(self.calls) - 1, len(self.durations) - 1)])
+        return {"steps": 1, "base_dir": plan.save_dir}
+
+    def abort(self):
+        pass
+
+
+def _read_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("90", 90.0), ("90s", 90.0), ("10m", 600.0), ("1.5h", 5400.0), (" 2M ", 120.0),
+])
+def test_parse_interval(text, seconds):
+    assert parse_interval(text) == seconds
+
+
+def test_invalid_arguments(tmp_path):
+    plan = SimpleNamespace(save_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        TimelapseScheduler(FakeEngine(), plan, 0)
+    with pytest.raises(ValueError):
+        TimelapseScheduler(FakeEngine(), plan, 1, overrun="later")
+
+
+def test_fixed_grid(tmp_path):
+    sched = TimelapseScheduler(FakeEngine(), SimpleNamespace(save_dir=str(tmp_path)), 0.05, count=3)
+    stats = sched.run()
+    assert [r["slot"] for r in sched.runs] == [0, 1, 2]
+    assert stats["runs"] == stats["ok"] == 3 and stats["skipped_slots"] == 0
+    lines = _read_log(sched.log_path)
+    assert [r["run"] for r in lines[:-1]] == [0, 1, 2]
+    assert lines[-1]["summary"]["runs"] == 3
+
+
+def test_overrun_skip(tmp_path):
+    engine = FakeEngine([0.12, 0.0])
+    sched = TimelapseScheduler(engine, SimpleNamespace(save_dir=str(tmp_path)), 0.05,
+                               count=2, overrun="skip")
+    sched.run()
+    # Lauf 0 belegt die Slots 0-2, weiter im Raster ab dem nächsten freien Slot
+    assert sched.runs[1]["slot"] >= 3
+    assert sched.skipped == sched.runs[1]["slot"] - 1
+
+
+def test_overrun_queue(tmp_path):
+    engine = FakeEngine([0.12, 0.0])
+    sched = TimelapseScheduler(engine, SimpleNamespace(save_dir=str(tmp_path)), 0.05,
+                               count=2, overrun="queue")
+    sched.run()
+    # verpasster Slot wird sofort nachgeholt (mit Verspätung), ältere entfallen
+    assert sched.runs[1]["slot"] >= 2
+    assert sched.runs[1]["lateness_s"] > 0
+    assert sched.skipped == sched.runs[1]["slot"] - 1
+
+
+def test_summary_written_on_interrupt(tmp_path):
+    class InterruptedEngine(FakeEngine):
+        def run(self, plan, **kw):
+            if self.calls:
+                raise KeyboardInterrupt
+            return super().run(plan, **kw)
+
+    sched = TimelapseScheduler(InterruptedEngine(), SimpleNamespace(save_dir=str(tmp_path)), 0.01, count=3)
+    with pytest.raises(KeyboardInterrupt):
+        sched.run()
+    lines = _read_log(sched.log_path)
+    assert [r["run"] for r in lines[:-1]] == [0]
+    assert lines[-1]["summary"]["runs"] == 1
@@ -0,0 +1,152 @@
+# timelapse.py
+"""
+Sequenz in festen Abständen wiederholen (Zeitraffer).
+
+Startzeiten liegen auf einem festen Raster t0 + k*interval (monotone Uhr):
+Laufdauer und Verzögerungen summieren sich nicht auf. Dauert ein Lauf länger
+als das Intervall:
+  overrun="skip"   verpasste Slots auslassen, weiter im Raster
+  overrun="queue"  einmal sofort nachholen (weitere verpasste Slots entfallen),
+                   danach wieder im Raster
+LED-Controller, IR-Filter, Kamera und AS7341 bleiben über alle Läufe in der
+SequenceEngine offen. Pro Lauf eine Zeile in timelapse_<ts>.jsonl, am Ende
+Dauer-/Verspätungsstatistik.
+"""
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from sequence_pipeline import duration_stats
+
+OVERRUN_MODES = ("skip", "queue")
+
+
+def parse_interval(text):
+    """'90', '90s', '10m', '1.5h' -> Sekunden."""
+    text = str(text).strip().lower()
+    factor = {"s": 1.0, "m": 60.0, "h": 3600.0}.get(text[-1:], None)
+    if factor is None:
+        return float(text)
+    return float(text[:-1]) * factor
+
+
+class TimelapseScheduler:
+    """
+    engine: SequenceEngine, plan: SequencePlan (jeder Lauf in eigenem sequence_<ts>-Ordner).
+    count: Anzahl Läufe (0 = unbegrenzt), duration_s: keine neuen Slots danach (0 = unbegrenzt).
+    on_log(text): Statuszeilen (aus dem Scheduler-Thread).
+    """
+
+    def __init__(self, engine, plan, interval_s, count=0, duration_s=0.0,
+                 overrun="skip", on_log=None):
+        if interval_s <= 0:
+            raise ValueError("Intervall muss > 0 sein")
+        if overrun not in OVERRUN_MODES:
+            raise ValueError(f"overrun muss einer von {OVERRUN_MODES} sein")
+        self.engine = engine
+        self.plan = plan
+        self.interval_s = float(interval_s)
+        self.count = int(count or 0)
+        self.duration_s = float(duration_s or 0.0)
+        self.overrun = overrun
+        self.on_log = on_log
+
+        self.runs = []
+        self.skipped = 0
+        self.log_path = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Keine weiteren Läufe; ein laufender Lauf endet nach dem aktuellen Schritt."""
+        self._stop.set()
+        self.engine.abort()
+
+    def _log(self, text):
+        if self.on_log is not None:
+            self.on_log(text)
+
+    def _run_once(self, slot, scheduled_wall, lateness):
+        rec = {
+            "run": len(self.runs),
+            "slot": slot,
+            "scheduled": datetime.fromtimestamp(scheduled_wall).isoformat(timespec="seconds"),
+            "lateness_s": round(lateness, 3),
+        }
+        t = time.monotonic()
+        try:
+            summary = self.engine.run(self.plan, timelapse_run=rec["run"], timelapse_slot=slot)
+            rec["status"] = "aborted" if summary.get("aborted") else "ok"
+            rec["steps"] = summary.get("steps")
+            rec["base_dir"] = summary.get("base_dir")
+        except Exception as e:
+            rec["status"] = "error"
+            rec["error"] = str(e)
+        rec["duration_s"] = round(time.monotonic() - t, 3)
+        return rec
+
+    def run(self):
+        """Blockiert bis count/duration erreicht oder stop(); Rückgabe stats()."""
+        os.makedirs(self.plan.save_dir, exist_ok=True)
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.log_path = os.path.join(self.plan.save_dir, f"timelapse_{ts}.jsonl")
+
+        t0 = time.monotonic()
+        wall0 = time.time()
+        k = 0
+        try:
+            while not self._stop.is_set():
+                if self.count and len(self.runs) >= self.count:
+                    break
+                offset = k * self.interval_s
+                if self.duration_s and offset > self.duration_s:
+                    break
+
+                wait = t0 + offset - time.monotonic()
+                if wait > 0:
+                    self._log(f"Zeitraffer: Lauf {len(self.runs) + 1} um "
+                              f"{datetime.fromtimestamp(wall0 + offset):%H:%M:%S}")
+                    if self._stop.wait(wait):
+                        break
+
+                rec = self._run_once(k, wall0 + offset, time.monotonic() - (t0 + offset))
+                self.runs.append(rec)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec) + "\n")
+                self._log(f"Zeitraffer: Lauf {rec['run'] + 1} {rec['status']} in {rec['duration_s']:.1f} s "
+                          f"(Verspätung {rec['lateness_s']:.2f} s)")
+
+                # nächster Slot im festen Raster
+                k_due = math.floor((time.monotonic() - t0) / self.interval_s)
+                if k_due <= k:
+                    k += 1
+                else:
+                    if self.overrun == "skip":
+                        missed, k = k_due - k, k_due + 1
+                    else:
+                        missed, k = k_due - k - 1, k_due
+                    self.skipped += missed
+                    self._log(f"Zeitraffer: Lauf länger als Intervall ({self.overrun}), "
+                              f"{missed} Slot(s) ausgelassen")
+        finally:
+            # auch bei Strg+C/Fehler: Zusammenfassung steht immer am Ende des Logs
+            stats = self.stats()
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"summary": stats}) + "\n")
+        return stats
+
+    def stats(self):
+        ok = [r for r in self.runs if r["status"] == "ok"]
+        return {
+            "interval_s": self.interval_s,
+            "overrun": self.overrun,
+            "runs": len(self.runs),
+            "ok": len(ok),
+            "errors": sum(1 for r in self.runs if r["status"] == "error"),
+            "skipped_slots": self.skipped,
+            "duration": duration_stats(r["duration_s"] for r in self.runs),
+            "lateness": duration_stats(r["lateness_s"] for r in self.runs),
+            "log": self.log_path,
+        }